@@ -46,7 +46,9 @@ INSTALLED_APPS = [
 SITE_ID = 3
 
 MIDDLEWARE = [
-    'django.middleware.cache.UpdateCacheMiddleware',  # ✅ Must be first for site-wide caching
+    'Systems.middleware.QueryBudgetMiddleware',  # Outermost, so it sees every query of the request
+    'Systems.middleware.CacheControlPolicyMiddleware',  # Before the page cache: its headers are for HTTP caches only
+    'Systems.middleware.TaggedUpdateCacheMiddleware',  # ✅ Must be first for site-wide caching
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -56,7 +58,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
-    'django.middleware.cache.FetchFromCacheMiddleware',  # ✅ Must be last for site-wide caching
+    'Systems.middleware.TaggedFetchFromCacheMiddleware',  # ✅ Must be last for site-wide caching
 ]
 
 ROOT_URLCONF = 'Edge.urls'
@@ -89,22 +91,152 @@ DATABASES = {
 # ===============================
 # Caching Configuration (✅ UPDATED)
 # ===============================
+MB = 1024 * 1024
+
+# Per-namespace memory budgets (bytes of pickled values). Groups are the
+# cache_stats key groups: CACHE_KEYS names plus the fixed internal groups.
+CACHE_QUOTAS = {
+    'catalog_lists': {
+        'groups': ['products_by_subcategory', 'related_products', 'all_categories',
+                   'all_subcategories', 'popular_products_list', 'product_count'],
+        'max_bytes': 20 * MB,
+    },
+    # Page cache entries, by CACHE_PAGE_GROUPS: a crawl of every product
+    # page must not push out the list pages
+    'list_pages': {'groups': ['list_pages', 'cache_page', 'cache_header'], 'max_bytes': 18 * MB},
+    'detail_pages': {'groups': ['detail_pages'], 'max_bytes': 12 * MB},
+    'sessions': {'groups': ['sessions'], 'max_bytes': 4 * MB},
+    'throttles': {'groups': ['throttle'], 'max_bytes': 1 * MB},
+    # Tag and namespace generations and locks must not be pushed out by pages
+    'internal': {'groups': ['tags', 'namespaces', 'locks', 'write_stats'], 'max_bytes': 4 * MB},
+}
+
+# Page group of each cached view, by URL name pattern (Systems.cache_stats.page_group);
+# the rest are 'list_pages'
+CACHE_PAGE_GROUPS = {
+    'detail_pages': ['*-detail', '*-detail-by-slug', 'product-related'],
+}
+
+# Opt-in compression of large pickles in the in-process cache, so more
+# catalog pages fit in the same budgets (CACHE_COMPRESSOR=zlib or lzma)
+CACHE_COMPRESSOR = config("CACHE_COMPRESSOR", default="")
+CACHE_COMPRESSION = {
+    'COMPRESSOR': CACHE_COMPRESSOR,
+    'COMPRESS_MIN_SIZE': 2048,  # Pickles smaller than this stay uncompressed
+} if CACHE_COMPRESSOR else {}
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'Systems.cache_backends.SizeAwareLRUCache',
         'LOCATION': 'edgesystems-unique-cache',
         'TIMEOUT': 900,  # 15 minutes default timeout
         'OPTIONS': {
-            'MAX_ENTRIES': 2000,  # Increased for better capacity
-            'CULL_FREQUENCY': 3,  # Remove 1/3 of entries when max is reached
+            'MAX_ENTRIES': 20000,  # Memory is bounded by MAX_BYTES; this only caps the entry count
+            'MAX_BYTES': 64 * MB,  # Everything outside CACHE_QUOTAS shares what the quotas leave over
+            'MAX_ENTRY_BYTES': 4 * MB,
+            'QUOTAS': CACHE_QUOTAS,
+            **CACHE_COMPRESSION,
         }
     },
 }
 
+# Multi-worker deployments (several gunicorn workers on one host) share a
+# file-based L2 behind a short-lived per-process L1, so an invalidation in
+# one worker reaches all of them within SYNC_INTERVAL seconds. The L2 must
+# keep add()/incr() atomic across processes (locks, generations, counts):
+# InstrumentedFileBasedCache does with file locks, plain FileBasedCache doesn't.
+CACHE_BACKEND = config("CACHE_BACKEND", default="local")  # local | two_tier
+if CACHE_BACKEND == 'two_tier':
+    CACHES = {
+        'default': {
+            'BACKEND': 'Systems.cache_backends.TwoTierCache',
+            'TIMEOUT': 900,
+            'OPTIONS': {
+                'L1': 'local',
+                'L2': 'shared',
+                'L1_TIMEOUT': 5,  # Upper bound on staleness of an overwritten entry
+                'SYNC_INTERVAL': 1,  # Upper bound on staleness after a delete/invalidation
+            }
+        },
+        'local': {
+            'BACKEND': 'Systems.cache_backends.SizeAwareLRUCache',
+            'LOCATION': 'edgesystems-l1',
+            'TIMEOUT': 5,
+            'OPTIONS': {
+                'MAX_ENTRIES': 20000,
+                'MAX_BYTES': 64 * MB,
+                'MAX_ENTRY_BYTES': 4 * MB,
+                'QUOTAS': CACHE_QUOTAS,
+                'STATS_LABEL': 'l1',
+                **CACHE_COMPRESSION,
+            }
+        },
+        'shared': {
+            'BACKEND': 'Systems.cache_backends.InstrumentedFileBasedCache',
+            'LOCATION': config("CACHE_SHARED_LOCATION", default=str(BASE_DIR / 'cache')),
+            'TIMEOUT': 900,
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+                'CULL_FREQUENCY': 3,
+                'STATS_LABEL': 'l2',
+            }
+        },
+    }
+
 # Cache middleware configuration
 CACHE_MIDDLEWARE_ALIAS = 'default'
 CACHE_MIDDLEWARE_SECONDS = 300  # 5 minutes for general pages
 CACHE_MIDDLEWARE_KEY_PREFIX = 'edgesystems'
+# Query parameters that never change a response, left out of cache keys (fnmatch patterns)
+CACHE_IGNORED_QUERY_PARAMS = ['utm_*', 'fbclid', 'gclid', 'msclkid', '_']
+
+# HTTP caching policy per URL name (Systems.middleware.CacheControlPolicyMiddleware).
+# max_age is for browsers, s_maxage for shared caches (CDN / reverse proxy),
+# which can be purged; anonymous requests only. Unlisted routes keep the
+# headers set by the page cache middleware.
+CATALOG_TREE_POLICY = {'max_age': 300, 's_maxage': 60 * 60 * 24, 'stale_while_revalidate': 60 * 60, 'stale_if_error': 60 * 60 * 24}
+PRODUCT_LIST_POLICY = {'max_age': 60, 's_maxage': 60 * 15, 'stale_while_revalidate': 60 * 5, 'stale_if_error': 60 * 60 * 24}
+PRODUCT_DETAIL_POLICY = {'max_age': 60, 's_maxage': 60 * 10, 'stale_while_revalidate': 60 * 5, 'stale_if_error': 60 * 60 * 24}
+FEATURED_POLICY = {'max_age': 60, 's_maxage': 60 * 5, 'stale_while_revalidate': 60, 'stale_if_error': 60 * 60}
+BLOG_POLICY = {'max_age': 300, 's_maxage': 60 * 60, 'stale_while_revalidate': 60 * 10, 'stale_if_error': 60 * 60 * 24}
+CACHE_CONTROL_POLICIES = {
+    'category-list': CATALOG_TREE_POLICY,
+    'category-detail': CATALOG_TREE_POLICY,
+    'category-subcategories-list': CATALOG_TREE_POLICY,
+    'category-subcategories-detail': CATALOG_TREE_POLICY,
+    'subcategory-list': CATALOG_TREE_POLICY,
+    'subcategory-detail': CATALOG_TREE_POLICY,
+    'product-all-categories': CATALOG_TREE_POLICY,
+    'product-all-subcategories': CATALOG_TREE_POLICY,
+    'product-list': PRODUCT_LIST_POLICY,
+    'subcategory-products-list': PRODUCT_LIST_POLICY,
+    'product-detail': PRODUCT_DETAIL_POLICY,
+    'subcategory-products-detail': PRODUCT_DETAIL_POLICY,
+    'product-related': PRODUCT_DETAIL_POLICY,
+    'popular-products': FEATURED_POLICY,
+    'hero-banners': FEATURED_POLICY,
+    'blog-list': BLOG_POLICY,
+    'blog-detail': BLOG_POLICY,
+    'blog-footer-blogs': BLOG_POLICY,
+}
+CACHE_CONTROL_PRIVATE = {'max_age': 0}  # Authenticated responses: browser only, revalidated via ETag
+# Public responses list their cache tags in these headers (Fastly / Cloudflare)
+CACHE_SURROGATE_KEY_HEADERS = ['Surrogate-Key', 'Cache-Tag']
+
+# Edge purges (Systems/cdn_purge.py): invalidated tags are queued in the
+# database and sent by `manage.py process_purge_queue`
+CDN_PURGE = {
+    'ENABLED': config("CDN_PURGE_ENABLED", default=False, cast=bool),
+    'CLIENT': config("CDN_PURGE_CLIENT", default="Systems.cdn_purge.LocalPurgeClient"),  # or Systems.cdn_purge.HTTPPurgeClient
+    'OPTIONS': {
+        'URL': config("CDN_PURGE_URL", default=""),
+        'TOKEN': config("CDN_PURGE_TOKEN", default=""),
+    },
+    'BATCH_SIZE': 30,  # Keys per purge call (Cloudflare's limit)
+    'MAX_ATTEMPTS': 8,  # Retries back off from RETRY_DELAY, doubling
+    'RETRY_DELAY': 5,
+    'POLL_INTERVAL': 1,
+}
 
 # Cache key prefixes for different data types
 CACHE_KEYS = {
@@ -116,6 +248,106 @@ CACHE_KEYS = {
     'all_subcategories': 'subcategories:all',
     'category_detail': 'category:detail:{}',
     'subcategory_detail': 'subcategory:detail:{}',
+    'product_count': 'products:count:{}',
+}
+
+# Cache tags: every cached payload/response records the entities it depends on,
+# and a write purges only the entries carrying the affected tags.
+CACHE_TAGS = {
+    'product': 'product:{}',
+    'subcategory': 'subcategory:{}',
+    'category': 'category:{}',
+    'blog': 'blog:{}',
+    'banner': 'banner',
+    'categories': 'categories',
+    'blogs': 'blogs',
+    'products': 'products',
+    'popular': 'products:popular',
+    'slug': 'slug:{}:{}',  # Model name, slug; purges negative (404) cache entries
+}
+CACHE_NEGATIVE_TIMEOUT = 60  # Seconds an unknown slug is remembered as missing
+PRODUCT_COUNT_TIMEOUT = 60 * 5  # Cached listing totals (Systems/pagination.py); kept current by signals meanwhile
+CACHE_ETAG_SALT = config("CACHE_ETAG_SALT", default="")  # Change (e.g. to the release id) when serializers change, to retire every ETag
+
+# Versioned cache namespaces: bumping a namespace's generation counter
+# invalidates every entry built under it in constant time.
+CACHE_NAMESPACES = {
+    'catalog': 'catalog',
+    'subcategory': 'catalog:subcategory:{}',
+    'blogs': 'blogs',
+    'banners': 'banners',
+}
+# Transactions that queue more tags than this bump namespaces instead
+CACHE_BULK_INVALIDATION_THRESHOLD = 100
+
+# Single-flight rebuilds: one worker rebuilds a missing key, the rest wait
+CACHE_LOCK_TIMEOUT = 30  # Seconds before an abandoned rebuild lock expires
+CACHE_LOCK_WAIT = 5  # Seconds a caller waits for another worker's rebuild
+CACHE_LOCK_POLL_INTERVAL = 0.05
+
+# Stale-while-revalidate: after the soft TTL a value is served stale for up
+# to CACHE_STALE_TIMEOUT seconds while a background thread refreshes it.
+CACHE_STALE_TIMEOUT = 600
+CACHE_REFRESH_WORKERS = 2
+CACHE_REFRESH_QUEUE_SIZE = 32  # Pending refreshes beyond this keep serving stale
+CACHE_JSON_GZIP_MIN_SIZE = 4096  # Cached JSON bodies at least this large are stored gzipped (None disables)
+
+# Adaptive TTLs: entries tagged with entities that are rarely written stay
+# cached longer, volatile ones expire sooner. TTL = FACTOR x the expected
+# interval between writes (moving average, SMOOTHING = weight of the newest),
+# clamped to [MIN, MAX] seconds. Untracked entities keep the view's timeout.
+CACHE_ADAPTIVE_TTL = {
+    'ENABLED': True,
+    'MIN': 60,
+    'MAX': 60 * 60 * 6,
+    'FACTOR': 0.5,
+    'SMOOTHING': 0.3,
+    'HISTORY_TIMEOUT': 60 * 60 * 24 * 30,  # Write history kept per entity
+}
+
+# Cache usage stats (hits, misses, evictions, bytes, latency) per key prefix
+# and per cached view; read with `clear_cache --stats` or /api/cache/stats/.
+CACHE_STATS_ENABLED = True
+CACHE_STATS_DIR = BASE_DIR / 'logs' / 'cache_stats'  # Each process publishes <pid>.json here
+CACHE_STATS_FLUSH_INTERVAL = 10  # Seconds between publishes
+CACHE_STATS_STALE_AFTER = 60  # Snapshots older than this are from exited workers and get deleted
+
+# Queries issued while a serializer renders one instance mean a relation
+# wasn't preloaded (Systems/eager_loading.py): 'raise' (tests), 'warn' or None
+EAGER_LOADING_GUARD = config("EAGER_LOADING_GUARD", default="warn" if DEBUG else "") or None
+
+# SQL query budgets per URL name (Systems.middleware.QueryBudgetMiddleware),
+# for a cold cache. Over budget: 'log' a warning, or 'raise' (tests).
+# Systems/tests.py pins the exact counts.
+QUERY_BUDGET_ENABLED = config("QUERY_BUDGET_ENABLED", default=DEBUG, cast=bool)
+QUERY_BUDGET_MODE = config("QUERY_BUDGET_MODE", default="log")
+QUERY_BUDGET_DEFAULT = 20
+QUERY_BUDGETS = {
+    'product-list': 6,
+    'product-detail': 6,
+    'product-related': 8,
+    'subcategory-products-list': 6,
+    'popular-products': 6,
+    'category-list': 4,
+    'subcategory-list': 4,
+    'category-subcategories-list': 4,
+    'blog-list': 4,
+    'blog-detail': 4,
+    'blog-footer-blogs': 4,
+    'hero-banners': 4,
+}
+
+# Cache warmer (Systems/cache_warmer.py): renders the public endpoints so the
+# first visitors after a deploy or a bulk invalidation hit a warm cache
+CACHE_WARMER = {
+    'ON_STARTUP': config("CACHE_WARM_ON_STARTUP", default=False, cast=bool),
+    'AFTER_BULK_INVALIDATION': True,
+    'DELAY': 2,  # Seconds to wait, so a burst of bulk writes is warmed once
+    'WORKERS': 4,
+    'HOST': config("CACHE_WARM_HOST", default=""),  # Host visitors use (page cache keys contain it); "" = first ALLOWED_HOSTS entry
+    'SECURE': config("CACHE_WARM_SECURE", default=not DEBUG, cast=bool),
+    'SUBCATEGORY_PAGES': 2,  # Pages of each subcategory's product list
+    'TOP_PRODUCTS': 50,  # Popular first, then newest: detail + related
 }
 
 # Password validation
@@ -233,8 +465,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 40,
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'Systems.throttling.WarmerExemptAnonRateThrottle',
+        'Systems.throttling.WarmerExemptUserRateThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/hour',
@@ -289,6 +521,19 @@ os.makedirs(logs_dir, exist_ok=True)
 if not DEBUG:
     DATABASES['default']['CONN_MAX_AGE'] = 60
 
+# SQLite tuning, applied to every new connection (Systems/db.py). WAL lets
+# reads run while a write commits, and busy_timeout makes writers wait for
+# the lock instead of failing with "database is locked". Measure with
+# `manage.py benchmark_sqlite`; set to {} to keep SQLite's defaults.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # Persistent: stored in the database file
+    'synchronous': 'NORMAL',  # Durable with WAL up to the last commits before a power loss
+    'mmap_size': 256 * MB,
+    'cache_size': -64 * 1024,  # Negative means KiB: 64 MB of page cache per connection
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,  # Milliseconds
+}
+
 # Static files optimization
 STATICFILES_FINDERS = [
     'django.contrib.staticfiles.finders.FileSystemFinder',
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from import_export.admin import ImportExportModelAdmin
 from django.utils.html import format_html
@@ -6,7 +7,7 @@ from import_export import resources, fields
 from import_export.widgets import ForeignKeyWidget
 from .models import Category, Subcategory, Product, SpecificationTable, SpecificationRow, Blog, HeroBanner
 from allauth.socialaccount.models import SocialApp
-from django.core.cache import cache
+from .cache_utils import invalidate_tags, make_tag
 
 admin.site.unregister(SocialApp)
 
@@ -338,25 +339,24 @@ class HeroBannerAdmin(admin.ModelAdmin):
     
     def activate_banners(self, request, queryset):
         """Bulk action to activate selected banners"""
-        count = queryset.update(is_active=True)
-        cache.delete('active_hero_banners')
+        # queryset.update() bypasses model signals and auto_now
+        count = queryset.update(is_active=True, updated_at=timezone.now())
+        invalidate_tags(make_tag('banner'))
         self.message_user(request, f'{count} banner(s) successfully activated and are now LIVE. Cache cleared!')
     activate_banners.short_description = 'Activate selected banners'
     
     def deactivate_banners(self, request, queryset):
         """Bulk action to deactivate selected banners"""
-        count = queryset.update(is_active=False)
-        cache.delete('active_hero_banners')
+        count = queryset.update(is_active=False, updated_at=timezone.now())
+        invalidate_tags(make_tag('banner'))
         self.message_user(request, f'{count} banner(s) successfully deactivated. Cache cleared!')
     deactivate_banners.short_description = 'Deactivate selected banners'
     
     def save_model(self, request, obj, form, change):
         """Clear hero banner cache when saving and show helpful message"""
+        # Cache is invalidated by the post_save signal (Systems/signals.py)
         super().save_model(request, obj, form, change)
         
-        # ✅ CLEAR CACHE IMMEDIATELY AFTER SAVING
-        cache.delete('active_hero_banners')
-        
         if obj.is_active:
             self.message_user(
                 request,
@@ -373,5 +373,4 @@ class HeroBannerAdmin(admin.ModelAdmin):
     def delete_model(self, request, obj):
         """Clear cache when deleting a banner"""
         super().delete_model(request, obj)
-        cache.delete('active_hero_banners')
         self.message_user(request, 'Banner deleted and cache cleared.')
\ No newline at end of file
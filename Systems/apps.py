@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class SystemsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Systems'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - connects cache invalidation receivers
+        from .cache_warmer import warm_on_startup
+        from .db import configure_sqlite_connection
+
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='configure_sqlite_connection')
+        warm_on_startup()
@@ -0,0 +1,707 @@
+"""
+Cache backends for the Systems app.
+
+TwoTierCache puts a short-lived per-process L1 (e.g. LocMemCache) in front
+of a cache shared by all workers on the host (e.g. FileBasedCache or
+DatabaseCache on SQLite), so invalidations reach every worker.
+
+InstrumentedLocMemCache and InstrumentedFileBasedCache are the stock Django
+backends recording their usage in cache_stats. SizeAwareLRUCache replaces
+LocMemCache's count-based culling with byte budgets and true LRU eviction.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import glob
+import logging
+import lzma
+import os
+import pickle
+import threading
+import time
+import zlib
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+from .cache_stats import key_group, stats, stats_enabled
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Keys that must always hit the shared tier: rebuild locks, write stats and
+# cached counts (atomic add() or incr()), plus sessions and throttle
+# counters, which must be consistent across workers. Matched against the
+# key without its namespace generations (get_cache_key(..., namespaces=...)).
+DEFAULT_L2_ONLY_PREFIXES = ('lock:', 'writes:', 'products:count:', 'throttle_', 'django.contrib.sessions')
+
+# Namespace and tag generations: read on every tagged lookup, so kept in L1,
+# but for no longer than SYNC_INTERVAL seconds. An incr() elsewhere then
+# reaches every worker as fast as the epoch would, without dropping their L1s.
+DEFAULT_GENERATION_PREFIXES = ('ns:',)
+
+EPOCH_KEY = 'two_tier:epoch'
+
+_MISSING = object()
+
+
+def raw_key(backend, made_key):
+    """Inverse of the default KEY_FUNCTION: '<prefix>:<version>:<key>' -> '<key>'."""
+    return made_key[len(backend.key_prefix) + 1:].split(':', 1)[-1]
+
+# Sync state is shared by every thread's instance of a given (L1, L2) pair
+_sync_states = {}
+_sync_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    """
+    Per-process L1 in front of a shared L2.
+
+    Reads go to L1 first, then L2 (filling L1 for L1_TIMEOUT seconds).
+    Writes go to both. Deletes, clears and counter updates also bump an
+    epoch counter in L2; every process compares it at most once per
+    SYNC_INTERVAL seconds and drops its whole L1 when it changed. An
+    invalidation in one worker is therefore seen by all workers within
+    SYNC_INTERVAL seconds, and an overwrite within L1_TIMEOUT seconds.
+
+    Generations (GENERATION_PREFIXES) stay in L1 for SYNC_INTERVAL seconds
+    at most, so bumping one doesn't bump the epoch. L2_ONLY_PREFIXES keys
+    never enter L1.
+
+    add() and incr() are only as atomic as L2's: the single-flight rebuild
+    locks, namespace and tag generations, the epoch and the cached counts
+    rely on them across processes. InstrumentedFileBasedCache makes them
+    atomic with file locks; the stock FileBasedCache doesn't.
+
+    Example:
+        CACHES = {
+            'default': {
+                'BACKEND': 'Systems.cache_backends.TwoTierCache',
+                'OPTIONS': {'L1': 'local', 'L2': 'shared', 'L1_TIMEOUT': 5, 'SYNC_INTERVAL': 1},
+            },
+            'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'l1'},
+            'shared': {'BACKEND': 'Systems.cache_backends.InstrumentedFileBasedCache', 'LOCATION': '/var/tmp/edge'},
+        }
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.l1_alias = options.get('L1', 'local')
+        self.l2_alias = options.get('L2', 'shared')
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.sync_interval = options.get('SYNC_INTERVAL', 1)
+        self.l2_only_prefixes = tuple(options.get('L2_ONLY_PREFIXES', DEFAULT_L2_ONLY_PREFIXES))
+        self.generation_prefixes = tuple(options.get('GENERATION_PREFIXES', DEFAULT_GENERATION_PREFIXES))
+
+    @property
+    def l1(self):
+        return caches[self.l1_alias]
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    # -----------------------------
+    # Tier helpers
+    # -----------------------------
+    def _l2_only(self, key):
+        return str(key).rpartition('|')[2].startswith(self.l2_only_prefixes)
+
+    def _is_generation(self, key):
+        return str(key).startswith(self.generation_prefixes)
+
+    def _set_l1(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        """Copy entries to L1: generations for SYNC_INTERVAL seconds at most, the rest for L1_TIMEOUT."""
+        generations = {key: value for key, value in data.items() if self._is_generation(key)}
+        others = {key: value for key, value in data.items() if key not in generations}
+        for entries, limit in ((generations, self.sync_interval), (others, self.l1_timeout)):
+            if entries:
+                l1_timeout = limit if timeout is DEFAULT_TIMEOUT or timeout is None else min(timeout, limit)
+                self.l1.set_many(entries, l1_timeout, version=version)
+
+    def _sync(self):
+        """Drop L1 if another process invalidated something since the last check."""
+        state_key = (self.l1_alias, self.l2_alias)
+        now = time.monotonic()
+        state = _sync_states.get(state_key)
+        if state is not None and now - state['checked_at'] < self.sync_interval:
+            return
+        with _sync_lock:
+            state = _sync_states.setdefault(state_key, {'epoch': _MISSING, 'checked_at': 0.0})
+            if now - state['checked_at'] < self.sync_interval:
+                return
+            epoch = self.l2.get(EPOCH_KEY)
+            if state['epoch'] is not _MISSING and epoch != state['epoch']:
+                self.l1.clear()
+            state['epoch'] = epoch
+            state['checked_at'] = now
+
+    def _bump_epoch(self):
+        try:
+            epoch = self.l2.incr(EPOCH_KEY)
+        except ValueError:
+            epoch = int(time.time() * 1000)
+            self.l2.set(EPOCH_KEY, epoch, None)
+        # Our own L1 was already updated; don't drop it on the next sync
+        state = _sync_states.get((self.l1_alias, self.l2_alias))
+        if state is not None:
+            state['epoch'] = epoch
+
+    # -----------------------------
+    # Cache API
+    # -----------------------------
+    def get(self, key, default=None, version=None):
+        if self._l2_only(key):
+            return self.l2.get(key, default, version=version)
+        self._sync()
+        value = self.l1.get(key, _MISSING, version=version)
+        if value is not _MISSING:
+            return value
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        self._set_l1({key: value}, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = {}
+        l1_keys = [key for key in keys if not self._l2_only(key)]
+        if l1_keys:
+            self._sync()
+            found.update(self.l1.get_many(l1_keys, version=version))
+        missing = [key for key in keys if key not in found]
+        if missing:
+            from_l2 = self.l2.get_many(missing, version=version)
+            found.update(from_l2)
+            self._set_l1({key: value for key, value in from_l2.items() if not self._l2_only(key)}, version=version)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        if not self._l2_only(key):
+            self._set_l1({key: value}, timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        self._set_l1(
+            {key: value for key, value in data.items() if not self._l2_only(key) and key not in failed},
+            timeout, version=version,
+        )
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added and not self._l2_only(key):
+            self._set_l1({key: value}, timeout, version=version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def has_key(self, key, version=None):
+        if not self._l2_only(key):
+            self._sync()
+            if self.l1.has_key(key, version=version):
+                return True
+        return self.l2.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        if self._l2_only(key):
+            return self.l2.delete(key, version=version)
+        self.l1.delete(key, version=version)
+        deleted = self.l2.delete(key, version=version)
+        self._bump_epoch()
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        local = [key for key in keys if not self._l2_only(key)]
+        if local:
+            self.l1.delete_many(local, version=version)
+        self.l2.delete_many(keys, version=version)
+        if local:
+            self._bump_epoch()
+
+    def incr(self, key, delta=1, version=None):
+        value = self.l2.incr(key, delta, version=version)
+        if not self._l2_only(key):
+            self.l1.delete(key, version=version)
+            if not self._is_generation(key):
+                self._bump_epoch()
+        return value
+
+    def clear(self):
+        self.l1.clear()
+        self.l2.clear()
+        self._bump_epoch()
+
+    def close(self, **kwargs):
+        self.l1.close(**kwargs)
+        self.l2.close(**kwargs)
+
+
+class InstrumentedCacheMixin:
+    """
+    Records hits, misses, sets, deletes and get/set latency per key group
+    (cache_stats.key_group). Backends report bytes written and evictions
+    through record_bytes() and record_evictions().
+
+    OPTIONS['STATS_LABEL'] is appended to group names, to tell the tiers of
+    a TwoTierCache apart.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        params = args[-1] if args else kwargs.get('params', {})
+        self.stats_label = params.get('OPTIONS', {}).get('STATS_LABEL')
+        self.stats_enabled = stats_enabled()
+        self._stats_group = None
+
+    def stats_group(self, key):
+        group = key_group(key)
+        return f'{group}@{self.stats_label}' if self.stats_label else group
+
+    def get(self, key, default=None, version=None):
+        if not self.stats_enabled:
+            return super().get(key, default, version=version)
+        start = time.perf_counter()
+        value = super().get(key, _MISSING, version=version)
+        stats.record_get(self.stats_group(key), value is not _MISSING, time.perf_counter() - start)
+        return default if value is _MISSING else value
+
+    def _timed_write(self, write, key, *args, **kwargs):
+        if not self.stats_enabled:
+            return write(key, *args, **kwargs)
+        # Backends are per-thread, so the group can be handed to the byte hooks on self
+        self._stats_group = self.stats_group(key)
+        start = time.perf_counter()
+        try:
+            result = write(key, *args, **kwargs)
+        finally:
+            self._stats_group = None
+        if result is not False:
+            stats.record_set(self.stats_group(key), time.perf_counter() - start)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._timed_write(super().set, key, value, timeout, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._timed_write(super().add, key, value, timeout, version=version)
+
+    def delete(self, key, version=None):
+        deleted = super().delete(key, version=version)
+        if self.stats_enabled and deleted:
+            stats.record_delete(self.stats_group(key))
+        return deleted
+
+    def record_bytes(self, size, raw_size=None):
+        if self._stats_group is not None:
+            stats.record_bytes(self._stats_group, size, raw_size)
+
+    def record_evictions(self, group, count=1):
+        if self.stats_enabled:
+            stats.record_evictions(f'{group}@{self.stats_label}' if self.stats_label else group, count)
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    """LocMemCache with usage stats and per-group eviction counts."""
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.record_bytes(len(value))
+        super()._set(key, value, timeout)
+
+    def _cull(self):
+        if self._cull_frequency == 0:
+            for made_key in self._cache:
+                self.record_evictions(key_group(raw_key(self, made_key)))
+            return super()._cull()
+        # Same as LocMemCache._cull (least recently used entries go first)
+        for _ in range(len(self._cache) // self._cull_frequency):
+            made_key, _ = self._cache.popitem()
+            del self._expire_info[made_key]
+            self.record_evictions(key_group(raw_key(self, made_key)))
+
+    def usage(self):
+        with self._lock:
+            return {
+                'entries': len(self._cache),
+                'bytes': sum(len(value) for value in self._cache.values()),
+                'max_entries': self._max_entries,
+            }
+
+
+class InstrumentedFileBasedCache(InstrumentedCacheMixin, FileBasedCache):
+    """
+    FileBasedCache with usage stats. File names are hashed, so evictions are
+    not attributed to groups.
+
+    FileBasedCache's add() and incr() read, then write: two processes can
+    both add the same key or lose an increment. Here they run under an
+    exclusive flock on one of LOCK_STRIPES lock files in the cache directory
+    (picked by key), which makes them atomic across processes and threads
+    on the host. Without fcntl (Windows) they are FileBasedCache's. incr()
+    also keeps the entry's expiry, where FileBasedCache's resets it to the
+    default timeout.
+
+    Keys starting with OPTIONS['PINNED_PREFIXES'] (namespace and tag
+    generations by default) are stored in a subdirectory that culling
+    skips: evicting a generation invalidates everything stamped with it.
+    Expired ones are dropped when the cache is culled.
+    """
+    lock_stripes = 64
+    pinned_dir = 'pinned'
+
+    _culling = False
+
+    def __init__(self, dir, params):
+        self.pinned_prefixes = tuple(params.get('OPTIONS', {}).get('PINNED_PREFIXES', DEFAULT_GENERATION_PREFIXES))
+        super().__init__(dir, params)
+
+    def _createdir(self):
+        super()._createdir()
+        old_umask = os.umask(0o077)
+        try:
+            os.makedirs(os.path.join(self._dir, self.pinned_dir), 0o700, exist_ok=True)
+        finally:
+            os.umask(old_umask)
+
+    def _key_to_file(self, key, version=None):
+        fname = super()._key_to_file(key, version)
+        if str(key).startswith(self.pinned_prefixes):
+            return os.path.join(self._dir, self.pinned_dir, os.path.basename(fname))
+        return fname
+
+    def _list_pinned_files(self):
+        return glob.glob(os.path.join(glob.escape(self._dir), self.pinned_dir, f'*{self.cache_suffix}'))
+
+    @contextmanager
+    def _key_lock(self, key, version=None):
+        if fcntl is None:
+            yield
+            return
+        self._createdir()
+        stripe = zlib.crc32(self._key_to_file(key, version).encode()) % self.lock_stripes
+        # Not *.djcache, so neither culled nor counted as entries
+        with open(os.path.join(self._dir, f'stripe-{stripe}.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._key_lock(key, version):
+            return super().add(key, value, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        with self._key_lock(key, version):
+            try:
+                with open(self._key_to_file(key, version), 'rb') as f:
+                    if self._is_expired(f):
+                        raise ValueError(f"Key '{key}' not found")
+                    f.seek(0)
+                    expiry = pickle.load(f)
+                    value = pickle.loads(zlib.decompress(f.read()))
+            except FileNotFoundError:
+                raise ValueError(f"Key '{key}' not found")
+            new_value = value + delta
+            timeout = None if expiry is None else max(expiry - time.time(), 0.001)
+            self.set(key, new_value, timeout, version=version)
+            return new_value
+
+    def _write_content(self, file, timeout, value):
+        # Same as FileBasedCache._write_content, keeping the pickled size for the compression ratio
+        expiry = self.get_backend_timeout(timeout)
+        file.write(pickle.dumps(expiry, self.pickle_protocol))
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        file.write(zlib.compress(pickled))
+        self.record_bytes(file.tell(), len(pickled))
+
+    def _cull(self):
+        if len(self._list_cache_files()) < self._max_entries:
+            return
+        self._culling = True
+        try:
+            super()._cull()
+        finally:
+            self._culling = False
+        for fname in self._list_pinned_files():
+            try:
+                with open(fname, 'rb') as f:
+                    self._is_expired(f)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        super().clear()
+        # CULL_FREQUENCY = 0 culls with clear()
+        if not self._culling:
+            for fname in self._list_pinned_files():
+                self._delete(fname)
+
+    def _delete(self, fname):
+        deleted = super()._delete(fname)
+        if deleted and self._culling:
+            self.record_evictions('unattributed')
+        return deleted
+
+    def usage(self):
+        files = self._list_cache_files()
+        size = 0
+        for fname in files:
+            try:
+                size += os.path.getsize(fname)
+            except OSError:
+                pass
+        return {
+            'entries': len(files), 'bytes': size, 'max_entries': self._max_entries,
+            'pinned': len(self._list_pinned_files()),
+        }
+
+
+DEFAULT_QUOTA = 'default'
+
+# Codec name -> (marker byte, compress(data, level), decompress). Pickles
+# (protocol 2+) start with b'\x80', so an entry starting with anything
+# else is compressed.
+PICKLE_MARKER = b'\x80'
+COMPRESSORS = {
+    'zlib': (b'z', lambda data, level: zlib.compress(data, 6 if level is None else level), zlib.decompress),
+    'lzma': (b'x', lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+
+# Byte accounting of each LRULocMemCache LOCATION, shared like LocMemCache's storage
+_lru_states = {}
+
+
+class _LRUState:
+    def __init__(self):
+        self.sizes = {}  # made key -> (quota, bytes)
+        self.orders = {}  # quota -> OrderedDict of made keys, least recently used first
+        self.quota_bytes = {}  # quota -> bytes
+        self.total_bytes = 0
+
+    def reset(self):
+        self.__init__()
+
+
+class LRULocMemCache(LocMemCache):
+    """
+    LocMemCache with byte budgets and true LRU eviction.
+
+    Keys are assigned to quotas by their cache_stats.key_group(). Storing an
+    entry evicts the least recently used entries of its own quota until it
+    fits, so a few large catalog pages cannot push out thousands of small
+    hot entries elsewhere. Keys in no quota share the 'default' quota, which
+    gets whatever MAX_BYTES leaves over. MAX_ENTRIES still caps the entry
+    count, evicting the least recently used entry overall.
+
+    Entries larger than MAX_ENTRY_BYTES or their quota are not stored.
+
+    Optionally, pickles of at least COMPRESS_MIN_SIZE bytes are compressed
+    with COMPRESSOR ('zlib' or 'lzma', at COMPRESS_LEVEL) and kept that way
+    when it saves space. Budgets count the stored (compressed) size.
+
+    Example OPTIONS:
+        {
+            'MAX_ENTRIES': 20000,
+            'MAX_BYTES': 64 * 1024 * 1024,
+            'MAX_ENTRY_BYTES': 4 * 1024 * 1024,
+            'QUOTAS': {
+                'catalog_lists': {'groups': ['products_by_subcategory', 'related_products'], 'max_bytes': 24 * 1024 * 1024},
+                'sessions': {'groups': ['sessions'], 'max_bytes': 4 * 1024 * 1024},
+            },
+            'COMPRESS_MIN_SIZE': 1024,
+            'COMPRESSOR': 'zlib',
+        }
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        options = params.get('OPTIONS', {})
+        self._max_bytes = options.get('MAX_BYTES')
+        self._max_entry_bytes = options.get('MAX_ENTRY_BYTES')
+        self._quota_limits = {}
+        self._quota_for_group = {}
+        for quota, config in options.get('QUOTAS', {}).items():
+            self._quota_limits[quota] = config['max_bytes']
+            for group in config.get('groups', ()):
+                self._quota_for_group[group] = quota
+        if self._max_bytes is not None:
+            remaining = self._max_bytes - sum(self._quota_limits.values())
+            if remaining < 0:
+                raise ImproperlyConfigured(f"Cache quotas of '{name}' add up to more than MAX_BYTES")
+            self._quota_limits.setdefault(DEFAULT_QUOTA, remaining)
+        self._state = _lru_states.setdefault(name, _LRUState())
+
+        self._compress_min_size = options.get('COMPRESS_MIN_SIZE')
+        self._compress_level = options.get('COMPRESS_LEVEL')
+        codec = options.get('COMPRESSOR', 'zlib')
+        if codec not in COMPRESSORS:
+            raise ImproperlyConfigured(f"Unknown cache COMPRESSOR '{codec}', expected one of {sorted(COMPRESSORS)}")
+        self._compressor = COMPRESSORS[codec]
+        self._raw_size = None
+
+    def quota_for(self, made_key):
+        return self._quota_for_group.get(key_group(raw_key(self, made_key)), DEFAULT_QUOTA)
+
+    # Stats hooks, provided by InstrumentedCacheMixin in SizeAwareLRUCache
+    def record_bytes(self, size, raw_size=None):
+        pass
+
+    def record_evictions(self, group, count=1):
+        pass
+
+    # -----------------------------
+    # Serialization
+    # -----------------------------
+    def _encode(self, value):
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        # Backends are per-thread, so _set() can pick the raw size up from here
+        self._raw_size = len(pickled)
+        if self._compress_min_size is None or len(pickled) < self._compress_min_size:
+            return pickled
+        marker, compress, _ = self._compressor
+        compressed = marker + compress(pickled, self._compress_level)
+        return compressed if len(compressed) < len(pickled) else pickled
+
+    def _decode(self, blob):
+        marker = blob[:1]
+        if marker == PICKLE_MARKER:
+            return pickle.loads(blob)
+        for codec_marker, _, decompress in COMPRESSORS.values():
+            if marker == codec_marker:
+                return pickle.loads(decompress(blob[1:]))
+        raise ValueError(f'Unknown cache entry encoding {marker!r}')
+
+    # -----------------------------
+    # Storage (called with self._lock held)
+    # -----------------------------
+    def _touch_lru(self, key):
+        self._cache.move_to_end(key, last=False)
+        quota = self._state.sizes[key][0]
+        self._state.orders[quota].move_to_end(key)
+
+    def _evict(self, key):
+        self._delete(key)
+        self.record_evictions(key_group(raw_key(self, key)))
+
+    def _store(self, key, value, expiry):
+        state = self._state
+        size = len(value)
+        quota = self.quota_for(key)
+        limit = self._quota_limits.get(quota)
+        self._delete(key)
+        if (self._max_entry_bytes and size > self._max_entry_bytes) or (limit is not None and size > limit):
+            logger.debug(f"Not caching {key}: {size} bytes exceeds the '{quota}' budget")
+            return False
+
+        order = state.orders.setdefault(quota, OrderedDict())
+        if limit is not None:
+            while order and state.quota_bytes.get(quota, 0) + size > limit:
+                self._evict(next(iter(order)))
+        while self._cache and len(self._cache) >= self._max_entries:
+            self._evict(next(reversed(self._cache)))
+
+        self._cache[key] = value
+        self._cache.move_to_end(key, last=False)
+        self._expire_info[key] = expiry
+        state.sizes[key] = (quota, size)
+        order[key] = None
+        state.quota_bytes[quota] = state.quota_bytes.get(quota, 0) + size
+        state.total_bytes += size
+        return True
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        if self._store(key, value, self.get_backend_timeout(timeout)):
+            self.record_bytes(len(value), self._raw_size)
+
+    def _delete(self, key):
+        try:
+            del self._cache[key]
+            del self._expire_info[key]
+        except KeyError:
+            return False
+        quota, size = self._state.sizes.pop(key)
+        self._state.orders[quota].pop(key, None)
+        self._state.quota_bytes[quota] -= size
+        self._state.total_bytes -= size
+        return True
+
+    # -----------------------------
+    # Cache API
+    # -----------------------------
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        blob = self._encode(value)
+        with self._lock:
+            if self._has_expired(key):
+                self._set(key, blob, timeout)
+                return True
+            return False
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._lock:
+            if self._has_expired(key):
+                self._delete(key)
+                return default
+            blob = self._cache[key]
+            self._touch_lru(key)
+        return self._decode(blob)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        blob = self._encode(value)
+        with self._lock:
+            self._set(key, blob, timeout)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._lock:
+            if self._has_expired(key):
+                self._delete(key)
+                raise ValueError("Key '%s' not found" % key)
+            new_value = self._decode(self._cache[key]) + delta
+            # Re-stored so that the size accounting follows the new value
+            self._store(key, self._encode(new_value), self._expire_info[key])
+        return new_value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._expire_info.clear()
+            self._state.reset()
+
+    def usage(self):
+        with self._lock:
+            state = self._state
+            return {
+                'entries': len(self._cache),
+                'bytes': state.total_bytes,
+                'max_entries': self._max_entries,
+                'max_bytes': self._max_bytes,
+                'quotas': {
+                    quota: {
+                        'entries': len(state.orders.get(quota, ())),
+                        'bytes': state.quota_bytes.get(quota, 0),
+                        'max_bytes': self._quota_limits.get(quota),
+                    }
+                    for quota in sorted(set(self._quota_limits) | set(state.orders))
+                },
+            }
+
+
+class SizeAwareLRUCache(InstrumentedCacheMixin, LRULocMemCache):
+    """LRULocMemCache with usage stats (see InstrumentedCacheMixin)."""
@@ -0,0 +1,378 @@
+"""
+Cache usage counters.
+
+The instrumented cache backends (see cache_backends) and the cache
+middleware record hits, misses, sets, deletes, evictions, bytes written and
+get/set latency here, grouped by key prefix (settings.CACHE_KEYS) and by
+cached view. Each process publishes its counters to CACHE_STATS_DIR every
+CACHE_STATS_FLUSH_INTERVAL seconds, so `clear_cache --stats` and the stats
+endpoint can report on every worker, not just their own process. Snapshots
+older than CACHE_STATS_STALE_AFTER seconds are from workers that exited (or
+have been idle since) and are dropped; a live worker publishes its
+cumulative counters again on its next cache access.
+"""
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from fnmatch import fnmatchcase
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (milliseconds) of the latency histogram buckets
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100)
+
+# Keys not built from settings.CACHE_KEYS, checked before it
+FIXED_KEY_GROUPS = (
+    ('views.decorators.cache.cache_page.', 'cache_page'),
+    ('views.decorators.cache.cache_header.', 'cache_header'),
+    ('ns:tag:', 'tags'),
+    ('ns:', 'namespaces'),
+    ('lock:', 'locks'),
+    ('writes:', 'write_stats'),
+    ('throttle_', 'throttle'),
+    ('django.contrib.sessions', 'sessions'),
+)
+
+# Page cache keys carry the page group of their view (see page_group()) right
+# after these prefixes, so list and detail pages can get separate quotas
+PAGE_CACHE_PREFIXES = ('views.decorators.cache.cache_page.', 'views.decorators.cache.cache_header.')
+DEFAULT_PAGE_GROUP = 'list_pages'
+
+# raw_bytes is the pickled size before compression; raw_bytes / bytes_written
+# is the compression ratio. ttl_total / ttl_samples is the average TTL chosen
+# (see cache_utils.adaptive_timeout).
+COUNTER_FIELDS = (
+    'hits', 'misses', 'sets', 'deletes', 'evictions', 'bytes_written', 'raw_bytes', 'ttl_total', 'ttl_samples',
+)
+
+_key_prefixes = None
+
+
+def _bucket_labels():
+    return [f'<={bound}' for bound in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}']
+
+
+def _bucket_index(elapsed):
+    elapsed_ms = elapsed * 1000
+    for index, bound in enumerate(LATENCY_BUCKETS_MS):
+        if elapsed_ms <= bound:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+def _new_counters():
+    counters = dict.fromkeys(COUNTER_FIELDS, 0)
+    counters['get_latency_ms'] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    counters['set_latency_ms'] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    return counters
+
+
+def key_group(key):
+    """
+    Name of the stats group a raw cache key belongs to.
+
+    Example:
+        key_group('catalog.v17|products:subcategory:detectors:anon:3f2a...')
+        # Returns: 'products_by_subcategory'
+    """
+    global _key_prefixes
+    key = str(key)
+    for prefix in PAGE_CACHE_PREFIXES:
+        if key.startswith(prefix):
+            group = key[len(prefix):].split('.', 1)[0]
+            if group == DEFAULT_PAGE_GROUP or group in getattr(settings, 'CACHE_PAGE_GROUPS', {}):
+                return group
+    for prefix, group in FIXED_KEY_GROUPS:
+        if key.startswith(prefix):
+            return group
+    # Drop namespace generations (get_cache_key(..., namespaces=...))
+    key = key.rpartition('|')[2]
+    if _key_prefixes is None:
+        templates = getattr(settings, 'CACHE_KEYS', {})
+        _key_prefixes = sorted(
+            ((template.split('{', 1)[0], name) for name, template in templates.items()),
+            key=lambda item: len(item[0]), reverse=True,
+        )
+    for prefix, name in _key_prefixes:
+        if key.startswith(prefix):
+            return name
+    return key.split(':', 1)[0]
+
+
+def view_name(request):
+    """Name of the view a request is routed to, for per-view page cache stats."""
+    if not hasattr(request, '_cache_view_name'):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            # The site-wide fetch middleware runs before URL resolution
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                match = None
+        request._cache_view_name = (match.view_name or match._func_path) if match else 'unresolved'
+    return request._cache_view_name
+
+
+def page_group(request):
+    """
+    Page group of the view a request is routed to: the first entry of
+    settings.CACHE_PAGE_GROUPS with a matching URL name pattern, else
+    DEFAULT_PAGE_GROUP.
+
+    Example:
+        CACHE_PAGE_GROUPS = {'detail_pages': ['*-detail']}
+        page_group(request)  # for /api/products/detector/
+        # Returns: 'detail_pages'
+    """
+    name = view_name(request)
+    for group, patterns in getattr(settings, 'CACHE_PAGE_GROUPS', {}).items():
+        if any(fnmatchcase(name, pattern) for pattern in patterns):
+            return group
+    return DEFAULT_PAGE_GROUP
+
+
+class CacheStats:
+    """Thread-safe per-process counters, published to CACHE_STATS_DIR."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self._sections = {'keys': {}, 'views': {}}
+            self._flushed_at = time.monotonic()
+
+    def _counters(self, section, name):
+        table = self._sections[section]
+        counters = table.get(name)
+        if counters is None:
+            counters = table[name] = _new_counters()
+        return counters
+
+    def record_get(self, name, hit, elapsed, section='keys'):
+        with self._lock:
+            counters = self._counters(section, name)
+            counters['hits' if hit else 'misses'] += 1
+            counters['get_latency_ms'][_bucket_index(elapsed)] += 1
+        self._maybe_publish()
+
+    def record_set(self, name, elapsed, size=None, section='keys'):
+        with self._lock:
+            counters = self._counters(section, name)
+            counters['sets'] += 1
+            counters['set_latency_ms'][_bucket_index(elapsed)] += 1
+            if size:
+                counters['bytes_written'] += size
+        self._maybe_publish()
+
+    def record_bytes(self, name, size, raw_size=None, section='keys'):
+        with self._lock:
+            counters = self._counters(section, name)
+            counters['bytes_written'] += size
+            counters['raw_bytes'] += size if raw_size is None else raw_size
+
+    def record_ttl(self, name, ttl, section='keys'):
+        with self._lock:
+            counters = self._counters(section, name)
+            counters['ttl_total'] += ttl
+            counters['ttl_samples'] += 1
+
+    def record_delete(self, name, section='keys'):
+        with self._lock:
+            self._counters(section, name)['deletes'] += 1
+
+    def record_evictions(self, name, count=1, section='keys'):
+        with self._lock:
+            self._counters(section, name)['evictions'] += count
+
+    def snapshot(self):
+        labels = _bucket_labels()
+        with self._lock:
+            sections = {
+                section: {
+                    name: {
+                        **{field: counters[field] for field in COUNTER_FIELDS},
+                        'get_latency_ms': dict(zip(labels, counters['get_latency_ms'])),
+                        'set_latency_ms': dict(zip(labels, counters['set_latency_ms'])),
+                    }
+                    for name, counters in table.items()
+                }
+                for section, table in self._sections.items()
+            }
+        return {
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'updated_at': time.time(),
+            'backends': backend_usage(),
+            **sections,
+        }
+
+    def _maybe_publish(self):
+        interval = getattr(settings, 'CACHE_STATS_FLUSH_INTERVAL', 10)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._flushed_at < interval:
+                return
+            self._flushed_at = now
+        self.publish()
+
+    def publish(self):
+        """Write this process's snapshot to CACHE_STATS_DIR/<pid>.json."""
+        directory = stats_dir()
+        if not directory:
+            return
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, os.path.join(directory, f'{os.getpid()}.json'))
+        except OSError as e:
+            logger.warning(f"Could not publish cache stats: {e}")
+
+
+stats = CacheStats()
+
+
+def stats_enabled():
+    return getattr(settings, 'CACHE_STATS_ENABLED', True)
+
+
+def stats_dir():
+    directory = getattr(settings, 'CACHE_STATS_DIR', None)
+    return str(directory) if directory else None
+
+
+def backend_usage():
+    """Current entries/bytes of every configured backend that can report them (this process)."""
+    from django.core.cache import caches
+
+    usage = {}
+    for alias in settings.CACHES:
+        backend = caches[alias]
+        if hasattr(backend, 'usage'):
+            try:
+                usage[alias] = backend.usage()
+            except Exception as e:
+                logger.warning(f"Could not read usage of cache '{alias}': {e}")
+    return usage
+
+
+def _merge_section(merged, section):
+    for name, counters in section.items():
+        target = merged.setdefault(name, {
+            **dict.fromkeys(COUNTER_FIELDS, 0),
+            'get_latency_ms': dict.fromkeys(_bucket_labels(), 0),
+            'set_latency_ms': dict.fromkeys(_bucket_labels(), 0),
+        })
+        for field in COUNTER_FIELDS:
+            target[field] += counters.get(field, 0)
+        for histogram in ('get_latency_ms', 'set_latency_ms'):
+            for label, count in counters.get(histogram, {}).items():
+                target[histogram][label] = target[histogram].get(label, 0) + count
+
+
+def histogram_percentile(histogram, fraction):
+    """Upper bound label of the bucket holding the given fraction of samples."""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    seen = 0
+    for label, count in histogram.items():
+        seen += count
+        if seen >= total * fraction:
+            return label
+    return label
+
+
+def _add_derived(section):
+    for counters in section.values():
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = round(counters['hits'] / lookups, 4) if lookups else None
+        counters['avg_bytes'] = counters['bytes_written'] // counters['sets'] if counters['sets'] else None
+        counters['avg_ttl'] = counters['ttl_total'] // counters['ttl_samples'] if counters['ttl_samples'] else None
+        counters['compression_ratio'] = (
+            round(counters['raw_bytes'] / counters['bytes_written'], 2) if counters['bytes_written'] else None
+        )
+        counters['get_p50_ms'] = histogram_percentile(counters['get_latency_ms'], 0.5)
+        counters['get_p95_ms'] = histogram_percentile(counters['get_latency_ms'], 0.95)
+        counters['set_p95_ms'] = histogram_percentile(counters['set_latency_ms'], 0.95)
+
+
+def stale_after():
+    """Age in seconds past which a published snapshot is dropped."""
+    default = 6 * getattr(settings, 'CACHE_STATS_FLUSH_INTERVAL', 10)
+    return getattr(settings, 'CACHE_STATS_STALE_AFTER', default)
+
+
+def collect():
+    """
+    Merge the published snapshots of every process with this process's
+    live counters. Stale snapshots (see stale_after) are deleted.
+
+    Returns:
+        {'processes': [...], 'keys': {group: counters}, 'views': {view: counters}}
+    """
+    snapshots = {}
+    directory = stats_dir()
+    if directory and os.path.isdir(directory):
+        oldest = time.time() - stale_after()
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable cache stats file {filename}: {e}")
+                continue
+            if snapshot.get('updated_at', 0) < oldest:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            snapshots[(snapshot.get('host'), snapshot.get('pid'))] = snapshot
+    current = stats.snapshot()
+    # A process that never touched the cache (e.g. the management command) is left out
+    if current['keys'] or current['views']:
+        snapshots[(current['host'], current['pid'])] = current
+
+    merged = {'keys': {}, 'views': {}}
+    for snapshot in snapshots.values():
+        for section in merged:
+            _merge_section(merged[section], snapshot.get(section, {}))
+    for section in merged.values():
+        _add_derived(section)
+
+    return {
+        'processes': [
+            {key: snapshot[key] for key in ('host', 'pid', 'started_at', 'updated_at', 'backends')}
+            for snapshot in snapshots.values()
+        ],
+        **merged,
+    }
+
+
+def reset_all():
+    """Reset this process's counters and delete every published snapshot."""
+    stats.reset()
+    directory = stats_dir()
+    if directory and os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if filename.endswith('.json'):
+                try:
+                    os.remove(os.path.join(directory, filename))
+                except OSError:
+                    pass
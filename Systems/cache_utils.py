@@ -5,37 +5,492 @@ Place this file in your Systems app directory.
 
 from django.core.cache import cache
 from django.conf import settings
+from django.db import connections, transaction
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import gzip
 import logging
+import threading
+import time
+import weakref
+
+from . import cache_stats
+from .cdn_purge import PURGE_ALL, enqueue_purge
+from .models import Product, Subcategory
 
 logger = logging.getLogger(__name__)
 
 
-def get_cache_key(key_template, *args):
+def get_cache_key(key_template, *args, namespaces=()):
     """
     Generate cache key from template.
+
+    When namespaces are given, their current generations are built into the
+    key, so bumping any of them (bump_namespaces) logically invalidates it.
     
     Example:
         get_cache_key('product:detail:{}', 'laptop-stand')
         # Returns: 'product:detail:laptop-stand'
+
+        get_cache_key('products:subcategory:{}', 'detectors',
+                      namespaces=['catalog', 'catalog:subcategory:detectors'])
+        # Returns: 'catalog.v17|catalog:subcategory:detectors.v3|products:subcategory:detectors'
     """
     try:
-        return key_template.format(*args) if args else key_template
+        key = key_template.format(*args) if args else key_template
     except (KeyError, IndexError) as e:
         logger.error(f"Error generating cache key: {e}")
         return None
 
+    if not namespaces:
+        return key
+    generations = get_namespace_generations(namespaces)
+    prefix = '|'.join(f'{namespace}.v{generations[namespace]}' for namespace in namespaces)
+    return f'{prefix}|{key}'
+
+
+# ===============================
+# Versioned namespaces
+# ===============================
+
+NAMESPACE_GENERATION_KEY = 'ns:{}'
+
+# Bumped along with every generation (namespace or tag), so a rebuild can
+# tell whether anything was invalidated while it ran.
+GENERATION_SEQUENCE_KEY = 'ns:#sequence'
+
+
+def make_namespace(name, *args):
+    """
+    Build a namespace name from settings.CACHE_NAMESPACES.
+
+    Example:
+        make_namespace('subcategory', 'detectors')
+        # Returns: 'catalog:subcategory:detectors'
+    """
+    template = getattr(settings, 'CACHE_NAMESPACES', {}).get(name, name)
+    return get_cache_key(template, *args)
+
+
+def _new_generation():
+    # Seeded from the clock, so a counter lost to eviction never comes back
+    # with a value that older entries were stored under.
+    return int(time.time() * 1000)
+
+
+def _generation_timeout(namespace):
+    """
+    Generations are kept until evicted, except those of slug tags: these
+    only stamp negative cache entries (get_object_or_404_cached()), so they
+    expire with them instead of piling up one per unknown slug.
+    """
+    slug_template = getattr(settings, 'CACHE_TAGS', {}).get('slug', 'slug')
+    if namespace.startswith(TAG_NAMESPACE.format(slug_template.split('{', 1)[0])):
+        return getattr(settings, 'CACHE_NEGATIVE_TIMEOUT', 60)
+    return None
+
+
+def get_namespace_generations(namespaces):
+    """Return {namespace: generation} for the given namespaces."""
+    keys = {NAMESPACE_GENERATION_KEY.format(namespace): namespace for namespace in namespaces}
+    found = cache.get_many(list(keys))
+    generations = {}
+    for key, namespace in keys.items():
+        generation = found.get(key)
+        if generation is None:
+            cache.add(key, _new_generation(), _generation_timeout(namespace))
+            generation = cache.get(key)
+        generations[namespace] = generation
+    return generations
+
+
+def generation_sequence():
+    """
+    Current value of the counter bumped with every generation.
+
+    Generations are read when a value is stored, after it was built: a write
+    that commits while data_func runs would stamp the value it makes stale
+    with the new generations. Take the sequence before building and pass it
+    as `since` when storing (set_tagged); the value is then dropped if
+    anything was invalidated in between.
+    """
+    sequence = cache.get(GENERATION_SEQUENCE_KEY)
+    if sequence is None:
+        cache.add(GENERATION_SEQUENCE_KEY, _new_generation(), None)
+        sequence = cache.get(GENERATION_SEQUENCE_KEY)
+    return sequence
+
+
+def _increment_generations(namespaces):
+    # The sequence first: a rebuild that reads a generation before it moves
+    # is stamped with the old one, one that reads it after sees the sequence moved
+    keys = {GENERATION_SEQUENCE_KEY: None}
+    keys.update((NAMESPACE_GENERATION_KEY.format(namespace), _generation_timeout(namespace)) for namespace in namespaces)
+    for key, timeout in keys.items():
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_generation(), timeout)
+
+
+def bump_namespaces(*namespaces, purge_tags=None):
+    """
+    Invalidate every entry built under the given namespaces in O(1), by
+    incrementing their generation counters. Stale entries are never read
+    again and age out of the cache on their own.
+
+    Edge caches don't know our namespaces, only the tags of the responses
+    (surrogate keys): purge_tags are purged there, e.g. the tags of the
+    subcategory behind a per-subcategory namespace. Without them the whole
+    edge is purged (PURGE_ALL), which only suits a global clear.
+    """
+    _increment_generations(namespaces)
+    if purge_tags is None:
+        enqueue_purge(PURGE_ALL)
+    else:
+        enqueue_purge(*purge_tags)
+    logger.info(f"Bumped cache namespaces: {', '.join(sorted(set(namespaces)))}")
+
+
+def namespace_response(response, *namespaces):
+    """
+    Attach namespaces to a response so the cache middleware stamps it with
+    their generations. Returns the response for chaining.
+    """
+    existing = getattr(response, 'cache_namespaces', set())
+    response.cache_namespaces = existing | set(namespaces)
+    return response
+
+
+def generations_are_current(stamp):
+    """True if a {namespace: generation} stamp matches the current generations."""
+    if not stamp:
+        return True
+    return get_namespace_generations(list(stamp)) == stamp
+
+
+# ===============================
+# Tag-based invalidation
+# ===============================
+
+# Every tag is a namespace of its own. Entries are stamped with the
+# generations of their tags when stored, and invalidate_tags() bumps them:
+# an atomic incr per tag, no registry of keys to keep consistent or prune,
+# and a counter lost to eviction only turns its entries into misses.
+TAG_NAMESPACE = 'tag:{}'
+
+# A value stored by set_tagged() and the {tag namespace: generation} stamp
+TaggedValue = namedtuple('TaggedValue', ['value', 'generations'])
+
+
+def make_tag(name, *args):
+    """
+    Build a cache tag from settings.CACHE_TAGS.
+
+    Example:
+        make_tag('product', 42)
+        # Returns: 'product:42'
+    """
+    template = getattr(settings, 'CACHE_TAGS', {}).get(name, name)
+    return get_cache_key(template, *args)
+
+
+def product_tags(product):
+    """Tags for a payload that renders a single product."""
+    return [
+        make_tag('product', product.pk),
+        make_tag('subcategory', product.subcategory_id),
+        make_tag('category', product.subcategory.category_id),
+    ]
+
+
+def embedded_catalog_tags(items):
+    """
+    Subcategory and category tags of serialized products (ProductSerializer
+    data), which embed their names and slugs: a rename then purges every
+    list showing the old ones.
+    """
+    tags = set()
+    for item in items:
+        if item.get('subcategory_detail'):
+            tags.add(make_tag('subcategory', item['subcategory_detail']['id']))
+        if item.get('category'):
+            tags.add(make_tag('category', item['category']['id']))
+    return sorted(tags)
+
+
+def tag_namespaces(tags):
+    """
+    Namespaces standing for the given tags.
+
+    Example:
+        tag_namespaces(['product:42', 'products'])
+        # Returns: ['tag:product:42', 'tag:products']
+    """
+    return sorted({TAG_NAMESPACE.format(tag) for tag in tags if tag})
+
+
+def set_tagged(cache_key, data, timeout=900, tags=(), since=None):
+    """
+    Store data under cache_key, stamped with the current generations of tags.
+
+    since is the generation_sequence() taken before data was built; if
+    anything was invalidated since, data may predate that write and is not
+    stored. Returns whether it was stored.
+    """
+    namespaces = tag_namespaces(tags)
+    generations = get_namespace_generations(namespaces) if namespaces else {}
+    if since is not None and generation_sequence() != since:
+        logger.debug(f"Not caching {cache_key}: invalidated while it was built")
+        return False
+    cache.set(cache_key, TaggedValue(data, generations), timeout)
+    return True
+
+
+def get_tagged(cache_key, default=None):
+    """
+    Value stored by set_tagged(), or default if it is missing or one of its
+    tags was invalidated since.
+    """
+    entry = cache.get(cache_key)
+    if not isinstance(entry, TaggedValue) or not generations_are_current(entry.generations):
+        return default
+    return entry.value
+
+
+def tag_response(response, *tags):
+    """
+    Attach tags to a response so the tagged cache middleware stamps the
+    stored page with their generations. Returns the response for chaining.
+    """
+    existing = getattr(response, 'cache_tags', set())
+    response.cache_tags = existing | {tag for tag in tags if tag}
+    return response
+
+
+def add_surrogate_keys(response, *tags):
+    """
+    Advertise extra tags to edge caches (Surrogate-Key / Cache-Tag headers)
+    without stamping the local cache entry with them, e.g. the id of
+    every product on a list page. Returns the response for chaining.
+    """
+    existing = getattr(response, 'surrogate_keys', set())
+    response.surrogate_keys = existing | {tag for tag in tags if tag}
+    return response
+
+
+def invalidate_tags(*tags):
+    """
+    Invalidate every cache entry stamped with any of the given tags, by
+    bumping their generations. Returns the number of tags invalidated.
+
+    Example:
+        invalidate_tags('product:42', 'products:popular')
+    """
+    namespaces = tag_namespaces(tags)
+    if not namespaces:
+        return 0
+    try:
+        _increment_generations(namespaces)
+        record_writes(*tags)
+        enqueue_purge(*tags)
+        logger.info(f"Invalidated cache tags: {', '.join(sorted({tag for tag in tags if tag}))}")
+        return len(namespaces)
+    except Exception as e:
+        logger.error(f"Error invalidating cache tags: {e}")
+        return 0
+
+
+_pending_invalidations = threading.local()
+
+
+def invalidate_tags_on_commit(*tags, using=None):
+    """
+    Queue tags for invalidation once the current transaction commits.
+
+    Every tag queued during one transaction is purged by a single
+    invalidate_tags() call, so a bulk import issues one coalesced purge.
+    Outside a transaction the purge happens immediately.
+    """
+    pending = getattr(_pending_invalidations, 'tags', None)
+    if pending is None:
+        pending = _pending_invalidations.tags = set()
+    pending.update(tag for tag in tags if tag)
+    transaction.on_commit(flush_pending_invalidations, using=using)
+
+
+def flush_pending_invalidations():
+    """Purge all tags queued by invalidate_tags_on_commit() on this thread."""
+    pending = getattr(_pending_invalidations, 'tags', None)
+    if not pending:
+        return 0
+    _pending_invalidations.tags = set()
+
+    threshold = getattr(settings, 'CACHE_BULK_INVALIDATION_THRESHOLD', 100)
+    if len(pending) > threshold:
+        # Bulk change: one counter bump beats bumping thousands of tags
+        bump_namespaces(*{namespace_for_tag(tag) for tag in pending}, purge_tags=pending)
+        _rewarm()
+        return len(pending)
+    return invalidate_tags(*pending)
+
+
+def _rewarm():
+    # Imported here: the warmer renders views, which import this module
+    from .cache_warmer import warm_after_bulk_invalidation
+
+    warm_after_bulk_invalidation()
+
+
+def namespace_for_tag(tag):
+    """Namespace whose entries may depend on the given tag."""
+    if tag == make_tag('banner'):
+        return make_namespace('banners')
+    if (tag == make_tag('blogs') or tag.startswith(make_tag('blog', ''))
+            or tag.startswith(make_tag('slug', 'blog', ''))):
+        return make_namespace('blogs')
+    return make_namespace('catalog')
+
+
+# ===============================
+# Adaptive TTLs
+# ===============================
+
+WRITE_STATS_KEY = 'writes:{}'
+
+ADAPTIVE_TTL_DEFAULTS = {
+    'ENABLED': True,
+    'MIN': 60,
+    'MAX': 60 * 60 * 6,
+    'FACTOR': 0.5,
+    'SMOOTHING': 0.3,
+    'HISTORY_TIMEOUT': 60 * 60 * 24 * 30,
+}
+
+
+def _adaptive_ttl_settings():
+    return {**ADAPTIVE_TTL_DEFAULTS, **getattr(settings, 'CACHE_ADAPTIVE_TTL', {})}
+
+
+def record_writes(*tags):
+    """
+    Record a write to the entities behind the given tags: the time of the
+    last write and a moving average of the interval between writes.
+    Called by invalidate_tags(), i.e. once per committed transaction.
+    """
+    config = _adaptive_ttl_settings()
+    keys = [WRITE_STATS_KEY.format(tag) for tag in set(tags) if tag]
+    if not config['ENABLED'] or not keys:
+        return
+    now = time.time()
+    smoothing = config['SMOOTHING']
+    try:
+        history = cache.get_many(keys)
+        updates = {}
+        for key in keys:
+            last_write, mean_interval = history.get(key, (None, None))
+            if last_write is not None:
+                interval = now - last_write
+                mean_interval = interval if mean_interval is None else (
+                    smoothing * interval + (1 - smoothing) * mean_interval
+                )
+            updates[key] = (now, mean_interval)
+        cache.set_many(updates, config['HISTORY_TIMEOUT'])
+    except Exception as e:
+        logger.error(f"Error recording cache tag writes: {e}")
+
+
+def adaptive_timeout(tags, default):
+    """
+    TTL for an entry depending on the given tags, from how often they change.
+
+    The expected time to an entity's next write is the average interval
+    between its past writes, or the time since its last write when that is
+    longer (it has gone quiet). The TTL is FACTOR times the shortest
+    expectation among the tags, clamped to [MIN, MAX]. Entries whose tags
+    have no recorded writes keep the default.
+
+    Example:
+        adaptive_timeout(['category:3', 'categories'], 900)
+        # Returns: 21600 for a category last edited months ago
+    """
+    config = _adaptive_ttl_settings()
+    keys = [WRITE_STATS_KEY.format(tag) for tag in set(tags or ()) if tag]
+    if not config['ENABLED'] or not keys:
+        return default
+    try:
+        history = cache.get_many(keys)
+    except Exception as e:
+        logger.error(f"Error reading cache tag writes: {e}")
+        return default
+    if not history:
+        return default
+    now = time.time()
+    expected = min(max(mean_interval or 0, now - last_write) for last_write, mean_interval in history.values())
+    return int(min(max(config['FACTOR'] * expected, config['MIN']), config['MAX']))
+
+
+# ===============================
+# Negative caching of unknown slugs
+# ===============================
+
+NEGATIVE_CACHE_KEY = 'missing:{}:{}:{}'
+
+
+def slug_tag(model, slug):
+    """Tag purged whenever an object of model with this slug is saved."""
+    return make_tag('slug', model._meta.model_name, slug)
+
+
+def get_object_or_404_cached(queryset, slug, *, slug_field='slug', scope='', namespaces=()):
+    """
+    get_object_or_404() by slug that remembers misses for
+    CACHE_NEGATIVE_TIMEOUT seconds, so crawlers and old links requesting
+    unknown slugs don't reach the database.
+
+    The miss is tagged with slug_tag(), which the model's post_save signal
+    purges, so it is forgotten as soon as an object with that slug is
+    created or renamed to it. scope tells apart lookups in differently
+    filtered querysets (e.g. products of one subcategory).
+
+    Example:
+        product = get_object_or_404_cached(Product.objects.all(), 'laptop-stand',
+                                           namespaces=CATALOG_NAMESPACES)
+    """
+    model = queryset.model
+    cache_key = get_cache_key(NEGATIVE_CACHE_KEY, model._meta.model_name, scope, slug, namespaces=namespaces)
+    if get_tagged(cache_key):
+        raise Http404(f'No {model._meta.object_name} matches the given query.')
+    since = generation_sequence()
+    try:
+        return get_object_or_404(queryset, **{slug_field: slug})
+    except Http404:
+        set_tagged(cache_key, True, getattr(settings, 'CACHE_NEGATIVE_TIMEOUT', 60), [slug_tag(model, slug)], since)
+        raise
+
 
 def invalidate_all_product_caches():
     """
-    Clear all product-related caches.
+    Invalidate all catalog, blog and banner caches.
     Use this when making bulk changes.
+
+    Bumps the namespace generations rather than calling cache.clear(), so
+    sessions and throttle counters in the same cache are left alone.
     """
     try:
-        cache.clear()
-        logger.info("All caches cleared successfully")
+        bump_namespaces(make_namespace('catalog'), make_namespace('blogs'), make_namespace('banners'))
+        _rewarm()
+        logger.info("All product caches invalidated successfully")
         return True
     except Exception as e:
-        logger.error(f"Error clearing all caches: {e}")
+        logger.error(f"Error invalidating product caches: {e}")
         return False
 
 
@@ -61,14 +516,16 @@ def invalidate_specific_caches(cache_keys):
         return 0
 
 
-def warm_cache(cache_key, data_func, timeout=900):
+def warm_cache(cache_key, data_func, timeout=900, tags=(), stale_timeout=None):
     """
     Pre-populate cache with data.
     
     Args:
         cache_key: Key to store data under
         data_func: Function that returns data to cache
-        timeout: Cache timeout in seconds (default 15 minutes)
+        timeout: Soft cache timeout in seconds (default 15 minutes)
+        tags: Cache tags for the entry, or a callable taking the data
+        stale_timeout: Seconds a stale value may still be served
     
     Example:
         def get_all_products():
@@ -77,8 +534,7 @@ def warm_cache(cache_key, data_func, timeout=900):
         warm_cache('products:all', get_all_products)
     """
     try:
-        data = data_func()
-        cache.set(cache_key, data, timeout)
+        _rebuild(cache_key, data_func, timeout, tags, stale_timeout)
         logger.info(f"Cache warmed for key: {cache_key}")
         return True
     except Exception as e:
@@ -86,28 +542,310 @@ def warm_cache(cache_key, data_func, timeout=900):
         return False
 
 
-def get_or_set_cache(cache_key, data_func, timeout=900):
+class _KeyLock:
+    """A threading.Lock that a WeakValueDictionary can hold."""
+    __slots__ = ('_lock', '__weakref__')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=-1):
+        return self._lock.acquire(timeout=timeout)
+
+    def release(self):
+        self._lock.release()
+
+
+# One in-process lock per key being rebuilt, dropped once no thread holds
+# or waits on it: a slow rebuild only holds up callers of the same key
+_rebuild_locks = weakref.WeakValueDictionary()
+_rebuild_locks_lock = threading.Lock()
+
+REBUILD_LOCK_KEY = 'lock:{}'
+
+
+def _rebuild_lock(cache_key):
+    with _rebuild_locks_lock:
+        lock = _rebuild_locks.get(cache_key)
+        if lock is None:
+            lock = _rebuild_locks[cache_key] = _KeyLock()
+        return lock
+
+
+def _rebuild(cache_key, data_func, timeout, tags, stale_timeout):
+    since = generation_sequence()
+    data = data_func()
+    _store(cache_key, data, timeout, tags, stale_timeout, since)
+    return data
+
+
+# ===============================
+# Stale-while-revalidate
+# ===============================
+
+# Entries written by get_or_set_cache()/warm_cache() carry a soft TTL
+# (fresh_until) inside a hard TTL (the cache timeout). Between the two the
+# stale value is served and a background refresh is scheduled.
+CachedValue = namedtuple('CachedValue', ['value', 'fresh_until'])
+
+_refresh_executor = None
+_refresh_executor_lock = threading.Lock()
+_refresh_slots = threading.BoundedSemaphore(getattr(settings, 'CACHE_REFRESH_QUEUE_SIZE', 32))
+
+
+def _get_refresh_executor():
+    global _refresh_executor
+    with _refresh_executor_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CACHE_REFRESH_WORKERS', 2),
+                thread_name_prefix='cache-refresh',
+            )
+        return _refresh_executor
+
+
+def _unwrap(entry):
+    """Return (value, is_fresh) for a cached entry."""
+    if isinstance(entry, CachedValue):
+        return entry.value, time.time() < entry.fresh_until
+    return entry, True
+
+
+def _store(cache_key, data, timeout, tags, stale_timeout=None, since=None):
+    if stale_timeout is None:
+        stale_timeout = getattr(settings, 'CACHE_STALE_TIMEOUT', 600)
+    if callable(tags):
+        tags = tags(data)
+    timeout = adaptive_timeout(tags, timeout)
+    if cache_stats.stats_enabled():
+        cache_stats.stats.record_ttl(cache_stats.key_group(cache_key), timeout)
+    entry = CachedValue(data, time.time() + timeout)
+    set_tagged(cache_key, entry, timeout + stale_timeout, tags, since)
+
+
+def _refresh(cache_key, data_func, timeout, tags, stale_timeout, lock_key):
+    try:
+        _rebuild(cache_key, data_func, timeout, tags, stale_timeout)
+        logger.debug(f"Background refresh stored: {cache_key}")
+    except Exception as e:
+        logger.error(f"Background refresh failed for {cache_key}: {e}")
+    finally:
+        cache.delete(lock_key)
+        _refresh_slots.release()
+        # Worker threads own their DB connections; don't leak them
+        connections.close_all()
+
+
+def schedule_refresh(cache_key, data_func, timeout=900, tags=(), stale_timeout=None):
+    """
+    Rebuild cache_key on the background pool, unless a refresh for it is
+    already running (in any process) or the pool's queue is full.
+    """
+    if not _refresh_slots.acquire(blocking=False):
+        logger.warning(f"Refresh queue full, serving stale value for {cache_key}")
+        return False
+
+    lock_key = REBUILD_LOCK_KEY.format(cache_key)
+    if not cache.add(lock_key, True, getattr(settings, 'CACHE_LOCK_TIMEOUT', 30)):
+        _refresh_slots.release()
+        return False
+
+    try:
+        _get_refresh_executor().submit(_refresh, cache_key, data_func, timeout, tags, stale_timeout, lock_key)
+    except RuntimeError:  # interpreter shutting down
+        cache.delete(lock_key)
+        _refresh_slots.release()
+        return False
+    return True
+
+
+def _wait_for_rebuild(cache_key, wait):
+    """Poll the cache until another process has stored cache_key."""
+    interval = getattr(settings, 'CACHE_LOCK_POLL_INTERVAL', 0.05)
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        entry = get_tagged(cache_key)
+        if entry is not None:
+            return _unwrap(entry)[0]
+    return None
+
+
+def get_or_set_cache(cache_key, data_func, timeout=900, tags=(), stale_timeout=None):
     """
     Get data from cache or set it if not present.
+
+    Entries are fresh for `timeout` seconds and then served stale for up to
+    `stale_timeout` more (CACHE_STALE_TIMEOUT by default) while a background
+    refresh runs, so expiry never lands on a user request.
+
+    Misses are coalesced: only one thread per process (in-process lock) and
+    one process (lock entry added to the cache) rebuilds a given key, while
+    concurrent callers wait up to CACHE_LOCK_WAIT seconds for the result.
+    A caller that waits longer than that rebuilds the value itself. Threads
+    waiting on another process's rebuild poll the cache without holding the
+    in-process lock.
     
     Args:
         cache_key: Key to look up
         data_func: Function to call if cache miss
-        timeout: Cache timeout in seconds
+        timeout: Soft cache timeout in seconds
+        tags: Cache tags for the entry, or a callable taking the data
+        stale_timeout: Seconds a stale value may still be served
     
     Returns:
         Cached or freshly generated data
     """
-    data = cache.get(cache_key)
+    entry = get_tagged(cache_key)
     
-    if data is not None:
-        logger.debug(f"Cache hit: {cache_key}")
+    if entry is not None:
+        data, is_fresh = _unwrap(entry)
+        if is_fresh:
+            logger.debug(f"Cache hit: {cache_key}")
+        else:
+            logger.debug(f"Stale cache hit: {cache_key}")
+            schedule_refresh(cache_key, data_func, timeout, tags, stale_timeout)
         return data
     
     logger.debug(f"Cache miss: {cache_key}")
-    data = data_func()
-    cache.set(cache_key, data, timeout)
-    return data
+    wait = getattr(settings, 'CACHE_LOCK_WAIT', 5)
+    lock = _rebuild_lock(cache_key)
+    if not lock.acquire(timeout=wait):
+        logger.warning(f"Timed out waiting for rebuild of {cache_key}")
+        return _rebuild(cache_key, data_func, timeout, tags, stale_timeout)
+
+    try:
+        # Another thread may have rebuilt it while we waited for the lock
+        entry = get_tagged(cache_key)
+        if entry is not None:
+            return _unwrap(entry)[0]
+
+        lock_key = REBUILD_LOCK_KEY.format(cache_key)
+        if cache.add(lock_key, True, getattr(settings, 'CACHE_LOCK_TIMEOUT', 30)):
+            try:
+                return _rebuild(cache_key, data_func, timeout, tags, stale_timeout)
+            finally:
+                cache.delete(lock_key)
+    finally:
+        lock.release()
+
+    # Another process is rebuilding it
+    data = _wait_for_rebuild(cache_key, wait)
+    if data is not None:
+        return data
+    logger.warning(f"Timed out waiting for rebuild of {cache_key}")
+    return _rebuild(cache_key, data_func, timeout, tags, stale_timeout)
+
+
+# ===============================
+# Authentication variants
+# ===============================
+
+_jwt_authentication = None
+
+
+def _get_jwt_authentication():
+    global _jwt_authentication
+    if _jwt_authentication is None:
+        _jwt_authentication = JWTAuthentication()
+    return _jwt_authentication
+
+
+def _user_variant(user):
+    if user is None or not user.is_authenticated:
+        return 'anon'
+    return 'staff' if user.is_staff else 'auth'
+
+
+def _resolve_auth_variant(request):
+    jwt_auth = _get_jwt_authentication()
+    header = jwt_auth.get_header(request)
+    if header is not None:
+        try:
+            raw_token = jwt_auth.get_raw_token(header)
+            if raw_token is not None:
+                # get_user() also rejects deleted users and, by default, inactive ones
+                user = jwt_auth.get_user(jwt_auth.get_validated_token(raw_token))
+                return _user_variant(user) if user.is_active else None
+        except (AuthenticationFailed, InvalidToken, TokenError):
+            return None
+    return _user_variant(getattr(request, 'user', None))
+
+
+def auth_variant(request):
+    """
+    Cache variant for a request: 'anon', 'auth' or 'staff'.
+
+    ProductSerializer only masks prices by authentication status, and the
+    only permission beyond authentication is IsAdminUser (e.g. the product
+    list filtered by ?subcategory=), so staff get a variant of their own:
+    other users never see a staff-only response. The raw token never goes
+    into a key. Returns None for credentials that don't belong to an
+    existing, active user, which must not be served from (or stored in) the
+    cache so the view can reject them.
+
+    Resolving a token's user costs a query, so the variant is computed once
+    per request.
+    """
+    if not hasattr(request, '_cache_auth_variant'):
+        request._cache_auth_variant = _resolve_auth_variant(request)
+    return request._cache_auth_variant
+
+
+# ===============================
+# Pre-rendered JSON payloads
+# ===============================
+
+class JSONPayload:
+    """
+    A rendered (optionally gzipped) JSON body plus the cache tags of the data
+    it was built from. A cache hit returns the bytes as they are: no model
+    instances to unpickle, no serializer run and no renderer pass.
+    """
+    __slots__ = ('body', 'compressed', 'tags')
+
+    def __init__(self, body, compressed=False, tags=()):
+        self.body = body
+        self.compressed = compressed
+        self.tags = list(tags)
+
+    @classmethod
+    def from_data(cls, data, tags=()):
+        body = JSONRenderer().render(data)
+        min_size = getattr(settings, 'CACHE_JSON_GZIP_MIN_SIZE', None)
+        if min_size is not None and len(body) >= min_size:
+            return cls(gzip.compress(body), True, tags)
+        return cls(body, False, tags)
+
+    def decoded_body(self):
+        return gzip.decompress(self.body) if self.compressed else self.body
+
+
+def get_or_set_json(cache_key, data_func, timeout=900, tags=(), stale_timeout=None):
+    """
+    Same as get_or_set_cache(), but data_func's result is rendered to JSON
+    once and the JSONPayload is cached instead of the Python data.
+    """
+    def build():
+        data = data_func()
+        return JSONPayload.from_data(data, tags(data) if callable(tags) else tags)
+
+    return get_or_set_cache(cache_key, build, timeout, lambda payload: payload.tags, stale_timeout)
+
+
+def json_response(request, payload, status=200):
+    """
+    Build an HttpResponse straight from a JSONPayload. Gzipped bodies are
+    sent as-is to clients that accept gzip and inflated for the rest.
+    """
+    if payload.compressed and 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(payload.body, content_type='application/json', status=status)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(payload.decoded_body(), content_type='application/json', status=status)
+    if payload.compressed:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return tag_response(response, *payload.tags)
 
 
 def check_cache_health():
@@ -146,15 +884,17 @@ def check_cache_health():
 
 def get_cache_stats():
     """
-    Get basic cache statistics (if supported by backend).
-    Note: LocMemCache has limited stats support.
+    Get cache configuration plus usage counters merged across processes:
+    hits, misses, sets, evictions, bytes written and latency histograms per
+    key prefix ('keys') and per cached view ('views'). See cache_stats.
     """
     try:
-        # This works with some cache backends
         return {
             'backend': settings.CACHES['default']['BACKEND'],
             'location': settings.CACHES['default'].get('LOCATION', 'N/A'),
             'timeout': settings.CACHES['default'].get('TIMEOUT', 'N/A'),
+            'max_entries': settings.CACHES['default'].get('OPTIONS', {}).get('MAX_ENTRIES', 'N/A'),
+            'usage': cache_stats.collect(),
         }
     except Exception as e:
         logger.error(f"Error getting cache stats: {e}")
@@ -164,17 +904,22 @@ def get_cache_stats():
 # Django management command helpers
 
 def clear_product_cache_by_slug(product_slug):
-    """Clear all caches related to a specific product."""
-    keys_to_clear = [
-        settings.CACHE_KEYS['product_detail'].format(product_slug),
-        settings.CACHE_KEYS['related_products'].format(product_slug),
-    ]
-    return invalidate_specific_caches(keys_to_clear)
+    """
+    Clear all caches related to a specific product: its detail and related
+    pages and every page listing it (all tagged with the product).
+    Returns the number of tags invalidated.
+    """
+    product_ids = Product.objects.filter(slug=product_slug).values_list('pk', flat=True)
+    return invalidate_tags(*(make_tag('product', pk) for pk in product_ids), slug_tag(Product, product_slug))
 
 
 def clear_subcategory_cache_by_slug(subcategory_slug):
-    """Clear all caches related to a specific subcategory."""
-    keys_to_clear = [
-        settings.CACHE_KEYS['products_by_subcategory'].format(subcategory_slug),
-    ]
-    return invalidate_specific_caches(keys_to_clear)
\ No newline at end of file
+    """
+    Clear all caches related to a specific subcategory: its namespace and
+    every page tagged with it. Returns the number of namespaces bumped.
+    """
+    subcategory_ids = Subcategory.objects.filter(slug=subcategory_slug).values_list('pk', flat=True)
+    purge_tags = [make_tag('subcategory', pk) for pk in subcategory_ids] + [slug_tag(Subcategory, subcategory_slug)]
+    namespaces = [make_namespace('subcategory', subcategory_slug)] + tag_namespaces(purge_tags)
+    bump_namespaces(*namespaces, purge_tags=purge_tags)
+    return len(namespaces)
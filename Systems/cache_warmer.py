@@ -0,0 +1,220 @@
+"""
+Cache warmer.
+
+Renders the public API endpoints (category tree, the first pages of every
+subcategory, popular products, hero banners, blogs and the top product
+details) through the full middleware stack on a thread pool, so the page
+cache and the JSON payload caches are filled exactly as a visitor's request
+would fill them. Warmed requests are anonymous, so they fill the 'anon'
+variant, which is what most traffic reads.
+
+Runs inside each worker, optionally at startup (SystemsConfig.ready) and
+after bulk invalidations (see cache_utils.flush_pending_invalidations).
+`clear_cache --warm` only helps with a cache shared between processes.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.db import connections
+from django.db.models import Count
+from django.test import RequestFactory
+from django.urls import reverse
+import logging
+import math
+import os
+import sys
+import threading
+import time
+
+from .models import Category, Product, Subcategory
+
+logger = logging.getLogger(__name__)
+
+WARMER_DEFAULTS = {
+    'ON_STARTUP': False,
+    'AFTER_BULK_INVALIDATION': True,
+    'DELAY': 2,
+    'WORKERS': 4,
+    'HOST': None,
+    'SECURE': False,
+    'SUBCATEGORY_PAGES': 2,
+    'TOP_PRODUCTS': 50,
+}
+
+
+def _warmer_settings():
+    return {**WARMER_DEFAULTS, **getattr(settings, 'CACHE_WARMER', {})}
+
+
+def warm_host(config=None):
+    """
+    Host header of warmed requests.
+
+    The page cache key contains the absolute URL, so this must be the host
+    visitors use; it defaults to the first concrete ALLOWED_HOSTS entry.
+    """
+    config = config or _warmer_settings()
+    if config['HOST']:
+        return config['HOST']
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def warm_targets(config=None):
+    """
+    (path, query) pairs to render, cheapest and most shared first.
+
+    Example:
+        warm_targets()
+        # Returns: [('/api/categories/', {}), ..., ('/api/subcategories/detectors/products/', {'page': 2}), ...]
+    """
+    from .views import ProductViewSet
+
+    config = config or _warmer_settings()
+    targets = [
+        (reverse('category-list'), {}),
+        (reverse('subcategory-list'), {}),
+        (reverse('hero-banners'), {}),
+        (reverse('popular-products'), {}),
+        (reverse('blog-list'), {}),
+        (reverse('blog-footer-blogs'), {}),
+    ]
+
+    for slug in Category.objects.order_by('id').values_list('slug', flat=True):
+        targets.append((reverse('category-subcategories-list', kwargs={'category_slug': slug}), {}))
+
+    page_size = ProductViewSet.pagination_class.page_size
+    subcategories = Subcategory.objects.annotate(product_count=Count('products')).order_by('id')
+    for slug, product_count in subcategories.values_list('slug', 'product_count'):
+        path = reverse('subcategory-products-list', kwargs={'subcategory_slug': slug})
+        targets.append((path, {}))
+        pages = min(config['SUBCATEGORY_PAGES'], math.ceil(product_count / page_size))
+        targets.extend((path, {'page': page}) for page in range(2, pages + 1))
+
+    top_products = Product.objects.order_by('-is_popular', '-id').values_list('slug', flat=True)
+    for slug in top_products[:config['TOP_PRODUCTS']]:
+        targets.append((reverse('product-detail', kwargs={'slug': slug}), {}))
+        targets.append((reverse('product-related', kwargs={'slug': slug}), {}))
+
+    return targets
+
+
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def _get_handler():
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            handler = BaseHandler()
+            handler.load_middleware()
+            _handler = handler
+    return _handler
+
+
+def render(path, query=None, config=None):
+    """Render one anonymous GET through the middleware stack; returns the status code."""
+    config = config or _warmer_settings()
+    request = RequestFactory().get(path, query or {}, HTTP_HOST=warm_host(config), secure=config['SECURE'])
+    # Lets the warmer past the rate throttles (see throttling)
+    request.cache_warming = True
+    try:
+        response = _get_handler().get_response(request)
+        response.close()
+        return response.status_code
+    finally:
+        connections.close_all()
+
+
+def warm(config=None):
+    """
+    Render every warm target on a thread pool of CACHE_WARMER['WORKERS'].
+
+    Returns:
+        {'warmed': int, 'failed': [(url, status or error)], 'elapsed': seconds}
+    """
+    config = config or _warmer_settings()
+    start = time.monotonic()
+    targets = warm_targets(config)
+    warmed = 0
+    failed = []
+
+    with ThreadPoolExecutor(max_workers=config['WORKERS'], thread_name_prefix='cache-warm') as executor:
+        futures = {executor.submit(render, path, query, config): (path, query) for path, query in targets}
+        for future in as_completed(futures):
+            path, query = futures[future]
+            url = f"{path}?page={query['page']}" if query else path
+            try:
+                status = future.result()
+            except Exception as e:
+                logger.error(f"Error warming {url}: {e}")
+                failed.append((url, str(e)))
+                continue
+            if status == 200:
+                warmed += 1
+            else:
+                failed.append((url, status))
+
+    elapsed = time.monotonic() - start
+    logger.info(f"Cache warmed: {warmed} endpoints in {elapsed:.2f}s ({len(failed)} failed)")
+    return {'warmed': warmed, 'failed': failed, 'elapsed': elapsed}
+
+
+_scheduled = None
+_schedule_lock = threading.Lock()
+
+
+def schedule_warm(delay=None):
+    """
+    Warm in a background thread after `delay` seconds (CACHE_WARMER['DELAY']).
+
+    Calls made while a warm is pending are coalesced into it, so a burst of
+    bulk writes is followed by one warm. Returns False when coalesced.
+    """
+    global _scheduled
+    if delay is None:
+        delay = _warmer_settings()['DELAY']
+    with _schedule_lock:
+        if _scheduled is not None:
+            return False
+        _scheduled = threading.Timer(delay, _run_scheduled)
+        _scheduled.daemon = True
+        _scheduled.start()
+    return True
+
+
+def _run_scheduled():
+    global _scheduled
+    # Cleared before warming: writes landing during the warm schedule another
+    with _schedule_lock:
+        _scheduled = None
+    try:
+        warm()
+    except Exception as e:
+        logger.error(f"Background cache warm failed: {e}")
+    finally:
+        connections.close_all()
+
+
+def warm_after_bulk_invalidation():
+    """Re-warm once a namespace bump has emptied the caches, if enabled."""
+    if _warmer_settings()['AFTER_BULK_INVALIDATION']:
+        schedule_warm()
+
+
+def _is_serving_process():
+    """False for migrate, shell, etc. and for runserver's autoreloader parent."""
+    argv = sys.argv
+    if os.path.basename(argv[0]) in ('manage.py', 'django-admin', '__main__.py') and len(argv) > 1:
+        return argv[1] == 'runserver' and ('--noreload' in argv or os.environ.get('RUN_MAIN') == 'true')
+    return True
+
+
+def warm_on_startup():
+    """Schedule a warm from SystemsConfig.ready() if CACHE_WARMER['ON_STARTUP'] is set."""
+    if _warmer_settings()['ON_STARTUP'] and _is_serving_process():
+        schedule_warm()
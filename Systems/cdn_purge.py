@@ -0,0 +1,219 @@
+"""
+Purging of responses cached by a CDN / reverse proxy.
+
+Public responses carry their cache tags as surrogate keys (Surrogate-Key
+and Cache-Tag headers, see middleware.CacheControlPolicyMiddleware), so
+they can sit at the edge with long TTLs. Whenever the local caches are
+invalidated, the same tags are written to a durable queue (the
+PurgeRequest table); `manage.py process_purge_queue` drains it through the
+purge client configured in settings.CDN_PURGE, retrying with backoff.
+
+A namespace bump queues the tags it stands for (the tags of a bulk
+invalidation, those of a single subcategory), or PURGE_ALL for a global
+clear, which has no tag list.
+"""
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from collections import deque
+from datetime import timedelta
+import logging
+import re
+import threading
+
+from .models import PurgeRequest
+
+logger = logging.getLogger(__name__)
+
+PURGE_ALL = '*'
+
+CDN_PURGE_DEFAULTS = {
+    'ENABLED': False,
+    'CLIENT': 'Systems.cdn_purge.LocalPurgeClient',
+    'OPTIONS': {},
+    'BATCH_SIZE': 30,
+    'MAX_ATTEMPTS': 8,
+    'RETRY_DELAY': 5,
+    'POLL_INTERVAL': 1,
+}
+
+# Separators of the Surrogate-Key (space) and Cache-Tag (comma) headers
+_KEY_SEPARATORS_RE = re.compile(r'[\s,]+')
+
+
+def _purge_settings():
+    return {**CDN_PURGE_DEFAULTS, **getattr(settings, 'CDN_PURGE', {})}
+
+
+def surrogate_key(tag):
+    """
+    Header-safe form of a cache tag.
+
+    Example:
+        surrogate_key('slug:product:usb c hub')
+        # Returns: 'slug:product:usb_c_hub'
+    """
+    return _KEY_SEPARATORS_RE.sub('_', str(tag))
+
+
+# ===============================
+# Purge clients
+# ===============================
+
+class PurgeClient:
+    """Interface of a CDN purge API. Errors propagate; the queue retries them."""
+
+    def purge(self, keys):
+        raise NotImplementedError
+
+    def purge_all(self):
+        raise NotImplementedError
+
+
+class LocalPurgeClient(PurgeClient):
+    """
+    Records purges in memory instead of calling a CDN. Used when no CDN is
+    configured (development) and by tests, which read `purged`: the last
+    MAX_RECORDED purges of this client.
+    """
+
+    def __init__(self, MAX_RECORDED=1000, **options):
+        self.purged = deque(maxlen=MAX_RECORDED)
+
+    def purge(self, keys):
+        self.purged.append(sorted(keys))
+        logger.debug(f"Local purge of surrogate keys: {' '.join(sorted(keys))}")
+
+    def purge_all(self):
+        self.purged.append([PURGE_ALL])
+        logger.debug("Local purge of everything")
+
+
+class HTTPPurgeClient(PurgeClient):
+    """
+    Purges by POSTing JSON to a purge endpoint: {"tags": [...]} or
+    {"purge_everything": true}, with a bearer token. This is Cloudflare's
+    purge_cache API; other CDNs can subclass and override payload().
+
+    Options:
+        URL: e.g. https://api.cloudflare.com/client/v4/zones/<zone id>/purge_cache
+        TOKEN: API token allowed to purge
+        TIMEOUT: seconds (default 10)
+    """
+
+    def __init__(self, URL, TOKEN='', TIMEOUT=10, **options):
+        self.url = URL
+        self.token = TOKEN
+        self.timeout = TIMEOUT
+
+    def payload(self, keys):
+        return {'purge_everything': True} if keys is None else {'tags': list(keys)}
+
+    def post(self, keys):
+        import requests
+
+        headers = {'Authorization': f'Bearer {self.token}'} if self.token else {}
+        response = requests.post(self.url, json=self.payload(keys), headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+
+    def purge(self, keys):
+        self.post(keys)
+
+    def purge_all(self):
+        self.post(None)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_purge_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            config = _purge_settings()
+            _client = import_string(config['CLIENT'])(**config['OPTIONS'])
+    return _client
+
+
+# ===============================
+# Durable queue
+# ===============================
+
+def enqueue_purge(*tags):
+    """
+    Queue tags for purging at the edge (no-op unless CDN_PURGE['ENABLED']).
+
+    A tag already waiting is not duplicated; its queued_at moves forward (so
+    a worker purging the older request doesn't drop the newer one) and its
+    retry count starts over.
+    """
+    if not _purge_settings()['ENABLED']:
+        return 0
+    keys = {surrogate_key(tag) for tag in tags if tag}
+    if not keys:
+        return 0
+    now = timezone.now()
+    try:
+        PurgeRequest.objects.bulk_create(
+            [PurgeRequest(tag=key, queued_at=now, next_attempt_at=now) for key in keys],
+            update_conflicts=True, unique_fields=['tag'], update_fields=['queued_at', 'next_attempt_at', 'attempts'],
+        )
+    except Exception as e:
+        logger.error(f"Error queueing CDN purge of {', '.join(sorted(keys))}: {e}")
+        return 0
+    return len(keys)
+
+
+def process_purge_queue(client=None):
+    """
+    Send one batch of due purge requests to the purge client.
+
+    Returns:
+        Number of requests purged (0 when nothing was due or the call failed).
+    """
+    config = _purge_settings()
+    client = client or get_purge_client()
+    now = timezone.now()
+    batch = list(PurgeRequest.objects.filter(next_attempt_at__lte=now).order_by('queued_at')[:config['BATCH_SIZE']])
+    if not batch:
+        return 0
+
+    keys = [request.tag for request in batch]
+    try:
+        if PURGE_ALL in keys:
+            client.purge_all()
+        else:
+            client.purge(keys)
+    except Exception as e:
+        _reschedule(batch, e, config, now)
+        return 0
+
+    # Rows re-queued while the purge was in flight stay for the next batch
+    done = Q()
+    for request in batch:
+        done |= Q(pk=request.pk, queued_at=request.queued_at)
+    PurgeRequest.objects.filter(done).delete()
+    logger.info(f"Purged {len(batch)} surrogate keys at the edge")
+    return len(batch)
+
+
+def _reschedule(batch, error, config, now):
+    given_up = []
+    for request in batch:
+        request.attempts += 1
+        request.last_error = str(error)
+        request.next_attempt_at = now + timedelta(seconds=config['RETRY_DELAY'] * 2 ** (request.attempts - 1))
+        if request.attempts >= config['MAX_ATTEMPTS']:
+            given_up.append(request)
+    PurgeRequest.objects.bulk_update(batch, ['attempts', 'last_error', 'next_attempt_at'])
+    if given_up:
+        # Left in the table for inspection, but pushed out of the way; edge TTLs bound the staleness
+        PurgeRequest.objects.filter(pk__in=[request.pk for request in given_up]).update(
+            next_attempt_at=now + timedelta(days=3650),
+        )
+        logger.error(f"Giving up CDN purge of {', '.join(request.tag for request in given_up)}: {error}")
+    else:
+        logger.warning(f"CDN purge failed, retrying {len(batch)} keys: {error}")
@@ -0,0 +1,170 @@
+"""
+Conditional GET (ETag / Last-Modified / 304) for the catalog, blog and
+banner endpoints.
+
+Each endpoint has a version function returning the version of the rows its
+response is built from, read with one or two aggregate queries. A strong
+ETag and a Last-Modified header are derived from it before the view runs,
+so a matching If-None-Match / If-Modified-Since is answered with 304
+without serializing anything. Revalidations of pages already in the page
+cache are answered by the cache middleware from the stored headers.
+
+List versions include the row count next to the newest updated_at, so a
+deleted row changes the ETag even though no timestamp moved.
+"""
+
+from functools import wraps
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache_utils import auth_variant
+from .middleware import canonical_query_string
+from .models import Blog, Category, HeroBanner, Product, Subcategory
+
+
+def _latest(*timestamps):
+    timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+    return max(timestamps) if timestamps else None
+
+
+def make_etag(request, version):
+    """
+    Strong ETag of one representation of a resource at the given version.
+
+    The representation depends on the auth variant (prices are masked for
+    anonymous users), the query string, the negotiated renderer and whether
+    a gzipped payload may be sent, so those are part of the hash.
+    CACHE_ETAG_SALT changes every ETag, e.g. when a release changes a
+    serializer.
+    """
+    variant = auth_variant(request)
+    if variant is None:
+        return None
+    accepts_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    parts = (
+        getattr(settings, 'CACHE_ETAG_SALT', ''), request.path, canonical_query_string(request), variant,
+        request.META.get('HTTP_ACCEPT', ''), accepts_gzip, version,
+    )
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def conditional(version_func):
+    """
+    View decorator answering conditional GETs from version_func(request, **kwargs),
+    which returns (version, last_modified), or None to let the view run
+    (e.g. unknown slugs, which it answers with a 404).
+
+    Place it inside tagged_cache_page, so a page cache hit skips the query.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            found = version_func(request, **kwargs)
+            if found is None:
+                return view_func(request, *args, **kwargs)
+            version, last_modified = found
+            etag = make_etag(request, version)
+            if etag is None:
+                return view_func(request, *args, **kwargs)
+            etag = quote_etag(etag)
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code == 200:
+                    if not response.has_header('ETag'):
+                        response['ETag'] = etag
+                    if timestamp and not response.has_header('Last-Modified'):
+                        response['Last-Modified'] = http_date(timestamp)
+            return response
+        return _wrapped_view
+    return decorator
+
+
+def _aggregate(queryset, *timestamp_fields):
+    return queryset.aggregate(
+        count=Count('pk'), **{f'last_{index}': Max(field) for index, field in enumerate(timestamp_fields)}
+    )
+
+
+def _list_version(*aggregates):
+    version = tuple((row['count'], *(value for key, value in row.items() if key != 'count')) for row in aggregates)
+    last_modified = _latest(*(value for row in aggregates for key, value in row.items() if key != 'count'))
+    return version, last_modified
+
+
+# ===============================
+# Version functions
+# ===============================
+
+def product_version(request, slug=None, product_slug=None, subcategory_slug=None, **kwargs):
+    """A product plus the subcategory and category names/slugs it embeds."""
+    products = Product.objects.filter(slug=slug or product_slug)
+    if subcategory_slug:
+        products = products.filter(subcategory__slug=subcategory_slug)
+    row = products.values_list(
+        'pk', 'updated_at', 'subcategory__updated_at', 'subcategory__category__updated_at',
+    ).first()
+    if row is None:
+        return None
+    return row, _latest(*row[1:])
+
+
+def product_list_version(request, subcategory_slug=None, **kwargs):
+    """A subcategory's products (or all products) and what they embed."""
+    if kwargs or 'subcategory' in request.GET:
+        # Lookups by subcategory pk and the staff-only ?subcategory filter
+        return None
+    products = Product.objects.all()
+    if subcategory_slug:
+        products = products.filter(subcategory__slug=subcategory_slug)
+    aggregate = _aggregate(products, 'updated_at', 'subcategory__updated_at', 'subcategory__category__updated_at')
+    if not aggregate['count']:
+        return None
+    return _list_version(aggregate)
+
+
+def category_version(request, slug=None, **kwargs):
+    """Categories (or one category) with their nested subcategories."""
+    categories = Category.objects.all()
+    subcategories = Subcategory.objects.all()
+    if slug:
+        categories = categories.filter(slug=slug)
+        subcategories = subcategories.filter(category__slug=slug)
+    category_aggregate = _aggregate(categories, 'updated_at')
+    if slug and not category_aggregate['count']:
+        return None
+    return _list_version(category_aggregate, _aggregate(subcategories, 'updated_at'))
+
+
+def subcategory_version(request, slug=None, category_slug=None, **kwargs):
+    subcategories = Subcategory.objects.all()
+    if category_slug:
+        subcategories = subcategories.filter(category__slug=category_slug)
+    if slug:
+        subcategories = subcategories.filter(slug=slug)
+    aggregate = _aggregate(subcategories, 'updated_at')
+    if (slug or category_slug) and not aggregate['count']:
+        return None
+    return _list_version(aggregate)
+
+
+def blog_version(request, slug=None, **kwargs):
+    blogs = Blog.objects.filter(is_published=True)
+    if slug:
+        blogs = blogs.filter(slug=slug)
+    aggregate = _aggregate(blogs, 'updated_at')
+    if slug and not aggregate['count']:
+        return None
+    return _list_version(aggregate)
+
+
+def banner_version(request, **kwargs):
+    return _list_version(_aggregate(HeroBanner.objects.filter(is_active=True), 'updated_at'))
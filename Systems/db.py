@@ -0,0 +1,70 @@
+"""
+SQLite connection tuning.
+
+SQLite's defaults (rollback journal, no busy timeout beyond the driver's)
+make every write lock out readers, so admin edits and imports show up as
+"database is locked" under load. settings.SQLITE_PRAGMAS is applied to each
+new SQLite connection (connection_created, connected in
+SystemsConfig.ready); `manage.py benchmark_sqlite` measures the effect.
+Other database vendors are left alone.
+"""
+
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Values that are names rather than numbers, checked before interpolating
+_PRAGMA_KEYWORDS = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA', '0', '1', '2', '3'},
+    'temp_store': {'DEFAULT', 'FILE', 'MEMORY', '0', '1', '2'},
+}
+
+
+def pragma_statements(pragmas):
+    """
+    PRAGMA statements for a {name: value} mapping.
+
+    Example:
+        pragma_statements({'journal_mode': 'WAL', 'busy_timeout': 5000})
+        # Returns: ['PRAGMA journal_mode = WAL', 'PRAGMA busy_timeout = 5000']
+    """
+    statements = []
+    for name, value in pragmas.items():
+        if not name.isidentifier():
+            raise ValueError(f'Invalid SQLite pragma name: {name!r}')
+        value = str(value)
+        allowed = _PRAGMA_KEYWORDS.get(name)
+        if allowed is not None and value.upper() not in allowed:
+            raise ValueError(f'Invalid value for PRAGMA {name}: {value!r}')
+        if allowed is None and not value.lstrip('-').isdigit():
+            raise ValueError(f'PRAGMA {name} expects an integer, got {value!r}')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """Run the pragmas on a sqlite3 connection; returns {name: value SQLite reports}."""
+    applied = {}
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, statement in zip(pragmas, pragma_statements(pragmas)):
+            cursor.execute(statement)
+            row = cursor.fetchone()
+            # journal_mode answers with the mode in effect, e.g. 'memory' for in-memory databases
+            applied[name] = row[0] if row else pragmas[name]
+    finally:
+        cursor.close()
+    return applied
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """connection_created receiver applying settings.SQLITE_PRAGMAS."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if not pragmas:
+        return
+    applied = apply_pragmas(connection.connection, pragmas)
+    logger.debug(f"SQLite pragmas on {connection.alias}: {applied}")
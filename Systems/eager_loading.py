@@ -0,0 +1,96 @@
+"""
+Declared query graphs for serializers, and a guard against lazy loading.
+
+A serializer lists the relations it reads (select_related_fields,
+prefetch_related_fields); every endpoint builds its queryset through
+setup_eager_loading(), so a page of products costs a fixed number of
+queries instead of several per product.
+
+With settings.EAGER_LOADING_GUARD set, any query issued while one instance
+is being rendered means a relation wasn't preloaded: 'raise' fails the
+request (tests), 'warn' logs it (DEBUG). Writes are not guarded, since the
+instance returned after a save is not loaded through the graph.
+"""
+
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connections
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_guard_state = threading.local()
+
+
+class LazyLoadError(AssertionError):
+    """A serializer queried the database for a relation that wasn't preloaded."""
+
+
+@contextmanager
+def lazy_load_guard(label):
+    """
+    Report every query run inside the block (see EAGER_LOADING_GUARD).
+    Nested guards (nested serializers) report under the outermost label.
+    """
+    mode = getattr(settings, 'EAGER_LOADING_GUARD', None)
+    if not mode or getattr(_guard_state, 'active', False):
+        yield
+        return
+
+    def blocker(execute, sql, params, many, context):
+        message = f"{label} queried the database while rendering (missing select/prefetch?): {sql}"
+        if mode == 'raise':
+            raise LazyLoadError(message)
+        logger.warning(message)
+        return execute(sql, params, many, context)
+
+    _guard_state.active = True
+    try:
+        with _execute_wrappers(blocker):
+            yield
+    finally:
+        _guard_state.active = False
+
+
+@contextmanager
+def _execute_wrappers(wrapper):
+    wrapped = []
+    try:
+        for connection in connections.all(initialized_only=True):
+            connection.execute_wrappers.append(wrapper)
+            wrapped.append(connection)
+        yield
+    finally:
+        for connection in wrapped:
+            connection.execute_wrappers.remove(wrapper)
+
+
+class EagerLoadingMixin:
+    """
+    Serializer mixin: declares the relations to preload and guards reads.
+
+    Example:
+        class ProductSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+            select_related_fields = ('subcategory__category',)
+            prefetch_related_fields = ('spec_tables__rows',)
+
+        ProductSerializer.setup_eager_loading(Product.objects.all())
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        return queryset
+
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        if request is not None and request.method not in ('GET', 'HEAD'):
+            return super().to_representation(instance)
+        with lazy_load_guard(type(self).__name__):
+            return super().to_representation(instance)
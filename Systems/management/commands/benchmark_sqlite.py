@@ -0,0 +1,176 @@
+"""
+Measure SQLite read throughput while writes run, with SQLite's default
+pragmas and with settings.SQLITE_PRAGMAS (see Systems/db.py).
+
+Each run seeds a throwaway database file with a product-like table, then
+for --seconds: --readers threads repeat the subcategory page query, while a
+writer commits batches of updates and inserts (an admin import). The
+project database is not touched.
+
+Usage:
+    python manage.py benchmark_sqlite
+    python manage.py benchmark_sqlite --seconds 10 --readers 8 --rows 50000
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from Systems.db import apply_pragmas
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE product (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subcategory_id INTEGER NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    description TEXT NOT NULL,
+    stock INTEGER NOT NULL,
+    updated_at DATETIME NOT NULL
+);
+CREATE INDEX product_subcategory_id_idx ON product (subcategory_id, id DESC);
+"""
+
+PAGE_QUERY = (
+    'SELECT id, subcategory_id, name, description, stock, updated_at FROM product '
+    'WHERE subcategory_id = ? ORDER BY id DESC LIMIT 40 OFFSET ?'
+)
+
+SUBCATEGORIES = 50
+
+
+class Command(BaseCommand):
+    help = 'Benchmark SQLite reads under concurrent writes, default vs configured pragmas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5, help='Duration of each run')
+        parser.add_argument('--readers', type=int, default=4, help='Concurrent reader threads')
+        parser.add_argument('--rows', type=int, default=20000, help='Products seeded')
+        parser.add_argument('--batch', type=int, default=200, help='Rows written per write transaction')
+
+    def handle(self, *args, **options):
+        configured = getattr(settings, 'SQLITE_PRAGMAS', None) or {}
+        runs = [('SQLite defaults', {}), ('SQLITE_PRAGMAS', configured)]
+
+        results = []
+        for label, pragmas in runs:
+            self.stdout.write(f'Running with {label} for {options["seconds"]}s...')
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'benchmark.sqlite3')
+                self.seed(path, options['rows'])
+                results.append((label, self.run(path, pragmas, options)))
+
+        self.report(results)
+
+    def connect(self, path, pragmas):
+        # Django's sqlite3 backend leaves the driver's 5 second busy timeout as it is
+        connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+        apply_pragmas(connection, pragmas)
+        return connection
+
+    def seed(self, path, rows):
+        connection = sqlite3.connect(path, isolation_level=None)
+        connection.executescript(SCHEMA)
+        description = 'Addressable detector with isolator. ' * 10
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO product (subcategory_id, name, description, stock, updated_at) '
+            'VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)',
+            ((index % SUBCATEGORIES, f'Product {index}', description, index % 7) for index in range(rows)),
+        )
+        connection.execute('COMMIT')
+        connection.close()
+
+    def run(self, path, pragmas, options):
+        deadline = time.monotonic() + options['seconds']
+        latencies = []
+        counters = {'read_errors': 0, 'writes': 0, 'write_errors': 0}
+        lock = threading.Lock()
+        max_page = options['rows'] // SUBCATEGORIES // 40
+
+        def read():
+            connection = self.connect(path, pragmas)
+            local_latencies = []
+            errors = 0
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    connection.execute(
+                        PAGE_QUERY, (random.randrange(SUBCATEGORIES), 40 * random.randint(0, max_page)),
+                    ).fetchall()
+                except sqlite3.OperationalError:
+                    errors += 1
+                    continue
+                local_latencies.append(time.perf_counter() - start)
+            connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+                counters['read_errors'] += errors
+
+        def write():
+            connection = self.connect(path, pragmas)
+            while time.monotonic() < deadline:
+                ids = [random.randint(1, options['rows']) for _ in range(options['batch'])]
+                try:
+                    connection.execute('BEGIN IMMEDIATE')
+                    connection.executemany(
+                        'UPDATE product SET stock = stock + 1, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                        ((product_id,) for product_id in ids),
+                    )
+                    connection.execute(
+                        'INSERT INTO product (subcategory_id, name, description, stock, updated_at) '
+                        "VALUES (?, 'Imported', '', 1, CURRENT_TIMESTAMP)",
+                        (random.randrange(SUBCATEGORIES),),
+                    )
+                    connection.execute('COMMIT')
+                    counters['writes'] += 1
+                except sqlite3.OperationalError:
+                    counters['write_errors'] += 1
+                    if connection.in_transaction:
+                        connection.execute('ROLLBACK')
+            connection.close()
+
+        threads = [threading.Thread(target=read) for _ in range(options['readers'])]
+        threads.append(threading.Thread(target=write))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        latencies.sort()
+        return {
+            'reads_per_second': len(latencies) / options['seconds'],
+            'p50_ms': statistics.median(latencies) * 1000 if latencies else 0,
+            'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0,
+            'max_ms': latencies[-1] * 1000 if latencies else 0,
+            'writes_per_second': counters['writes'] / options['seconds'],
+            'read_errors': counters['read_errors'],
+            'write_errors': counters['write_errors'],
+        }
+
+    def report(self, results):
+        columns = [
+            ('reads/s', 'reads_per_second', '{:.0f}'),
+            ('p50 ms', 'p50_ms', '{:.2f}'),
+            ('p99 ms', 'p99_ms', '{:.2f}'),
+            ('max ms', 'max_ms', '{:.1f}'),
+            ('writes/s', 'writes_per_second', '{:.1f}'),
+            ('locked (r/w)', None, None),
+        ]
+        self.stdout.write('')
+        self.stdout.write(f'{"":<18}' + ''.join(f'{title:>14}' for title, _, _ in columns))
+        for label, result in results:
+            cells = [
+                template.format(result[key]) if key else f"{result['read_errors']}/{result['write_errors']}"
+                for _, key, template in columns
+            ]
+            self.stdout.write(f'{label:<18}' + ''.join(f'{cell:>14}' for cell in cells))
+
+        (_, before), (_, after) = results
+        if before['reads_per_second']:
+            ratio = after['reads_per_second'] / before['reads_per_second']
+            self.stdout.write(self.style.SUCCESS(f'\nRead throughput under writes: {ratio:.1f}x'))
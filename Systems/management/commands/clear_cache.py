@@ -7,12 +7,19 @@ Usage:
     python manage.py clear_cache --products
     python manage.py clear_cache --check
     python manage.py clear_cache --warm
+    python manage.py clear_cache --stats
+    python manage.py clear_cache --reset-stats
+
+--all, --products and --warm need a cache shared with the web workers
+(CACHE_BACKEND=two_tier): an in-process cache only exists in each worker.
 """
 
-from django.core.management.base import BaseCommand
-from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
 from Systems.models import Product, Category, Subcategory
-from Systems.serializers import ProductSerializer, CategorySerializer, SubcategorySerializer
+from Systems import cache_stats, cache_warmer
+from Systems.cache_utils import bump_namespaces, get_cache_stats, make_namespace
 import time
 
 
@@ -38,15 +45,24 @@ class Command(BaseCommand):
         parser.add_argument(
             '--warm',
             action='store_true',
-            help='Warm up caches with fresh data',
+            help='Warm up caches by rendering the public endpoints',
         )
         parser.add_argument(
             '--stats',
             action='store_true',
             help='Show cache statistics',
         )
+        parser.add_argument(
+            '--reset-stats',
+            action='store_true',
+            help='Reset cache usage counters of all processes',
+        )
 
     def handle(self, *args, **options):
+        for option in ('all', 'products', 'warm'):
+            if options[option]:
+                self.require_shared_cache(option)
+
         if options['all']:
             self.clear_all_cache()
         elif options['products']:
@@ -57,11 +73,23 @@ class Command(BaseCommand):
             self.warm_caches()
         elif options['stats']:
             self.show_stats()
+        elif options['reset_stats']:
+            self.reset_stats()
         else:
             self.stdout.write(
                 self.style.WARNING('Please specify an option. Use --help for details.')
             )
 
+    def require_shared_cache(self, option):
+        """Refuse options that would only reach this command's own in-process cache."""
+        backend = caches['default']
+        if isinstance(backend, LocMemCache):
+            raise CommandError(
+                f'--{option} has no effect on the web workers: the default cache '
+                f'({type(backend).__name__}) lives in each process\'s memory. Restart the workers, '
+                f'or configure a shared cache (CACHE_BACKEND=two_tier).'
+            )
+
     def clear_all_cache(self):
         """Clear entire cache."""
         self.stdout.write('Clearing all caches...')
@@ -77,18 +105,12 @@ class Command(BaseCommand):
         self.stdout.write('Clearing product caches...')
         start = time.time()
         
-        # List of product-related cache keys
-        keys_to_clear = [
-            'products:all',
-            'categories:all',
-            'subcategories:all',
-        ]
-        
-        deleted = cache.delete_many(keys_to_clear)
+        # Bumping the catalog namespace invalidates every catalog entry at once
+        bump_namespaces(make_namespace('catalog'))
         elapsed = time.time() - start
         
         self.stdout.write(
-            self.style.SUCCESS(f'✓ Cleared {deleted} product cache keys in {elapsed:.3f}s')
+            self.style.SUCCESS(f'✓ Catalog cache namespace bumped in {elapsed:.3f}s')
         )
 
     def check_cache(self):
@@ -127,31 +149,14 @@ class Command(BaseCommand):
             )
 
     def warm_caches(self):
-        """Pre-populate caches with fresh data."""
-        self.stdout.write('Warming up caches...')
-        start = time.time()
-        
-        # Warm up categories
-        self.stdout.write('  Loading categories...')
-        categories = Category.objects.all().order_by('id')
-        cache.set('categories:all', list(categories), 900)
-        self.stdout.write(f'    ✓ Cached {categories.count()} categories')
-        
-        # Warm up subcategories
-        self.stdout.write('  Loading subcategories...')
-        subcategories = Subcategory.objects.all().order_by('id')
-        cache.set('subcategories:all', list(subcategories), 900)
-        self.stdout.write(f'    ✓ Cached {subcategories.count()} subcategories')
-        
-        # Warm up products (first 100)
-        self.stdout.write('  Loading products...')
-        products = Product.objects.all().order_by('-id')[:100]
-        cache.set('products:recent', list(products), 900)
-        self.stdout.write(f'    ✓ Cached {products.count()} recent products')
-        
-        elapsed = time.time() - start
+        """Render the public endpoints so the page and payload caches are filled."""
+        self.stdout.write(f'Warming up caches (host {cache_warmer.warm_host()})...')
+        result = cache_warmer.warm()
+
+        for url, status in result['failed']:
+            self.stdout.write(self.style.WARNING(f'  ✗ {url}: {status}'))
         self.stdout.write(
-            self.style.SUCCESS(f'\n✓ Caches warmed in {elapsed:.3f}s')
+            self.style.SUCCESS(f"\n✓ {result['warmed']} endpoints warmed in {result['elapsed']:.3f}s")
         )
 
     def show_stats(self):
@@ -177,8 +182,49 @@ class Command(BaseCommand):
             for key, pattern in settings.CACHE_KEYS.items():
                 self.stdout.write(f"  {key}: {pattern}")
         
+        usage = get_cache_stats().get('usage', {})
+        self.stdout.write(f"\nCache Usage ({len(usage.get('processes', []))} process(es)):")
+        self.stdout.write('-' * 50)
+        for process in usage.get('processes', []):
+            for alias, backend in process['backends'].items():
+                self.stdout.write(
+                    f"  {process['host']}:{process['pid']} [{alias}] "
+                    f"{backend['entries']}/{backend['max_entries']} entries, {backend['bytes']} bytes"
+                )
+                for quota, budget in backend.get('quotas', {}).items():
+                    self.stdout.write(
+                        f"    {quota}: {budget['entries']} entries, {budget['bytes']}/{budget['max_bytes']} bytes"
+                    )
+        self.write_usage_table('By key prefix', usage.get('keys', {}))
+        self.write_usage_table('By cached view', usage.get('views', {}))
+
         self.stdout.write('\nDatabase Stats:')
         self.stdout.write('-' * 50)
         self.stdout.write(f"Total Products: {Product.objects.count()}")
         self.stdout.write(f"Total Categories: {Category.objects.count()}")
-        self.stdout.write(f"Total Subcategories: {Subcategory.objects.count()}")
\ No newline at end of file
+        self.stdout.write(f"Total Subcategories: {Subcategory.objects.count()}")
+
+    def write_usage_table(self, title, groups):
+        self.stdout.write(f'\n{title}:')
+        if not groups:
+            self.stdout.write('  (no data yet)')
+            return
+        self.stdout.write(
+            f"  {'group':<45} {'hits':>8} {'misses':>8} {'hit%':>6} {'sets':>7} "
+            f"{'evict':>6} {'avg B':>8} {'ratio':>6} {'avg TTL':>8} {'get p50':>8} {'get p95':>8}"
+        )
+        for name, counters in sorted(groups.items(), key=lambda item: -(item[1]['hits'] + item[1]['misses'])):
+            hit_rate = f"{counters['hit_rate'] * 100:.1f}" if counters['hit_rate'] is not None else '-'
+            self.stdout.write(
+                f"  {name[:45]:<45} {counters['hits']:>8} {counters['misses']:>8} {hit_rate:>6} "
+                f"{counters['sets']:>7} {counters['evictions']:>6} {counters['avg_bytes'] or '-':>8} "
+                f"{counters['compression_ratio'] or '-':>6} {counters['avg_ttl'] or '-':>8} "
+                f"{counters['get_p50_ms'] or '-':>8} {counters['get_p95_ms'] or '-':>8}"
+            )
+
+    def reset_stats(self):
+        """Reset cache usage counters."""
+        cache_stats.reset_all()
+        self.stdout.write(
+            self.style.SUCCESS('✓ Cache usage counters reset (running workers restart from their next publish)')
+        )
@@ -0,0 +1,182 @@
+"""
+Run EXPLAIN on the queries behind each public endpoint and report full
+table scans.
+
+Every endpoint is rendered once through the middleware stack against an
+empty, private cache (so the view really queries), its SELECTs are captured
+and explained. A few lookups that don't sit behind a public GET (the email
+login, the admin brand filter) are explained directly.
+
+Usage:
+    python manage.py explain_queries
+    python manage.py explain_queries -v 2             # print every plan
+    python manage.py explain_queries --fail-on-scan   # exit 1 on a full scan (CI)
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from Systems import cache_warmer
+from Systems.models import Blog, Category, Product, Subcategory
+import re
+
+# Full scans of whole (small) tables that the endpoint returns anyway
+EXPECTED_SCANS = {'Systems_category', 'Systems_subcategory'}
+
+FULL_SCAN_PATTERNS = {
+    # "SCAN Systems_product" (no index), not "SCAN ... USING [COVERING] INDEX ..."
+    'sqlite': re.compile(r'^SCAN (?P<table>\S+)$'),
+    'postgresql': re.compile(r'Seq Scan on (?P<table>\S+)'),
+}
+# A scan read in index/rowid order that stops at the LIMIT isn't a full scan,
+# unless the rows are sorted first
+SORT_MARKERS = {
+    'sqlite': 'USE TEMP B-TREE',
+    'postgresql': 'Sort',
+}
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the queries of each public endpoint and report full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fail-on-scan',
+            action='store_true',
+            help='Exit with an error if an unexpected full table scan is found',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in EXPLAIN_PREFIXES:
+            raise CommandError(f'EXPLAIN output of {connection.vendor} is not supported')
+        self.verbosity = options['verbosity']
+
+        scans = []
+        for label, path, query in self.endpoints():
+            captured = []
+            with connection.execute_wrapper(self.collector(captured)):
+                status = self.render(path, query)
+            if status != 200:
+                self.stdout.write(self.style.WARNING(f'{label}: HTTP {status}, skipped'))
+                continue
+            scans += self.report(label, captured)
+
+        for label, queryset in self.lookups():
+            sql, params = queryset.query.sql_with_params()
+            scans += self.report(label, [(sql, params)])
+
+        unexpected = [(label, table) for label, table in scans if table not in EXPECTED_SCANS]
+        self.stdout.write('')
+        if not unexpected:
+            self.stdout.write(self.style.SUCCESS('✓ No unexpected full table scans'))
+            return
+        for label, table in unexpected:
+            self.stdout.write(self.style.ERROR(f'  {label}: full scan of {table}'))
+        if options['fail_on_scan']:
+            raise CommandError(f'{len(unexpected)} unexpected full table scans')
+
+    # ===============================
+    # Targets
+    # ===============================
+
+    def endpoints(self):
+        """(label, path, query) of each public endpoint, using existing slugs."""
+        targets = [
+            ('categories', reverse('category-list'), {}),
+            ('subcategories', reverse('subcategory-list'), {}),
+            ('hero banners', reverse('hero-banners'), {}),
+            ('popular products', reverse('popular-products'), {}),
+            ('products', reverse('product-list'), {}),
+            ('products, page 2', reverse('product-list'), {'page': 2}),
+            ('blogs', reverse('blog-list'), {}),
+            ('footer blogs', reverse('blog-footer-blogs'), {}),
+        ]
+
+        category = Category.objects.order_by('id').values_list('slug', flat=True).first()
+        if category:
+            targets.append((
+                'category subcategories', reverse('category-subcategories-list', kwargs={'category_slug': category}), {},
+            ))
+        subcategory = Subcategory.objects.order_by('id').values_list('slug', flat=True).first()
+        if subcategory:
+            path = reverse('subcategory-products-list', kwargs={'subcategory_slug': subcategory})
+            targets.append(('subcategory products', path, {}))
+            targets.append(('subcategory products, page 2', path, {'page': 2}))
+        product = Product.objects.order_by('-id').values_list('slug', flat=True).first()
+        if product:
+            targets.append(('product detail', reverse('product-detail', kwargs={'slug': product}), {}))
+            targets.append(('related products', reverse('product-related', kwargs={'slug': product}), {}))
+        blog = Blog.objects.filter(is_published=True).values_list('slug', flat=True).first()
+        if blog:
+            targets.append(('blog detail', reverse('blog-detail', kwargs={'slug': blog}), {}))
+        return targets
+
+    def lookups(self):
+        """Queries outside the public GET endpoints."""
+        brand = Product.objects.exclude(brand='').values_list('brand', flat=True).first() or 'brand'
+        return [
+            ('login by email', User.objects.filter(email='someone@example.com')),
+            ('admin brand filter choices', Product.objects.values_list('brand', flat=True).distinct().order_by('brand')),
+            ('admin products by brand', Product.objects.filter(brand=brand).order_by('-id')),
+        ]
+
+    # ===============================
+    # Capture and explain
+    # ===============================
+
+    def render(self, path, query):
+        # A private, empty cache so every view queries instead of hitting the page cache
+        with override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'explain-queries'}},
+            CACHE_STATS_ENABLED=False,
+            QUERY_BUDGET_ENABLED=False,
+            EAGER_LOADING_GUARD=None,
+        ):
+            return cache_warmer.render(path, query)
+
+    def collector(self, captured):
+        """Execute wrapper appending each SELECT's (sql, params) to captured."""
+        def collect(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith('SELECT'):
+                captured.append((sql, params))
+            return execute(sql, params, many, context)
+        return collect
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(EXPLAIN_PREFIXES[connection.vendor] + sql, params)
+            rows = cursor.fetchall()
+        # SQLite: (id, parent, notused, detail); PostgreSQL: (line,)
+        return [row[-1] for row in rows]
+
+    def stops_at_limit(self, sql, plan):
+        sort_marker = SORT_MARKERS[connection.vendor]
+        return re.search(r'\bLIMIT\b', sql, re.IGNORECASE) and not any(sort_marker in line for line in plan)
+
+    def report(self, label, queries):
+        pattern = FULL_SCAN_PATTERNS[connection.vendor]
+        scans = []
+        seen = set()
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{label} ({len(queries)} queries)'))
+        for sql, params in queries:
+            if sql in seen:
+                continue
+            seen.add(sql)
+            plan = self.explain(sql, params)
+            tables = [match.group('table').strip('"') for match in map(pattern.search, plan) if match]
+            if self.stops_at_limit(sql, plan):
+                tables = []
+            scans += [(label, table) for table in tables]
+
+            if tables or self.verbosity > 1:
+                self.stdout.write(f'  {sql[:160]}')
+                for line in plan:
+                    style = self.style.WARNING if pattern.search(line) else (lambda text: text)
+                    self.stdout.write(style(f'    {line}'))
+        return scans
@@ -0,0 +1,70 @@
+"""
+Drain the CDN purge queue (see Systems/cdn_purge.py).
+
+Usage:
+    python manage.py process_purge_queue            # run as a worker
+    python manage.py process_purge_queue --once     # send what is due, then exit
+    python manage.py process_purge_queue --status
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from Systems import cdn_purge
+from Systems.models import PurgeRequest
+import time
+
+
+class Command(BaseCommand):
+    help = 'Send queued surrogate-key purges to the CDN'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Purge everything currently due, then exit',
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Show the queue length and failing purges',
+        )
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self.show_status()
+        elif options['once']:
+            self.drain()
+        else:
+            self.run_worker()
+
+    def drain(self):
+        total = 0
+        while True:
+            purged = cdn_purge.process_purge_queue()
+            if not purged:
+                break
+            total += purged
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} surrogate keys purged'))
+        return total
+
+    def run_worker(self):
+        interval = cdn_purge._purge_settings()['POLL_INTERVAL']
+        self.stdout.write(f'Draining the CDN purge queue every {interval}s (Ctrl+C to stop)...')
+        try:
+            while True:
+                close_old_connections()
+                if not cdn_purge.process_purge_queue():
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped.')
+
+    def show_status(self):
+        now = timezone.now()
+        self.stdout.write(f'Queued: {PurgeRequest.objects.count()}')
+        self.stdout.write(f'Due now: {PurgeRequest.objects.filter(next_attempt_at__lte=now).count()}')
+        for request in PurgeRequest.objects.filter(attempts__gt=0).order_by('-attempts')[:20]:
+            self.stdout.write(
+                self.style.WARNING(f'  {request.tag}: {request.attempts} attempts, next {request.next_attempt_at:%H:%M:%S}')
+            )
+            self.stdout.write(f'    {request.last_error[:200]}')
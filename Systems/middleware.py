@@ -0,0 +1,455 @@
+"""
+Cache middleware that registers stored responses under cache tags and
+versioned namespaces, keeps one variant per authentication class and keys
+on a canonical form of the query string.
+"""
+
+from fnmatch import fnmatchcase
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.middleware.cache import CacheMiddleware, FetchFromCacheMiddleware, UpdateCacheMiddleware
+from django.utils.cache import (
+    cc_delim_re, get_cache_key, get_conditional_response, get_max_age, has_vary_header, learn_cache_key,
+    patch_cache_control, patch_response_headers, patch_vary_headers,
+)
+from django.urls import Resolver404, resolve
+from django.utils.decorators import decorator_from_middleware_with_args
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.encoding import escape_uri_path
+from django.utils.http import http_date, parse_http_date_safe, urlencode
+from rest_framework.pagination import PageNumberPagination
+
+from .cache_stats import page_group, stats, stats_enabled, view_name
+from .cdn_purge import surrogate_key
+from .cache_utils import (
+    adaptive_timeout, auth_variant, generation_sequence, generations_are_current, get_namespace_generations,
+    tag_namespaces,
+)
+
+logger = logging.getLogger(__name__)
+
+# Responses vary on these for HTTP caches, but the local cache keys on the
+# auth variant instead: keying on the raw JWT gives every token its own entry.
+AUTH_VARY_HEADERS = ('Authorization',)
+
+# Kept even for views that declare cache_query_params: DRF picks the renderer from it
+RENDERER_QUERY_PARAMS = ('format',)
+
+
+def _view_class(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # The site-wide fetch middleware runs before URL resolution
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+    return getattr(match.func, 'cls', None) or getattr(match.func, 'view_class', None)
+
+
+def _pagination_defaults(view_class):
+    paginator = getattr(view_class, 'pagination_class', None)
+    if paginator is None or not issubclass(paginator, PageNumberPagination):
+        return {}
+    defaults = {paginator.page_query_param: '1'}
+    if paginator.page_size_query_param and paginator.page_size:
+        defaults[paginator.page_size_query_param] = str(paginator.page_size)
+    return defaults
+
+
+def canonical_query_string(request):
+    """
+    Query string the caches key on, so equivalent URLs share one entry.
+
+    Parameters matching CACHE_IGNORED_QUERY_PARAMS (utm_*, click ids) are
+    dropped; so are parameters the view doesn't read, when it declares
+    them in a cache_query_params attribute. The view's default page and
+    page size are filled in and parameters are sorted by name (repeated
+    values keep their order).
+
+    Example:
+        # GET /api/subcategories/detectors/products/?utm_source=mail&page_size=40
+        canonical_query_string(request)
+        # Returns: 'page=1&page_size=40'
+    """
+    if not hasattr(request, '_cache_query_string'):
+        view_class = _view_class(request)
+        allowed = getattr(view_class, 'cache_query_params', None)
+        ignored = getattr(settings, 'CACHE_IGNORED_QUERY_PARAMS', ())
+        params = []
+        for name, values in request.GET.lists():
+            if any(fnmatchcase(name, pattern) for pattern in ignored):
+                continue
+            if allowed is not None and name not in allowed and name not in RENDERER_QUERY_PARAMS:
+                continue
+            params.extend((name, value) for value in values)
+        present = {name for name, _ in params}
+        params.extend(
+            (name, value) for name, value in _pagination_defaults(view_class).items() if name not in present
+        )
+        params.sort(key=lambda param: param[0])
+        request._cache_query_string = urlencode(params)
+    return request._cache_query_string
+
+
+class CanonicalURLRequest:
+    """
+    Request stand-in for Django's cache key functions, which hash
+    build_absolute_uri(): its URI carries the canonical query string.
+    """
+
+    def __init__(self, request):
+        self._request = request
+
+    def __getattr__(self, name):
+        return getattr(self._request, name)
+
+    def build_absolute_uri(self, location=None):
+        if location is None:
+            query = canonical_query_string(self._request)
+            location = escape_uri_path(self._request.path) + (f'?{query}' if query else '')
+        return self._request.build_absolute_uri(location)
+
+
+class AuthVariantMixin:
+    """
+    Builds the per-request key prefix: the page group of the view (see
+    cache_stats.page_group(), for per-group quotas), the configured prefix
+    and the auth variant.
+    """
+    # Page cache stats are kept per view and per layer (site-wide or per-view cache)
+    stats_layer = 'site'
+
+    def stats_name(self, request):
+        return f'{view_name(request)} [{self.stats_layer}]'
+
+    def get_key_prefix(self, request):
+        variant = auth_variant(request)
+        if variant is None:
+            return None
+        return f'{page_group(request)}.{self.key_prefix}.{variant}'
+
+
+class TaggedResponseMixin(AuthVariantMixin):
+    """
+    Stores responses under a key prefixed with the auth variant, stamped
+    with the generations of their namespaces (cache_utils.namespace_response()
+    or the decorator's namespaces) and of the tags the view attached with
+    cache_utils.tag_response(). A namespace bump or
+    cache_utils.invalidate_tags() makes the stored copy stale.
+
+    A response is not stored if anything was invalidated after the request
+    missed the cache (see cache_utils.generation_sequence()): it may have
+    been built from data older than its stamp.
+    """
+    namespaces = ()
+
+    def get_namespaces(self, request, response):
+        namespaces = self.namespaces(request) if callable(self.namespaces) else self.namespaces
+        tags = tag_namespaces(getattr(response, 'cache_tags', ()))
+        return set(namespaces) | set(tags) | getattr(response, 'cache_namespaces', set())
+
+    def stamp_generations(self, request, response):
+        namespaces = self.get_namespaces(request, response)
+        if namespaces:
+            # Keep the union so an outer (site-wide) cache stamps the same set
+            response.cache_namespaces = namespaces
+            response.cache_generations = get_namespace_generations(sorted(namespaces))
+
+    def learn_cache_key(self, request, response, timeout, key_prefix):
+        vary = response.get('Vary')
+        if vary:
+            headers = [header for header in cc_delim_re.split(vary)
+                       if header.lower() not in {h.lower() for h in AUTH_VARY_HEADERS}]
+            if headers:
+                response['Vary'] = ', '.join(headers)
+            else:
+                del response['Vary']
+        try:
+            return learn_cache_key(CanonicalURLRequest(request), response, timeout, key_prefix, cache=self.cache)
+        finally:
+            patch_vary_headers(response, AUTH_VARY_HEADERS)
+
+    def process_response(self, request, response):
+        # Mirrors UpdateCacheMiddleware.process_response with a per-request key prefix
+        if not self._should_update_cache(request, response):
+            return response
+        if response.streaming or response.status_code not in (200, 304):
+            return response
+        if not request.COOKIES and response.cookies and has_vary_header(response, 'Cookie'):
+            return response
+        if 'private' in response.get('Cache-Control', ()):
+            return response
+
+        key_prefix = self.get_key_prefix(request)
+        if key_prefix is None:
+            return response
+
+        timeout = self.page_timeout
+        if timeout is None:
+            timeout = get_max_age(response)
+            if timeout is None:
+                timeout = self.cache_timeout
+            elif timeout == 0:
+                return response
+        patch_response_headers(response, timeout)
+
+        if timeout and response.status_code == 200:
+            self.stamp_generations(request, response)
+            since = getattr(request, '_cache_generation_sequence', None)
+            if since is not None and generation_sequence() != since:
+                logger.debug(f"Not caching {request.path}: invalidated while it was built")
+                return response
+            # HTTP caches keep the configured max-age: invalidation can't reach them.
+            # Our copy is purged on writes, so its TTL can follow the write rate.
+            tags = getattr(response, 'cache_tags', None)
+            timeout = adaptive_timeout(tags, timeout)
+            cache_key = self.learn_cache_key(request, response, timeout, key_prefix)
+            if hasattr(response, 'render') and callable(response.render):
+                response.add_post_render_callback(lambda r: self.store(request, cache_key, r, timeout))
+            else:
+                self.store(request, cache_key, response, timeout)
+        return response
+
+    def store(self, request, cache_key, response, timeout):
+        start = time.perf_counter()
+        self.cache.set(cache_key, response, timeout)
+        if stats_enabled():
+            stats.record_set(self.stats_name(request), time.perf_counter() - start, section='views')
+            stats.record_ttl(self.stats_name(request), timeout, section='views')
+
+
+class VersionedFetchMixin(AuthVariantMixin):
+    """
+    Looks responses up under the auth-variant key prefix and treats one
+    stamped with an outdated namespace generation as a miss.
+    """
+
+    def miss(self, request):
+        request._cache_update_cache = True
+        # The outermost cache's snapshot is the earliest, keep it
+        if not hasattr(request, '_cache_generation_sequence'):
+            request._cache_generation_sequence = generation_sequence()
+
+    def process_request(self, request):
+        # Mirrors FetchFromCacheMiddleware.process_request with a per-request key prefix
+        if request.method not in ('GET', 'HEAD'):
+            request._cache_update_cache = False
+            return None
+
+        key_prefix = self.get_key_prefix(request)
+        if key_prefix is None:
+            # Invalid credentials: let the view answer them (e.g. with a 401)
+            request._cache_update_cache = False
+            return None
+
+        start = time.perf_counter()
+        key_request = CanonicalURLRequest(request)
+        cache_key = get_cache_key(key_request, key_prefix, 'GET', cache=self.cache)
+        if cache_key is None:
+            if stats_enabled():
+                stats.record_get(self.stats_name(request), False, time.perf_counter() - start, section='views')
+            self.miss(request)
+            return None
+        response = self.cache.get(cache_key)
+        if response is None and request.method == 'HEAD':
+            cache_key = get_cache_key(key_request, key_prefix, 'HEAD', cache=self.cache)
+            response = self.cache.get(cache_key)
+
+        hit = response is not None and generations_are_current(getattr(response, 'cache_generations', None))
+        if stats_enabled():
+            stats.record_get(self.stats_name(request), hit, time.perf_counter() - start, section='views')
+        if not hit:
+            self.miss(request)
+            return None
+
+        max_age_seconds = get_max_age(response)
+        expires_timestamp = parse_http_date_safe(response.get('Expires'))
+        if max_age_seconds is not None and expires_timestamp is not None:
+            remaining_seconds = expires_timestamp - int(time.time())
+            # Use Age: 0 if local clock got turned back.
+            response['Age'] = max(0, max_age_seconds - remaining_seconds)
+
+        request._cache_update_cache = False
+        # Revalidation against the stored validators (see conditional): 304, no body
+        return get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(response.get('Last-Modified')),
+            response=response,
+        )
+
+
+class TaggedUpdateCacheMiddleware(TaggedResponseMixin, UpdateCacheMiddleware):
+    """Drop-in replacement for UpdateCacheMiddleware (site-wide cache)."""
+
+
+class TaggedFetchFromCacheMiddleware(VersionedFetchMixin, FetchFromCacheMiddleware):
+    """Drop-in replacement for FetchFromCacheMiddleware (site-wide cache)."""
+
+
+class TaggedCacheMiddleware(VersionedFetchMixin, TaggedResponseMixin, CacheMiddleware):
+    """Drop-in replacement for CacheMiddleware (per-view cache)."""
+    stats_layer = 'view'
+
+    def __init__(self, get_response, namespaces=(), **kwargs):
+        super().__init__(get_response, **kwargs)
+        self.namespaces = namespaces
+
+
+def tagged_cache_page(timeout, *, cache=None, key_prefix=None, namespaces=()):
+    """
+    Same as django.views.decorators.cache.cache_page, but cached responses
+    can be purged by tag and by namespace, and are shared by all users of
+    the same auth variant (anonymous / authenticated / staff).
+
+    namespaces may be a list, or a callable taking the request and returning
+    one (e.g. to derive a per-subcategory namespace from the URL kwargs).
+    """
+    return decorator_from_middleware_with_args(TaggedCacheMiddleware)(
+        page_timeout=timeout,
+        cache_alias=cache,
+        key_prefix=key_prefix,
+        namespaces=namespaces,
+    )
+
+
+# ===============================
+# HTTP caching policy
+# ===============================
+
+# Directives meaning a view opted out of shared caching (e.g. never_cache)
+UNCACHEABLE_DIRECTIVES = ('no-store', 'no-cache', 'private')
+
+
+def cache_control_policy(request):
+    """Entry of settings.CACHE_CONTROL_POLICIES for the URL name of a request, or None."""
+    return getattr(settings, 'CACHE_CONTROL_POLICIES', {}).get(view_name(request))
+
+
+class CacheControlPolicyMiddleware(MiddlewareMixin):
+    """
+    Sets Cache-Control for browsers and shared caches (CDN, reverse proxy)
+    from settings.CACHE_CONTROL_POLICIES, keyed by URL name:
+
+        public, max-age, s-maxage, stale-while-revalidate, stale-if-error
+
+    for anonymous requests, plus the response's cache tags as surrogate keys
+    (see cdn_purge). Authenticated responses may carry prices hidden
+    from anonymous users, so they get CACHE_CONTROL_PRIVATE instead. Both
+    vary on Authorization; a CDN in front should bypass requests carrying a
+    session cookie, which authenticate without that header.
+
+    Must come before TaggedUpdateCacheMiddleware: the local page cache
+    stores the response (with its own TTL) first, so these headers never
+    shorten the local copy or keep the 'auth' variant out of it.
+    """
+
+    def process_response(self, request, response):
+        if request.method not in ('GET', 'HEAD') or response.status_code not in (200, 304):
+            return response
+        policy = cache_control_policy(request)
+        if policy is None:
+            return response
+        if any(directive in response.get('Cache-Control', '') for directive in UNCACHEABLE_DIRECTIVES):
+            return response
+
+        if auth_variant(request) == 'anon':
+            directives = {'public': True, 'max_age': policy.get('max_age', 0)}
+            for name in ('s_maxage', 'stale_while_revalidate', 'stale_if_error'):
+                if policy.get(name) is not None:
+                    directives[name] = policy[name]
+            self.set_surrogate_keys(response)
+        else:
+            private = getattr(settings, 'CACHE_CONTROL_PRIVATE', {'max_age': 0})
+            directives = {'private': True, 'max_age': private.get('max_age', 0)}
+
+        # Replace what the page cache middleware set: patch_cache_control() keeps the lower max-age
+        if response.has_header('Cache-Control'):
+            del response['Cache-Control']
+        patch_cache_control(response, **directives)
+        response['Expires'] = http_date(time.time() + directives['max_age'])
+        patch_vary_headers(response, AUTH_VARY_HEADERS)
+        return response
+
+    def set_surrogate_keys(self, response):
+        # The response's cache tags, so a purge by tag (cdn_purge) reaches the edge copy
+        tags = getattr(response, 'cache_tags', set()) | getattr(response, 'surrogate_keys', set())
+        if not tags:
+            return
+        keys = sorted({surrogate_key(tag) for tag in tags})
+        for header in getattr(settings, 'CACHE_SURROGATE_KEY_HEADERS', ('Surrogate-Key', 'Cache-Tag')):
+            response[header] = ','.join(keys) if header.lower() == 'cache-tag' else ' '.join(keys)
+
+
+# ===============================
+# Query budgets
+# ===============================
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more SQL queries than its route's budget."""
+
+
+class QueryCounter:
+    """Execute wrapper counting queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts the SQL queries and DB time of each request and compares the
+    count with settings.QUERY_BUDGETS (by URL name, else
+    QUERY_BUDGET_DEFAULT). Over budget, QUERY_BUDGET_MODE 'raise' fails the
+    request (tests) and 'log' logs a warning. Enabled by
+    QUERY_BUDGET_ENABLED (DEBUG by default), checked per request so tests
+    can switch it on with override_settings.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        wrapped = []
+        for connection in connections.all():
+            connection.execute_wrappers.append(counter)
+            wrapped.append(connection)
+        try:
+            response = self.get_response(request)
+        finally:
+            for connection in wrapped:
+                connection.execute_wrappers.remove(counter)
+
+        budget = self.budget_for(request)
+        response['X-Query-Count'] = str(counter.count)
+        response['X-DB-Time-ms'] = f'{counter.duration * 1000:.1f}'
+        if budget is not None and counter.count > budget:
+            message = (
+                f"{request.method} {request.get_full_path()} ({view_name(request)}) ran {counter.count} queries "
+                f"in {counter.duration * 1000:.1f}ms, budget {budget}"
+            )
+            if getattr(settings, 'QUERY_BUDGET_MODE', 'log') == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def budget_for(self, request):
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        return budgets.get(view_name(request), getattr(settings, 'QUERY_BUDGET_DEFAULT', None))
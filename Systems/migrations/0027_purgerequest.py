@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-15 10:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Systems', '0026_catalog_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurgeRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=255, unique=True)),
+                ('queued_at', models.DateTimeField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(db_index=True)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['queued_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-15 04:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+# auth_user is not ours to declare indexes on, so the index for the email
+# login lookup (CustomTokenObtainPairSerializer.validate) is added here.
+USER_EMAIL_INDEX = models.Index(fields=['email'], name='user_email_idx')
+
+
+def add_user_email_index(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    schema_editor.add_index(User, USER_EMAIL_INDEX)
+
+
+def remove_user_email_index(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    schema_editor.remove_index(User, USER_EMAIL_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Systems', '0027_purgerequest'),
+        # After auth's last migration: on SQLite its table rebuilds would drop an index it doesn't know about
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at'], name='blog_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='herobanner',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['display_order', '-created_at'], name='herobanner_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['subcategory', '-id'], name='product_subcategory_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_popular', True)), fields=['-id'], name='product_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand'], name='product_brand_idx'),
+        ),
+        migrations.RunPython(add_user_email_index, remove_user_email_index),
+    ]
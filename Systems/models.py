@@ -17,6 +17,7 @@ class Category(models.Model):
     name = models.CharField(max_length=255)
     type = models.CharField(max_length=50, choices=[('fire_safety', 'Fire Safety'), ('ict', 'ICT'), ('solar', 'Solar')], default='fire_safety')
     slug = models.SlugField(unique=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -36,6 +37,7 @@ class Subcategory(models.Model):
     category = models.ForeignKey(Category, related_name='subcategories', on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
     slug = models.SlugField(unique=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -131,6 +133,19 @@ class Product(models.Model):
         help_text="Custom SEO description (max 155 chars). Leave blank for auto-generated description."
     )
 
+    # Bumped by spec table edits too (see signals), for ETag / Last-Modified
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # A subcategory's products, newest first (listings, related products)
+            models.Index(fields=['subcategory', '-id'], name='product_subcategory_id_idx'),
+            # Popular products, newest first; only the flagged rows are indexed
+            models.Index(fields=['-id'], condition=models.Q(is_popular=True), name='product_popular_idx'),
+            # Admin brand filter
+            models.Index(fields=['brand'], name='product_brand_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         # Auto-generate slug from name if not provided
         if not self.slug:
@@ -195,6 +210,12 @@ class Blog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Published blogs, newest first; drafts are left out of the index
+            models.Index(fields=['-created_at'], condition=models.Q(is_published=True), name='blog_published_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             base_slug = slugify(self.title)
@@ -348,6 +369,12 @@ class HeroBanner(models.Model):
         ordering = ['display_order', '-created_at']
         verbose_name = 'Hero Banner / Promotional Poster'
         verbose_name_plural = 'Hero Banners / Promotional Posters'
+        indexes = [
+            # Live banners in display order
+            models.Index(
+                fields=['display_order', '-created_at'], condition=models.Q(is_active=True), name='herobanner_active_idx',
+            ),
+        ]
     
     def clean(self):
         """Validate that required fields are present based on display mode"""
@@ -372,4 +399,22 @@ class HeroBanner(models.Model):
     
     def __str__(self):
         status = "LIVE" if self.is_active else "INACTIVE"
-        return f"[{status}] {self.campaign_name} ({self.get_display_mode_display()})"
\ No newline at end of file
+        return f"[{status}] {self.campaign_name} ({self.get_display_mode_display()})"
+
+class PurgeRequest(models.Model):
+    """
+    A surrogate key (cache tag) waiting to be purged from the CDN / reverse
+    proxy. Rows are written when the local caches are invalidated and
+    drained by `manage.py process_purge_queue` (see Systems/cdn_purge.py).
+    """
+    tag = models.CharField(max_length=255, unique=True)
+    queued_at = models.DateTimeField()
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(db_index=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['queued_at']
+
+    def __str__(self):
+        return f"{self.tag} (queued {self.queued_at:%Y-%m-%d %H:%M:%S})"
@@ -0,0 +1,145 @@
+"""
+Pagination for the product listings.
+
+Page numbers are the default, as the current frontend expects (count, next,
+previous, results). Page N costs a COUNT(*) plus an OFFSET that grows with
+N, so a client can opt in to keyset pages instead: ?pagination=cursor for
+the first page, then the opaque ?cursor= of the next / previous links. A
+keyset page seeks to the last row of the previous one on the listing's
+ordering (`cursor_ordering`, newest first), without counting, so a deep
+page costs as much as the first, and the cursors stay stable while
+products are added.
+
+Page-number listings take their total from a cached count per scope (all
+products, one subcategory, one category) instead of a COUNT(*) per page.
+The signals keep the counts current as products are created, deleted or
+moved; PRODUCT_COUNT_TIMEOUT bounds any drift (e.g. queryset.update()).
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from .cache_utils import get_cache_key, make_namespace
+
+
+class OptInCursorPagination(PageNumberPagination):
+    """
+    PageNumberPagination that switches to CursorPagination for requests
+    carrying ?pagination=cursor or a ?cursor=. Subclasses set page_size and
+    friends as usual; the cursor pages use the same sizes.
+
+    Example:
+        GET /api/products/?pagination=cursor
+        # Returns: {"next": ".../api/products/?cursor=cD0xMjM%3D&pagination=cursor", "previous": null, "results": [...]}
+    """
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    # Keyset ordering; the leading field should be unique, or nearly so
+    cursor_ordering = ('-id',)
+
+    cursor_paginator = None
+
+    def cursor_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or params.get(self.mode_query_param) == 'cursor'
+
+    def get_cursor_paginator(self):
+        paginator = CursorPagination()
+        paginator.page_size = self.page_size
+        paginator.page_size_query_param = self.page_size_query_param
+        paginator.max_page_size = self.max_page_size
+        paginator.cursor_query_param = self.cursor_query_param
+        paginator.ordering = self.cursor_ordering
+        return paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_requested(request):
+            self.cursor_paginator = self.get_cursor_paginator()
+            page = self.cursor_paginator.paginate_queryset(queryset, request, view)
+            self.display_page_controls = self.cursor_paginator.display_page_controls
+            return page
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.to_html()
+        return super().to_html()
+
+
+# ===============================
+# Cached counts
+# ===============================
+
+def product_count_key(*scope):
+    """
+    Example:
+        product_count_key('subcategory', 12)
+        # Returns: 'catalog.v17|products:count:subcategory:12'
+    """
+    template = settings.CACHE_KEYS.get('product_count', 'products:count:{}')
+    return get_cache_key(template, ':'.join(map(str, scope)), namespaces=[make_namespace('catalog')])
+
+
+def product_count_scopes(subcategory_id, category_id=None):
+    """Count scopes a product of this subcategory (and category) is counted in."""
+    scopes = [('all',), ('subcategory', subcategory_id)]
+    if category_id is not None:
+        scopes.append(('category', category_id))
+    return scopes
+
+
+def get_product_count(queryset, scope):
+    """queryset.count(), cached for PRODUCT_COUNT_TIMEOUT under the scope's key."""
+    key = product_count_key(*scope)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        # add(): an increment that landed while counting is not overwritten
+        cache.add(key, count, getattr(settings, 'PRODUCT_COUNT_TIMEOUT', 300))
+    return count
+
+
+def adjust_product_counts(scopes, delta):
+    """Move the cached counts of these scopes by delta; uncached ones are counted on the next read."""
+    for scope in scopes:
+        try:
+            cache.incr(product_count_key(*scope), delta)
+        except ValueError:
+            pass
+
+
+class CachedCountPaginator(Paginator):
+    def __init__(self, object_list, per_page, count_scope=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_scope = count_scope
+
+    @cached_property
+    def count(self):
+        if self.count_scope is None:
+            return super().count
+        return get_product_count(self.object_list, self.count_scope)
+
+
+class CachedCountPagination(OptInCursorPagination):
+    """
+    Page numbers with the total read from the count cache. The view tells
+    which scope its queryset counts with get_count_scope(), e.g.
+    ('subcategory', 12); None (or no such method) counts the queryset.
+    """
+    count_scope = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        get_count_scope = getattr(view, 'get_count_scope', None)
+        self.count_scope = get_count_scope() if get_count_scope else None
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, object_list, per_page, **kwargs):
+        return CachedCountPaginator(object_list, per_page, count_scope=self.count_scope, **kwargs)
@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import authenticate
 from django.conf import settings
+from .eager_loading import EagerLoadingMixin
 from .models import Category, Subcategory, Product, SpecificationTable, SpecificationRow, Blog, HeroBanner
 import os
 
@@ -75,7 +76,9 @@ class SubcategoryMiniSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug']
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    prefetch_related_fields = ('subcategories',)
+
     subcategories = SubcategoryMiniSerializer(many=True, read_only=True)
 
     class Meta:
@@ -117,7 +120,11 @@ class SpecificationTableSerializer(serializers.ModelSerializer):
 # -----------------------------
 # PRODUCT SERIALIZER (with SEO fields + Brand + SKU)
 # -----------------------------
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    # Read by subcategory_detail, category, the *_slug fields and spec_tables
+    select_related_fields = ('subcategory__category',)
+    prefetch_related_fields = ('spec_tables__rows',)
+
     image = serializers.SerializerMethodField()
     price = serializers.SerializerMethodField()
     price_requires_login = serializers.SerializerMethodField()
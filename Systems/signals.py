@@ -0,0 +1,181 @@
+"""
+Cache invalidation driven by model signals.
+
+Every write to a catalog model (DRF views, Django admin, inline edits,
+import-export) queues the cache tags it affects. Tags are purged once per
+transaction, see cache_utils.invalidate_tags_on_commit().
+
+Product creations, deletions and moves also adjust the cached listing
+totals (pagination.CachedCountPagination) once the transaction commits.
+"""
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache_utils import invalidate_tags_on_commit, make_tag, slug_tag
+from .models import Blog, Category, HeroBanner, Product, SpecificationRow, SpecificationTable, Subcategory
+from .pagination import adjust_product_counts, product_count_scopes
+
+
+def category_write_tags(category):
+    return [make_tag('category', category.pk), make_tag('categories'), slug_tag(Category, category.slug)]
+
+
+def subcategory_write_tags(subcategory):
+    return [
+        make_tag('subcategory', subcategory.pk),
+        make_tag('category', subcategory.category_id),
+        make_tag('categories'),
+        slug_tag(Subcategory, subcategory.slug),
+    ]
+
+
+def product_write_tags(product):
+    tags = [
+        make_tag('product', product.pk),
+        make_tag('subcategory', product.subcategory_id),
+        make_tag('products'),
+        make_tag('popular'),
+        slug_tag(Product, product.slug),
+    ]
+    # Moved to another subcategory: every page of the old one lists it too
+    previous_subcategory_id = getattr(product, '_previous_subcategory_id', None)
+    if previous_subcategory_id not in (None, product.subcategory_id):
+        tags.append(make_tag('subcategory', previous_subcategory_id))
+    return tags
+
+
+def specification_table_write_tags(table):
+    return [make_tag('product', table.product_id)]
+
+
+def specification_row_product_id(row):
+    # Inline admin edits already hold the table; avoid a query per row
+    if SpecificationRow._meta.get_field('table').is_cached(row):
+        return row.table.product_id
+    return SpecificationTable.objects.filter(pk=row.table_id).values_list('product_id', flat=True).first()
+
+
+def specification_row_write_tags(row):
+    product_id = specification_row_product_id(row)
+    return [make_tag('product', product_id)] if product_id else []
+
+
+def blog_write_tags(blog):
+    return [make_tag('blog', blog.pk), make_tag('blogs'), slug_tag(Blog, blog.slug)]
+
+
+def hero_banner_write_tags(banner):
+    return [make_tag('banner')]
+
+
+TAG_BUILDERS = {
+    Category: category_write_tags,
+    Subcategory: subcategory_write_tags,
+    Product: product_write_tags,
+    SpecificationTable: specification_table_write_tags,
+    SpecificationRow: specification_row_write_tags,
+    Blog: blog_write_tags,
+    HeroBanner: hero_banner_write_tags,
+}
+
+
+# Children rendered inside their parent's JSON: a write to one moves the
+# parent's updated_at, which its ETag / Last-Modified are derived from.
+PARENT_PRODUCT_IDS = {
+    SpecificationTable: lambda table: table.product_id,
+    SpecificationRow: specification_row_product_id,
+}
+
+
+def queue_invalidation(instance, using=None):
+    build_tags = TAG_BUILDERS.get(type(instance))
+    if build_tags is None:
+        return
+    invalidate_tags_on_commit(*build_tags(instance), using=using)
+
+
+def touch_parent_product(instance, using=None):
+    get_product_id = PARENT_PRODUCT_IDS.get(type(instance))
+    product_id = get_product_id(instance) if get_product_id else None
+    if product_id:
+        Product.objects.using(using).filter(pk=product_id).update(updated_at=timezone.now())
+
+
+def invalidate_on_save(sender, instance, raw=False, using=None, **kwargs):
+    if raw:  # loaddata
+        return
+    touch_parent_product(instance, using=using)
+    queue_invalidation(instance, using=using)
+
+
+def invalidate_on_delete(sender, instance, using=None, **kwargs):
+    touch_parent_product(instance, using=using)
+    queue_invalidation(instance, using=using)
+
+
+# Connected per model: a sender-less post_delete receiver would disable
+# fast (bulk) deletes for every model in the project, sessions included.
+for model in TAG_BUILDERS:
+    post_save.connect(invalidate_on_save, sender=model, dispatch_uid=f'cache_invalidate_save_{model.__name__}')
+    post_delete.connect(invalidate_on_delete, sender=model, dispatch_uid=f'cache_invalidate_delete_{model.__name__}')
+
+
+@receiver(m2m_changed)
+def invalidate_on_m2m_change(sender, instance, action, using=None, **kwargs):
+    # m2m_changed is sent with the through model as sender, so filter on the instance
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        queue_invalidation(instance, using=using)
+
+
+# ===============================
+# Cached product counts
+# ===============================
+
+def product_category_id(product, subcategory_id, using=None):
+    if subcategory_id == product.subcategory_id and Product._meta.get_field('subcategory').is_cached(product):
+        return product.subcategory.category_id
+    return Subcategory.objects.using(using).filter(pk=subcategory_id).values_list('category_id', flat=True).first()
+
+
+def adjust_counts_on_commit(scopes, delta, using=None):
+    transaction.on_commit(lambda: adjust_product_counts(scopes, delta), using=using)
+
+
+@receiver(pre_save, sender=Product, dispatch_uid='product_remember_subcategory')
+def remember_product_subcategory(sender, instance, raw=False, using=None, **kwargs):
+    # Saving an existing product may move it to another subcategory, whose
+    # pages and count are then out of date too
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._previous_subcategory_id = (
+        Product.objects.using(using).filter(pk=instance.pk).values_list('subcategory_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Product, dispatch_uid='product_count_save')
+def count_product_on_save(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    subcategory_id = instance.subcategory_id
+    if created:
+        scopes = product_count_scopes(subcategory_id, product_category_id(instance, subcategory_id, using))
+        adjust_counts_on_commit(scopes, 1, using=using)
+        return
+    old_subcategory_id = getattr(instance, '_previous_subcategory_id', None)
+    if old_subcategory_id is None or old_subcategory_id == subcategory_id:
+        return
+    # Moved: the global total is unchanged
+    old_scopes = product_count_scopes(old_subcategory_id, product_category_id(instance, old_subcategory_id, using))
+    new_scopes = product_count_scopes(subcategory_id, product_category_id(instance, subcategory_id, using))
+    adjust_counts_on_commit(old_scopes[1:], -1, using=using)
+    adjust_counts_on_commit(new_scopes[1:], 1, using=using)
+
+
+@receiver(post_delete, sender=Product, dispatch_uid='product_count_delete')
+def count_product_on_delete(sender, instance, using=None, **kwargs):
+    subcategory_id = instance.subcategory_id
+    scopes = product_count_scopes(subcategory_id, product_category_id(instance, subcategory_id, using))
+    adjust_counts_on_commit(scopes, -1, using=using)
@@ -1,3 +1,859 @@
-from django.test import TestCase
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import cache_backends, db
+from .cdn_purge import LocalPurgeClient, process_purge_queue
+from .cache_utils import (
+    adaptive_timeout, clear_product_cache_by_slug, clear_subcategory_cache_by_slug, flush_pending_invalidations,
+    get_or_set_cache, invalidate_tags, make_tag, record_writes, slug_tag,
+)
+from .middleware import QueryBudgetExceeded
+from .models import (
+    Blog, Category, HeroBanner, Product, PurgeRequest, SpecificationRow, SpecificationTable, Subcategory,
+)
+from .views import ProductViewSet
+
+
+# Query counts are pinned for a cold cache, so a change that adds a query
+# per product (a missing select_related / prefetch_related) or per request
+# fails here. The lazy load guard and the query budgets are strict too.
+@override_settings(
+    EAGER_LOADING_GUARD='raise',
+    QUERY_BUDGET_ENABLED=True,
+    QUERY_BUDGET_MODE='raise',
+    CACHE_STATS_ENABLED=False,
+    CACHE_WARMER={'ON_STARTUP': False, 'AFTER_BULK_INVALIDATION': False},
+)
+class PublicEndpointQueryCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for category_index, category_type in enumerate(['fire_safety', 'ict', 'solar']):
+            category = Category.objects.create(name=f'Category {category_index}', type=category_type)
+            for subcategory_index in range(3):
+                subcategory = Subcategory.objects.create(
+                    category=category, name=f'Subcategory {category_index}-{subcategory_index}',
+                )
+                # One subcategory spans several pages
+                product_count = 45 if (category_index, subcategory_index) == (0, 0) else 5
+                for product_index in range(product_count):
+                    product = Product.objects.create(
+                        subcategory=subcategory,
+                        name=f'Product {category_index}-{subcategory_index}-{product_index}',
+                        price='100.00',
+                        is_popular=product_index % 4 == 0,
+                        stock=product_index,
+                    )
+                    for table_index in range(2):
+                        table = SpecificationTable.objects.create(product=product, title=f'Table {table_index}')
+                        SpecificationRow.objects.bulk_create(
+                            SpecificationRow(table=table, key=f'Key {row}', value=f'Value {row}') for row in range(3)
+                        )
+
+        for index in range(6):
+            Blog.objects.create(
+                title=f'Blog {index}', excerpt='Excerpt', content='Content', is_published=index < 5,
+            )
+
+        HeroBanner.objects.create(
+            campaign_name='Poster', display_mode=HeroBanner.POSTER, poster_image='posters/poster', is_active=True,
+        )
+        HeroBanner.objects.create(
+            campaign_name='Standard', display_mode=HeroBanner.STANDARD, title='Title', image_1='standard/image',
+            is_active=True,
+        )
+
+        cls.product = Product.objects.get(name='Product 0-0-0')
+        cls.subcategory = cls.product.subcategory
+        cls.blog = Blog.objects.filter(is_published=True).first()
+
+    def setUp(self):
+        cache.clear()
+
+    def assertQueries(self, url, cold, warm=0):
+        """GET url twice: `cold` queries on an empty cache, then `warm`."""
+        with self.assertNumQueries(cold):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        with self.assertNumQueries(warm):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response
+
+    # ===============================
+    # Products
+    # ===============================
+
+    def test_product_list(self):
+        response = self.assertQueries('/api/products/', 5)
+        self.assertEqual(len(response.json()['results']), 40)
+
+    def test_product_list_later_page(self):
+        self.assertQueries('/api/products/?page=2', 5)
+
+    def test_subcategory_products(self):
+        response = self.assertQueries(f'/api/subcategories/{self.subcategory.slug}/products/', 6)
+        self.assertEqual(len(response.json()['results']), 40)
+
+    def test_subcategory_later_page_reuses_count(self):
+        path = f'/api/subcategories/{self.subcategory.slug}/products/'
+        self.client.get(path)
+        # No COUNT(*): the total cached by page 1 is reused
+        response = self.assertQueries(f'{path}?page=2', 5)
+        self.assertEqual(response.json()['count'], 45)
+
+    def test_subcategory_products_cursor_pages(self):
+        url = f'/api/subcategories/{self.subcategory.slug}/products/?pagination=cursor&page_size=20'
+        ids = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            # Keyset pages never count, however deep
+            self.assertFalse([query for query in queries if 'COUNT(*)' in query['sql']])
+            self.assertNotIn('count', response.json())
+            ids += [product['id'] for product in response.json()['results']]
+            url = response.json()['next']
+        self.assertEqual(ids, sorted(set(ids), reverse=True))
+        self.assertEqual(len(ids), 45)
+
+    def test_product_list_cursor_page(self):
+        self.assertQueries('/api/products/?pagination=cursor', 4)
+
+    def test_product_detail(self):
+        self.assertQueries(f'/api/products/{self.product.slug}/', 4)
+
+    def test_related_products(self):
+        response = self.assertQueries(f'/api/products/{self.product.slug}/related/', 6)
+        self.assertEqual(len(response.json()), 8)
+
+    def test_popular_products(self):
+        self.assertQueries('/api/products/popular/', 3)
+
+    # ===============================
+    # Catalog tree, blogs, banners
+    # ===============================
+
+    def test_categories(self):
+        response = self.assertQueries('/api/categories/', 4)
+        self.assertEqual(len(response.json()), 3)
+
+    def test_subcategories(self):
+        self.assertQueries('/api/subcategories/', 2)
+
+    def test_blogs(self):
+        response = self.assertQueries('/api/blogs/', 2)
+        self.assertEqual(len(response.json()), 5)
+
+    def test_blog_detail(self):
+        self.assertQueries(f'/api/blogs/{self.blog.slug}/', 2)
+
+    def test_hero_banners(self):
+        response = self.assertQueries('/api/hero-banners/', 2)
+        self.assertEqual(len(response.json()), 2)
+
+    # ===============================
+    # Query budgets
+    # ===============================
+
+    def test_response_reports_query_count(self):
+        response = self.client.get('/api/categories/')
+        self.assertEqual(response['X-Query-Count'], '4')
+        self.assertIn('X-DB-Time-ms', response)
+
+    @override_settings(QUERY_BUDGETS={'category-list': 3})
+    def test_over_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/api/categories/')
+
+    @override_settings(QUERY_BUDGETS={'category-list': 3}, QUERY_BUDGET_MODE='log')
+    def test_over_budget_logs(self):
+        with self.assertLogs('Systems.middleware', 'WARNING') as logs:
+            response = self.client.get('/api/categories/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('budget 3', logs.output[0])
+
+
+# Writes purge every cached response that shows the written object, and
+# cached responses never cross permission boundaries.
+@override_settings(
+    CACHE_STATS_ENABLED=False,
+    CACHE_WARMER={'ON_STARTUP': False, 'AFTER_BULK_INVALIDATION': False},
+)
+class CacheInvalidationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Detectors', type='fire_safety')
+        cls.subcategory = Subcategory.objects.create(category=cls.category, name='Smoke')
+        cls.product = Product.objects.create(
+            subcategory=cls.subcategory, name='Optical Detector', price='100.00', is_popular=True,
+        )
+        cls.staff = User.objects.create_user('staff', password='password', is_staff=True)
+        cls.user = User.objects.create_user('customer', password='password')
+
+    def setUp(self):
+        # Drop the tags queued by setUpTestData, whose transaction never commits
+        flush_pending_invalidations()
+        cache.clear()
+
+    def get_product(self, url, **headers):
+        """First product of a list, popular or detail response."""
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200, url)
+        data = response.json()
+        if isinstance(data, dict) and 'results' in data:
+            data = data['results']
+        return data[0] if isinstance(data, list) else data
+
+    def save(self, instance, **fields):
+        for name, value in fields.items():
+            setattr(instance, name, value)
+        # Invalidation runs on commit, which TestCase never reaches
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+
+    def bearer(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+
+    # ===============================
+    # Purges on write
+    # ===============================
+
+    def test_category_rename_purges_product_pages(self):
+        urls = ['/api/products/', f'/api/subcategories/{self.subcategory.slug}/products/',
+                '/api/products/popular/', f'/api/products/{self.product.slug}/']
+        for url in urls:
+            self.get_product(url)
+
+        self.save(self.category, name='Detection')
+
+        for url in urls:
+            self.assertEqual(self.get_product(url)['category']['name'], 'Detection', url)
+
+    def test_subcategory_rename_purges_product_pages(self):
+        urls = ['/api/products/', '/api/products/popular/', f'/api/products/{self.product.slug}/']
+        for url in urls:
+            self.get_product(url)
+
+        self.save(self.subcategory, name='Heat')
+
+        for url in urls:
+            self.assertEqual(self.get_product(url)['subcategory_detail']['name'], 'Heat', url)
+
+    def test_product_update_purges_product_pages(self):
+        urls = ['/api/products/', '/api/products/popular/', f'/api/products/{self.product.slug}/']
+        for url in urls:
+            self.get_product(url)
+
+        self.save(self.product, stock=7)
+
+        for url in urls:
+            self.assertEqual(self.get_product(url)['stock'], 7, url)
+
+    def test_manual_clear_by_slug(self):
+        # update() sends no signals: only the manual clears purge the cached pages
+        subcategory_url = f'/api/subcategories/{self.subcategory.slug}/products/'
+        self.get_product(subcategory_url)
+        Product.objects.filter(pk=self.product.pk).update(stock=7)
+        self.assertEqual(self.get_product(subcategory_url)['stock'], 0)
+        clear_subcategory_cache_by_slug(self.subcategory.slug)
+        self.assertEqual(self.get_product(subcategory_url)['stock'], 7)
+
+        product_url = f'/api/products/{self.product.slug}/'
+        self.get_product(product_url)
+        Product.objects.filter(pk=self.product.pk).update(stock=9)
+        self.assertEqual(self.get_product(product_url)['stock'], 7)
+        clear_product_cache_by_slug(self.product.slug)
+        self.assertEqual(self.get_product(product_url)['stock'], 9)
+
+    def test_unknown_slug_found_once_created(self):
+        url = '/api/products/beam-detector/'
+        self.assertEqual(self.client.get(url).status_code, 404)
+        # Remembered as missing
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(subcategory=self.subcategory, name='Beam Detector', slug='beam-detector')
+
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_unknown_slug_generation_expires(self):
+        self.assertEqual(self.client.get('/api/products/beam-detector/').status_code, 404)
+        key = cache.make_key(f"ns:tag:{slug_tag(Product, 'beam-detector')}")
+        # Kept no longer than the negative cache entry it stamps
+        self.assertLessEqual(caches['default']._expire_info[key], time.time() + settings.CACHE_NEGATIVE_TIMEOUT)
+
+    # ===============================
+    # Writes during a rebuild
+    # ===============================
+
+    def test_write_during_rebuild_is_not_cached(self):
+        tag = make_tag('product', self.product.pk)
+        builds = []
+
+        def build():
+            builds.append(len(builds) + 1)
+            if len(builds) == 1:
+                # Commits after the value was read, before it is stored
+                invalidate_tags(tag)
+            return builds[-1]
+
+        self.assertEqual(get_or_set_cache('test:rebuild', build, tags=[tag]), 1)
+        self.assertEqual(get_or_set_cache('test:rebuild', build, tags=[tag]), 2)
+        self.assertEqual(get_or_set_cache('test:rebuild', build, tags=[tag]), 2)
+
+    def test_write_during_page_render_is_not_cached(self):
+        url = f'/api/products/{self.product.slug}/'
+        get_object = ProductViewSet.get_object
+
+        def get_object_then_write(view):
+            product = get_object(view)
+            self.save(Product.objects.get(pk=product.pk), stock=7)
+            return product
+
+        with mock.patch.object(ProductViewSet, 'get_object', get_object_then_write):
+            self.assertEqual(self.get_product(url)['stock'], 0)
+        self.assertEqual(self.get_product(url)['stock'], 7)
+
+    # ===============================
+    # Stale-while-revalidate
+    # ===============================
+
+    # Without the page cache in front, so requests reach the payload cache
+    @override_settings(MIDDLEWARE=[name for name in settings.MIDDLEWARE if 'CacheMiddleware' not in name])
+    def test_stale_subcategory_page_served_while_refreshed(self):
+        url = f'/api/subcategories/{self.subcategory.slug}/products/'
+        self.get_product(url)
+        # Only the conditional GET's version lookup
+        with self.assertNumQueries(1):
+            self.get_product(url)
+
+        later = time.time() + 60 * 15 + 1
+        with mock.patch('Systems.cache_utils.time', wraps=time) as clock, \
+                mock.patch('Systems.cache_utils.schedule_refresh') as schedule_refresh:
+            clock.time.side_effect = lambda: later
+            with self.assertNumQueries(1):
+                self.assertEqual(self.get_product(url)['name'], 'Optical Detector')
+        schedule_refresh.assert_called_once()
+
+    # ===============================
+    # Auth variants
+    # ===============================
+
+    def test_staff_response_not_served_to_other_users(self):
+        url = f'/api/products/?subcategory={self.subcategory.pk}'
+        self.assertEqual(self.client.get(url, **self.bearer(self.staff)).status_code, 200)
+        self.assertEqual(self.client.get(url, **self.bearer(self.staff)).status_code, 200)
+
+        self.assertEqual(self.client.get(url, **self.bearer(self.user)).status_code, 403)
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_inactive_user_token_bypasses_cache(self):
+        self.product.price_visibility = Product.LOGIN_REQUIRED
+        self.save(self.product)
+        headers = self.bearer(self.user)
+        self.assertEqual(self.get_product('/api/products/', **headers)['price'], 100.0)
+
+        self.save(self.user, is_active=False)
+
+        self.assertEqual(self.client.get('/api/products/', **headers).status_code, 401)
+
+
+# Page cache entries are budgeted per page group: list pages can only push
+# out other list pages.
+@override_settings(
+    CACHE_STATS_ENABLED=False,
+    CACHE_WARMER={'ON_STARTUP': False, 'AFTER_BULK_INVALIDATION': False},
+    CACHES={'default': {
+        'BACKEND': 'Systems.cache_backends.SizeAwareLRUCache',
+        'LOCATION': 'page-quota-tests',
+        'OPTIONS': {
+            'MAX_BYTES': 1024 * 1024,
+            'QUOTAS': {
+                'list_pages': {'groups': ['list_pages', 'cache_page', 'cache_header'], 'max_bytes': 16 * 1024},
+                'detail_pages': {'groups': ['detail_pages'], 'max_bytes': 16 * 1024},
+            },
+        },
+    }},
+)
+class PageCacheQuotaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Detectors', type='fire_safety')
+        subcategory = Subcategory.objects.create(category=category, name='Smoke')
+        for index in range(30):
+            Product.objects.create(subcategory=subcategory, name=f'Detector {index}', price='100.00')
+
+    def setUp(self):
+        flush_pending_invalidations()
+        cache.clear()
+
+    def test_list_pages_do_not_evict_detail_pages(self):
+        detail = f'/api/products/{Product.objects.first().slug}/'
+        self.client.get(detail)
+        for page in range(1, 31):
+            self.client.get('/api/products/', {'page_size': 1, 'page': page})
+
+        # The first list pages were evicted, the detail page is still cached
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(detail).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/products/', {'page_size': 1, 'page': 1})
+        self.assertTrue(queries)
+
+
+# Large pickles are stored compressed and read back unchanged.
+@override_settings(
+    CACHE_STATS_ENABLED=False,
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'zlib': {
+            'BACKEND': 'Systems.cache_backends.SizeAwareLRUCache',
+            'LOCATION': 'compressed-zlib',
+            'OPTIONS': {'MAX_BYTES': 1024 * 1024, 'COMPRESSOR': 'zlib', 'COMPRESS_MIN_SIZE': 1024},
+        },
+        'lzma': {
+            'BACKEND': 'Systems.cache_backends.SizeAwareLRUCache',
+            'LOCATION': 'compressed-lzma',
+            'OPTIONS': {'MAX_BYTES': 1024 * 1024, 'COMPRESSOR': 'lzma', 'COMPRESS_MIN_SIZE': 1024},
+        },
+    },
+)
+class CacheCompressionTests(SimpleTestCase):
+
+    page = {'results': [{'name': f'Detector {index}', 'price': '100.00'} for index in range(200)]}
+
+    def test_large_values_stored_compressed(self):
+        for alias in ('zlib', 'lzma'):
+            with self.subTest(alias):
+                backend = caches[alias]
+                backend.clear()
+                backend.set('page', self.page)
+
+                self.assertEqual(backend.get('page'), self.page)
+                # Budgets count the compressed size
+                self.assertLess(backend.usage()['bytes'], len(pickle.dumps(self.page)) // 4)
+
+    def test_small_values_stored_as_is(self):
+        backend = caches['zlib']
+        backend.clear()
+        backend.set('count', 5)
+
+        self.assertEqual(backend.usage()['bytes'], len(pickle.dumps(5, pickle.HIGHEST_PROTOCOL)))
+        self.assertEqual(backend.incr('count'), 6)
+
+
+# TTLs follow how often the tagged entities are written.
+@override_settings(
+    CACHE_STATS_ENABLED=False,
+    CACHE_ADAPTIVE_TTL={'ENABLED': True, 'MIN': 60, 'MAX': 6 * 3600, 'FACTOR': 0.5, 'SMOOTHING': 0.5},
+)
+class AdaptiveTTLTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def write(self, tag, at):
+        with mock.patch('time.time', return_value=at):
+            record_writes(tag)
+
+    def timeout(self, tags, at):
+        with mock.patch('time.time', return_value=at):
+            return adaptive_timeout(tags, 900)
+
+    def test_unwritten_tags_keep_default(self):
+        self.assertEqual(self.timeout(['product:1'], 1000), 900)
+
+    def test_timeout_follows_write_rate(self):
+        for at in (0, 600, 1200):
+            self.write('product:1', at)
+        for at in (0, 86400):
+            self.write('category:2', at)
+
+        self.assertEqual(self.timeout(['product:1'], 1200), 300)
+        self.assertEqual(self.timeout(['category:2'], 86400), 6 * 3600)
+        # The most frequently written tag decides
+        self.assertEqual(self.timeout(['category:2', 'product:1'], 1200), 300)
+        # Gone quiet: the time since the last write takes over
+        self.assertEqual(self.timeout(['product:1'], 1200 + 3000), 1500)
+
+    def test_busy_entities_keep_minimum(self):
+        for at in range(0, 50, 5):
+            self.write('product:1', at)
+
+        self.assertEqual(self.timeout(['product:1'], 45), 60)
+
+
+# Concurrent misses on a key run one rebuild; other keys are not held up.
+@override_settings(CACHE_STATS_ENABLED=False)
+class CacheRebuildTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_rebuild_once(self):
+        started, release = threading.Event(), threading.Event()
+        builds, results = [], []
+
+        def build():
+            builds.append(1)
+            started.set()
+            release.wait(5)
+            return 'value'
+
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_set_cache('test:single-flight', build)))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(started.wait(5))
+
+        # A slow rebuild doesn't block an unrelated key
+        self.assertEqual(get_or_set_cache('test:other', lambda: 'other'), 'other')
+
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, ['value'] * 3)
+
+
+# Two workers: each its own L1, one file-based L2.
+class TwoTierCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        location = self.enterContext(tempfile.TemporaryDirectory())
+        two_tier = {'BACKEND': 'Systems.cache_backends.TwoTierCache', 'OPTIONS': {'L2': 'shared', 'SYNC_INTERVAL': 0}}
+        self.enterContext(override_settings(
+            CACHE_STATS_ENABLED=False,
+            CACHES={
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'worker_a': {**two_tier, 'OPTIONS': {**two_tier['OPTIONS'], 'L1': 'l1_a'}},
+                'worker_b': {**two_tier, 'OPTIONS': {**two_tier['OPTIONS'], 'L1': 'l1_b'}},
+                'worker_c': {**two_tier, 'OPTIONS': {**two_tier['OPTIONS'], 'L1': 'l1_c', 'SYNC_INTERVAL': 60}},
+                'l1_a': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'two-tier-a'},
+                'l1_b': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'two-tier-b'},
+                'l1_c': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'two-tier-c'},
+                'shared': {
+                    'BACKEND': 'Systems.cache_backends.InstrumentedFileBasedCache',
+                    'LOCATION': location,
+                    'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 1},
+                },
+            },
+        ))
+        self.worker_a, self.worker_b = caches['worker_a'], caches['worker_b']
+        for alias in ('l1_a', 'l1_b', 'l1_c'):
+            caches[alias].clear()
+        # Epochs seen by the previous test's workers
+        self.enterContext(mock.patch.dict(cache_backends._sync_states, clear=True))
+
+    def test_delete_reaches_other_worker(self):
+        self.worker_a.set('page', 'old')
+        self.assertEqual(self.worker_b.get('page'), 'old')
+
+        self.worker_a.delete('page')
+
+        self.assertIsNone(self.worker_b.get('page'))
+
+    def test_count_incr_keeps_other_l1(self):
+        count_key = 'catalog.v1|products:count:all'
+        self.worker_a.set(count_key, 5)
+        self.worker_b.set('page', 'cached')
+        self.assertEqual(self.worker_b.get('page'), 'cached')
+
+        self.assertEqual(self.worker_a.incr(count_key), 6)
+
+        self.assertEqual(self.worker_b.get(count_key), 6)
+        # No epoch bump: worker B's L1 survives the sync
+        self.worker_b.get('other')
+        self.assertEqual(caches['l1_b'].get('page'), 'cached')
+
+    def test_generations_read_from_l1(self):
+        worker_c = caches['worker_c']
+        worker_c.set('ns:catalog', 1, None)
+        self.worker_b.set('page', 'cached')
+        self.assertEqual(self.worker_b.get('page'), 'cached')
+
+        self.assertEqual(self.worker_b.incr('ns:catalog'), 2)
+
+        # Worker C reads its L1 copy until SYNC_INTERVAL runs out
+        self.assertEqual(worker_c.get('ns:catalog'), 1)
+        self.assertEqual(worker_c.incr('ns:catalog'), 3)
+        self.assertEqual(worker_c.get('ns:catalog'), 3)
+        # Bumping a generation doesn't drop the other workers' L1
+        self.worker_b.get('other')
+        self.assertEqual(caches['l1_b'].get('page'), 'cached')
+
+    def test_generations_survive_culling(self):
+        self.worker_a.set('ns:catalog', 1, None)
+        for index in range(30):
+            self.worker_a.set(f'page:{index}', index)
+
+        self.assertLess(caches['shared'].usage()['entries'], 30)
+        self.assertEqual(caches['shared'].get('ns:catalog'), 1)
+        # incr() keeps "never expires"
+        caches['shared'].incr('ns:catalog')
+        with open(caches['shared']._key_to_file('ns:catalog'), 'rb') as f:
+            self.assertIsNone(pickle.load(f))
+
+
+# Equivalent URLs share one cache entry.
+@override_settings(
+    CACHE_STATS_ENABLED=False,
+    CACHE_WARMER={'ON_STARTUP': False, 'AFTER_BULK_INVALIDATION': False},
+)
+class CanonicalQueryStringTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Detectors', type='fire_safety')
+        subcategory = Subcategory.objects.create(category=category, name='Smoke')
+        Product.objects.create(subcategory=subcategory, name='Optical Detector', price='100.00')
+
+    def setUp(self):
+        flush_pending_invalidations()
+        cache.clear()
+
+    def test_equivalent_query_strings_share_cache(self):
+        self.client.get('/api/products/')
+        # Tracking parameters, unread parameters, explicit defaults and order don't matter
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/?utm_source=mail&page_size=40&sort=name&page=1')
+        self.assertEqual(response.status_code, 200)
+
+
+# Conditional GETs are answered with 304 until the resource changes.
+@override_settings(
+    CACHE_STATS_ENABLED=False,
+    CACHE_WARMER={'ON_STARTUP': False, 'AFTER_BULK_INVALIDATION': False},
+)
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Detectors', type='fire_safety')
+        cls.subcategory = Subcategory.objects.create(category=category, name='Smoke')
+        cls.product = Product.objects.create(subcategory=cls.subcategory, name='Optical Detector', price='100.00')
+
+    def setUp(self):
+        flush_pending_invalidations()
+        cache.clear()
+
+    def test_matching_etag_gets_304(self):
+        for url in (f'/api/products/{self.product.slug}/', '/api/products/', '/api/categories/'):
+            with self.subTest(url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+
+                # From the page cache, and before the view runs on a cold cache
+                for clear in (False, True):
+                    if clear:
+                        cache.clear()
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 304)
+                    self.assertEqual(response.content, b'')
+
+    def test_etag_changes_on_write(self):
+        url = f'/api/products/{self.product.slug}/'
+        etag = self.client.get(url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = '120.00'
+            self.product.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # A deletion moves no timestamp, the row count changes the ETag
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(subcategory=self.subcategory, name='Heat Detector', price='80.00')
+        list_etag = self.client.get('/api/products/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(name='Heat Detector').delete()
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_differs_per_auth_variant(self):
+        user = User.objects.create_user('customer', password='password')
+        url = f'/api/products/{self.product.slug}/'
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=etag, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}',
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+# Anonymous responses may sit in shared caches, tagged for purging;
+# authenticated ones stay in the browser.
+@override_settings(
+    CACHE_STATS_ENABLED=False,
+    CACHE_WARMER={'ON_STARTUP': False, 'AFTER_BULK_INVALIDATION': False},
+)
+class CacheControlPolicyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Detectors', type='fire_safety')
+        subcategory = Subcategory.objects.create(category=category, name='Smoke')
+        cls.product = Product.objects.create(subcategory=subcategory, name='Optical Detector', price='100.00')
+
+    def setUp(self):
+        flush_pending_invalidations()
+        cache.clear()
+
+    def directives(self, response):
+        return {directive.strip() for directive in response['Cache-Control'].split(',')}
+
+    def test_anonymous_responses_are_public(self):
+        url = f'/api/products/{self.product.slug}/'
+        # Rendered, then from the page cache
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertEqual(
+                self.directives(response),
+                {'public', 'max-age=60', 's-maxage=600', 'stale-while-revalidate=300', 'stale-if-error=86400'},
+            )
+            self.assertIn('Authorization', response['Vary'])
+            keys = response['Surrogate-Key'].split(' ')
+            self.assertIn(make_tag('product', self.product.pk), keys)
+            self.assertEqual(response['Cache-Tag'].split(','), keys)
+
+    def test_authenticated_responses_are_private(self):
+        user = User.objects.create_user('customer', password='password')
+        response = self.client.get(
+            f'/api/products/{self.product.slug}/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}',
+        )
+
+        self.assertEqual(self.directives(response), {'private', 'max-age=0'})
+        self.assertFalse(response.has_header('Surrogate-Key'))
+
+    def test_unlisted_routes_keep_page_cache_headers(self):
+        with self.settings(CACHE_CONTROL_POLICIES={}):
+            response = self.client.get(f'/api/products/{self.product.slug}/')
+        self.assertNotIn('public', self.directives(response))
+        self.assertFalse(response.has_header('Surrogate-Key'))
+
+
+class FailingPurgeClient(LocalPurgeClient):
+
+    def purge(self, keys):
+        raise ConnectionError('CDN unreachable')
+
+
+# Invalidations queue surrogate keys; failed purges retry with backoff.
+@override_settings(
+    CACHE_STATS_ENABLED=False,
+    CDN_PURGE={'ENABLED': True, 'MAX_ATTEMPTS': 3, 'RETRY_DELAY': 5},
+)
+class CDNPurgeQueueTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidation_purges_surrogate_keys(self):
+        client = LocalPurgeClient()
+        invalidate_tags('product:1', 'category:2')
+
+        self.assertEqual(process_purge_queue(client), 2)
+
+        self.assertEqual(list(client.purged), [['category:2', 'product:1']])
+        self.assertFalse(PurgeRequest.objects.exists())
+        self.assertEqual(process_purge_queue(client), 0)
+
+    def test_failed_purge_backs_off(self):
+        invalidate_tags('product:1')
+        client = FailingPurgeClient()
+
+        delays = []
+        for attempt in range(1, 4):
+            with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=attempt)):
+                self.assertEqual(process_purge_queue(client), 0)
+                request = PurgeRequest.objects.get()
+                delays.append((request.next_attempt_at - timezone.now()).total_seconds())
+            self.assertEqual(request.attempts, attempt)
+            self.assertEqual(request.last_error, 'CDN unreachable')
+        self.assertEqual(delays[:2], [5, 10])
+        # Given up after MAX_ATTEMPTS: left for inspection, out of the way
+        self.assertGreater(delays[2], 365 * 24 * 3600)
+
+        # Queued again by a later invalidation, it starts over
+        invalidate_tags('product:1')
+        self.assertEqual(PurgeRequest.objects.get().attempts, 0)
+
+    def test_local_client_keeps_recent_purges(self):
+        client = LocalPurgeClient(MAX_RECORDED=2)
+        for key in ('a', 'b', 'c'):
+            client.purge([key])
+        self.assertEqual(list(client.purged), [['b'], ['c']])
+
+
+class ClearCacheCommandTests(SimpleTestCase):
+
+    def test_in_process_cache_refused(self):
+        # The default cache lives in each worker: clearing it here reaches none of them
+        for option in ('--all', '--products', '--warm'):
+            with self.assertRaisesMessage(CommandError, 'CACHE_BACKEND=two_tier'):
+                call_command('clear_cache', option)
+
+
+# Pragmas are checked before being interpolated, and applied to new SQLite
+# connections only (a scratch database, never db.sqlite3).
+class SQLitePragmaTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        # timeout=0: no driver-level busy_timeout, so the pragma's is the one read back
+        self.connection = sqlite3.connect(os.path.join(directory, 'scratch.sqlite3'), timeout=0)
+        self.addCleanup(self.connection.close)
+
+    def pragma(self, name):
+        return self.connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def test_apply_pragmas(self):
+        applied = db.apply_pragmas(
+            self.connection, {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000},
+        )
+
+        self.assertEqual(applied['journal_mode'], 'wal')
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+
+    def test_invalid_pragmas_refused(self):
+        for pragmas in (
+            {'journal_mode': 'WAL; DROP TABLE auth_user'},
+            {'busy_timeout': '5000; DROP TABLE auth_user'},
+            {'busy_timeout; DROP TABLE auth_user': 5000},
+        ):
+            with self.subTest(pragmas), self.assertRaises(ValueError):
+                db.pragma_statements(pragmas)
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234})
+    def test_only_sqlite_connections_configured(self):
+        for vendor, busy_timeout in (('postgresql', 0), ('sqlite', 1234)):
+            with self.subTest(vendor):
+                wrapper = mock.Mock(vendor=vendor, connection=self.connection, alias='default')
+                db.configure_sqlite_connection(sender=None, connection=wrapper)
+                self.assertEqual(self.pragma('busy_timeout'), busy_timeout)
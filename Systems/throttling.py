@@ -0,0 +1,25 @@
+"""
+Rate throttles that let the cache warmer through.
+
+The warmer (see cache_warmer) renders dozens of endpoints from one address
+within seconds. Counting those against the anonymous rate would get its
+requests rejected and use up the budget of visitors sharing the address.
+Only requests built in-process can carry the flag; clients cannot set it.
+"""
+
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+
+
+class CacheWarmerExemptMixin:
+    def allow_request(self, request, view):
+        if getattr(request, 'cache_warming', False):
+            return True
+        return super().allow_request(request, view)
+
+
+class WarmerExemptAnonRateThrottle(CacheWarmerExemptMixin, AnonRateThrottle):
+    pass
+
+
+class WarmerExemptUserRateThrottle(CacheWarmerExemptMixin, UserRateThrottle):
+    pass
@@ -4,8 +4,8 @@ from .views import (
     RegisterView, CustomTokenObtainPairView, UserProfileView,
     me_view, register_view, login_view, logout_view, current_user_view,
     CategoryAdminDetailView, SubcategoryAdminDetailView, ProductAdminDetailView,
-    ProductDetailView, ProductsBySubcategoryView, ProductRelatedView,
-    CustomGoogleOAuth2CallbackView, popular_products, hero_banners, HeroBannerViewSet # ✅ Added hero_banners
+    CustomGoogleOAuth2CallbackView, popular_products, hero_banners, HeroBannerViewSet, # ✅ Added hero_banners
+    cache_stats,
 )
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenRefreshView
@@ -42,6 +42,9 @@ urlpatterns = [
     # ✅ Hero Banners & Popular Products
     path('hero-banners/', hero_banners, name='hero-banners'),
     path('products/popular/', popular_products, name='popular-products'),
+
+    # Cache usage counters (staff only)
+    path('cache/stats/', cache_stats, name='cache-stats'),
     
     # -------------------------
     # Google OAuth override
@@ -82,24 +85,6 @@ urlpatterns = [
     # -------------------------
     # Product endpoints
     # -------------------------
-    path(
-        'subcategories/<slug:subcategory_slug>/products/',
-        ProductsBySubcategoryView.as_view(),
-        name='products-by-subcategory'
-    ),
-
-    path(
-        'products/<slug:product_slug>/',
-        ProductDetailView.as_view(),
-        name='product-detail-contract'
-    ),
-
-    path(
-        'products/<slug:product_slug>/related/',
-        ProductRelatedView.as_view(),
-        name='product-related'
-    ),
-
     path(
         'subcategories/<slug:subcategory_slug>/products/create/',
         ProductViewSet.as_view({'post': 'create'}),
@@ -3,10 +3,9 @@ from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
 from django.utils.decorators import method_decorator
-from django.views.decorators.vary import vary_on_headers
-from rest_framework import viewsets, status, serializers, generics, permissions
+from django.views.decorators.cache import never_cache
+from rest_framework import viewsets, status, serializers, generics
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser, AllowAny
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
@@ -15,68 +14,54 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
 from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
 from allauth.socialaccount.providers.oauth2.views import OAuth2CallbackView
+import hashlib
 import logging
-from django.core.cache import cache
 from django.conf import settings
 
 from .models import Category, Subcategory, Product, Blog, HeroBanner
+from .cache_utils import (
+    add_surrogate_keys, auth_variant, embedded_catalog_tags, get_cache_key, get_cache_stats, get_object_or_404_cached,
+    get_or_set_json, json_response, make_namespace, make_tag, namespace_response, product_tags, tag_response,
+)
+from .conditional import (
+    banner_version, blog_version, category_version, conditional, product_list_version, product_version,
+    subcategory_version,
+)
+from .middleware import canonical_query_string, tagged_cache_page
+from .pagination import CachedCountPagination
 from .serializers import (
     CategorySerializer, SubcategorySerializer, ProductSerializer,
     UserRegistrationSerializer, UserProfileSerializer, CustomTokenObtainPairSerializer, BlogSerializer, HeroBannerSerializer
 )
-from rest_framework.pagination import PageNumberPagination
 
 logger = logging.getLogger(__name__)
 
+CATALOG_NAMESPACES = [make_namespace('catalog')]
+BLOG_NAMESPACES = [make_namespace('blogs')]
+BANNER_NAMESPACES = [make_namespace('banners')]
+
+
+def subcategory_namespaces(request):
+    """Catalog namespace plus the per-subcategory one from the URL."""
+    subcategory_slug = request.resolver_match.kwargs.get('subcategory_slug')
+    return CATALOG_NAMESPACES + [make_namespace('subcategory', subcategory_slug)]
+
 # ===============================
 # Cache Utility Functions
 # ===============================
 
-def invalidate_product_caches(product=None, subcategory=None):
+def get_cached_response(request, cache_key, data_func, timeout=900, tags=()):
     """
-    Invalidate all product-related caches when data changes.
+    Serve data_func's result from a cached, pre-rendered JSON body.
+    Concurrent misses on the same key are coalesced into one rebuild.
     """
-    cache_keys_to_clear = [
-        settings.CACHE_KEYS.get('all_products', 'all_products'),
-        settings.CACHE_KEYS.get('all_categories', 'all_categories'),
-        settings.CACHE_KEYS.get('all_subcategories', 'all_subcategories'),
-        'popular_products_list',  # Popular products cache
-    ]
-    
-    if product:
-        product_detail_key = settings.CACHE_KEYS.get('product_detail', 'product_detail_{}')
-        related_key = settings.CACHE_KEYS.get('related_products', 'related_products_{}')
-        subcat_key = settings.CACHE_KEYS.get('products_by_subcategory', 'products_by_subcategory_{}')
-        
-        cache_keys_to_clear.extend([
-            product_detail_key.format(product.slug) if '{}' in product_detail_key else f'product_detail_{product.slug}',
-            related_key.format(product.slug) if '{}' in related_key else f'related_products_{product.slug}',
-            subcat_key.format(product.subcategory.slug) if '{}' in subcat_key else f'products_by_subcategory_{product.subcategory.slug}',
-        ])
-    
-    if subcategory:
-        subcat_key = settings.CACHE_KEYS.get('products_by_subcategory', 'products_by_subcategory_{}')
-        cache_keys_to_clear.append(
-            subcat_key.format(subcategory.slug) if '{}' in subcat_key else f'products_by_subcategory_{subcategory.slug}'
-        )
-    
-    cache.delete_many(cache_keys_to_clear)
-    logger.info(f"Cleared {len(cache_keys_to_clear)} cache keys")
+    payload = get_or_set_json(cache_key, data_func, timeout, tags)
+    return json_response(request, payload)
 
 
-def get_cached_queryset(cache_key, queryset_func, timeout=900):
-    """
-    Generic function to cache querysets.
-    """
-    cached_data = cache.get(cache_key)
-    if cached_data is not None:
-        logger.debug(f"Cache hit for key: {cache_key}")
-        return cached_data
-    
-    data = queryset_func()
-    cache.set(cache_key, data, timeout)
-    logger.debug(f"Cache miss - stored key: {cache_key}")
-    return data
+def request_digest(request):
+    """Short stable digest of the request path and its canonical query string."""
+    return hashlib.md5(f'{request.path}?{canonical_query_string(request)}'.encode()).hexdigest()
 
 
 # -------------------------
@@ -133,6 +118,7 @@ class CustomTokenObtainPairView(TokenObtainPairView):
         })
 
 
+@method_decorator(never_cache, name='dispatch')
 class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserProfileSerializer
     permission_classes = [IsAuthenticated]
@@ -167,32 +153,30 @@ class CustomGoogleOAuth2CallbackView(OAuth2CallbackView):
 @permission_classes([AllowAny])
 def popular_products(request):
     """Returns up to 10 popular products with caching (regardless of stock status)"""
-    cache_key = 'popular_products_list'
-    
-    # Try to get from cache
-    cached_data = cache.get(cache_key)
-    if cached_data is not None:
-        logger.debug(f"Cache hit for popular products")
-        return Response(cached_data)
-    
-    # Fetch from database - NO STATUS FILTER
-    try:
-        products = Product.objects.filter(
+    # Prices are masked for anonymous users: one entry per auth variant
+    cache_key = get_cache_key('popular_products_list:{}', auth_variant(request), namespaces=CATALOG_NAMESPACES)
+
+    def fetch_popular():
+        # Fetch from database - NO STATUS FILTER
+        products = ProductSerializer.setup_eager_loading(Product.objects.filter(
             is_popular=True
             # ✅ Removed status=Product.IN_STOCK filter
-        ).select_related('subcategory', 'subcategory__category').order_by('-id')[:10]
+        )).order_by('-id')[:10]
         
         serializer = ProductSerializer(
             products, 
             many=True, 
             context={'request': request}
         )
-        
+        return serializer.data
+
+    def popular_tags(data):
+        return [make_tag('popular')] + [make_tag('product', item['id']) for item in data] + embedded_catalog_tags(data)
+    
+    try:
         # Cache for 15 minutes
-        cache.set(cache_key, serializer.data, 60 * 15)
-        logger.debug(f"Cache miss - stored popular products")
-        
-        return Response(serializer.data)
+        response = get_cached_response(request, cache_key, fetch_popular, timeout=60 * 15, tags=popular_tags)
+        return namespace_response(response, *CATALOG_NAMESPACES)
     except Exception as e:
         logger.error(f"Error fetching popular products: {str(e)}")
         return Response(
@@ -205,45 +189,37 @@ def popular_products(request):
 # -------------------------
 
 class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all().order_by('id')
+    queryset = CategorySerializer.setup_eager_loading(Category.objects.all()).order_by('id')
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     lookup_field = 'slug'
     pagination_class = None
+    cache_query_params = ()
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
             return [AllowAny()]
         return [IsAdminUser()]
 
-    def perform_create(self, serializer):
-        obj = serializer.save()
-        invalidate_product_caches()
-        return obj
-
-    def perform_update(self, serializer):
-        obj = serializer.save()
-        invalidate_product_caches()
-        return obj
-
-    def perform_destroy(self, instance):
-        super().perform_destroy(instance)
-        invalidate_product_caches()
-
-    @method_decorator(cache_page(60 * 15))
-    @method_decorator(vary_on_headers('Authorization'))
+    @method_decorator(tagged_cache_page(60 * 15, namespaces=CATALOG_NAMESPACES))
+    @method_decorator(conditional(category_version))
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        response = super().list(request, *args, **kwargs)
+        return tag_response(response, make_tag('categories'))
 
-    @method_decorator(cache_page(60 * 15))
+    @method_decorator(tagged_cache_page(60 * 15, namespaces=CATALOG_NAMESPACES))
+    @method_decorator(conditional(category_version))
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        response = super().retrieve(request, *args, **kwargs)
+        return tag_response(response, make_tag('category', response.data.get('id')))
 
     def get_object(self):
         queryset = self.filter_queryset(self.get_queryset())
         lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
         try:
-            obj = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            obj = get_object_or_404_cached(
+                queryset, self.kwargs[lookup_url_kwarg], slug_field=self.lookup_field, namespaces=CATALOG_NAMESPACES,
+            )
             self.check_object_permissions(self.request, obj)
             return obj
         except Http404:
@@ -260,6 +236,7 @@ class SubcategoryViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     lookup_field = 'slug'
     pagination_class = None
+    cache_query_params = ()
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -278,39 +255,42 @@ class SubcategoryViewSet(viewsets.ModelViewSet):
                 category = get_object_or_404(Category, slug=category_id)
         else:
             raise serializers.ValidationError({"detail": "Category not specified."})
-        obj = serializer.save(category=category)
-        invalidate_product_caches()
-        return obj
+        return serializer.save(category=category)
 
-    def perform_update(self, serializer):
-        obj = serializer.save()
-        invalidate_product_caches()
-        return obj
-
-    def perform_destroy(self, instance):
-        super().perform_destroy(instance)
-        invalidate_product_caches()
-
-    @method_decorator(cache_page(60 * 15))
-    @method_decorator(vary_on_headers('Authorization'))
+    @method_decorator(tagged_cache_page(60 * 15, namespaces=CATALOG_NAMESPACES))
+    @method_decorator(conditional(subcategory_version))
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        response = super().list(request, *args, **kwargs)
+        return tag_response(response, make_tag('categories'))
 
-    @method_decorator(cache_page(60 * 15))
+    @method_decorator(tagged_cache_page(60 * 15, namespaces=CATALOG_NAMESPACES))
+    @method_decorator(conditional(subcategory_version))
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        response = super().retrieve(request, *args, **kwargs)
+        return tag_response(
+            response,
+            make_tag('subcategory', response.data.get('id')),
+            make_tag('category', response.data.get('category')),
+        )
 
     def get_queryset(self):
         queryset = super().get_queryset()
         category_slug = self.kwargs.get('category_slug')
         if category_slug:
-            category = get_object_or_404(Category, slug=category_slug)
+            category = get_object_or_404_cached(Category.objects.all(), category_slug, namespaces=CATALOG_NAMESPACES)
             return queryset.filter(category=category).order_by('id')
         return queryset
 
     def get_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
         try:
-            return super().get_object()
+            obj = get_object_or_404_cached(
+                queryset, self.kwargs[lookup_url_kwarg], slug_field=self.lookup_field,
+                scope=self.kwargs.get('category_slug', ''), namespaces=CATALOG_NAMESPACES,
+            )
+            self.check_object_permissions(self.request, obj)
+            return obj
         except Http404:
             raise serializers.ValidationError({"detail": "Subcategory not found."})
 
@@ -319,19 +299,21 @@ class SubcategoryViewSet(viewsets.ModelViewSet):
 # Product ViewSet
 # -------------------------
 
-class DefaultPagination(PageNumberPagination):
+class DefaultPagination(CachedCountPagination):
     page_size = 40
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all().order_by('-id')
+    queryset = ProductSerializer.setup_eager_loading(Product.objects.all()).order_by('-id')
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     parser_classes = [MultiPartParser, FormParser]
     lookup_field = 'slug'
     pagination_class = DefaultPagination
+    # Query parameters the cached responses depend on (see middleware.canonical_query_string)
+    cache_query_params = ('page', 'page_size', 'subcategory', 'pagination', 'cursor')
     
     def get_permissions(self):
         if self.request.method in ['POST', 'PUT', 'PATCH', 'DELETE']:
@@ -357,18 +339,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             validated_data['stock'] = 1
         if 'status' not in validated_data:
             validated_data['status'] = Product.IN_STOCK
-        product = serializer.save(subcategory=subcategory)
-        invalidate_product_caches(product=product, subcategory=subcategory)
-
-    def perform_update(self, serializer):
-        product = serializer.save()
-        invalidate_product_caches(product=product, subcategory=product.subcategory)
-        return product
-
-    def perform_destroy(self, instance):
-        subcategory = instance.subcategory
-        super().perform_destroy(instance)
-        invalidate_product_caches(subcategory=subcategory)
+        serializer.save(subcategory=subcategory)
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -377,26 +348,94 @@ class ProductViewSet(viewsets.ModelViewSet):
         qp_subcat = self.request.query_params.get('subcategory')
         
         if subcategory_slug:
-            subcategory = get_object_or_404(Subcategory, slug=subcategory_slug)
-            return queryset.filter(subcategory=subcategory).order_by('-id')
+            self.subcategory = get_object_or_404_cached(
+                Subcategory.objects.all(), subcategory_slug, namespaces=CATALOG_NAMESPACES,
+            )
+            return queryset.filter(subcategory=self.subcategory).order_by('-id')
         if subcategory_pk:
             if str(subcategory_pk).isdigit():
-                subcategory = get_object_or_404(Subcategory, id=subcategory_pk)
+                self.subcategory = get_object_or_404(Subcategory, id=subcategory_pk)
             else:
-                subcategory = get_object_or_404(Subcategory, slug=subcategory_pk)
-            return queryset.filter(subcategory=subcategory).order_by('-id')
+                self.subcategory = get_object_or_404(Subcategory, slug=subcategory_pk)
+            return queryset.filter(subcategory=self.subcategory).order_by('-id')
         if qp_subcat:
             if str(qp_subcat).isdigit():
                 return queryset.filter(subcategory__id=qp_subcat).order_by('-id')
             return queryset.filter(subcategory__slug=qp_subcat).order_by('-id')
         return queryset
 
-    @method_decorator(cache_page(60 * 15))
+    def get_count_scope(self):
+        # Cached total for the page-number pagination; the staff-only ?subcategory filter counts
+        subcategory = getattr(self, 'subcategory', None)
+        if subcategory is not None:
+            return ('subcategory', subcategory.pk)
+        if self.request.query_params.get('subcategory'):
+            return None
+        return ('all',)
+
+    def get_object(self):
+        # Unknown slugs (crawlers, old links) are remembered briefly
+        queryset = self.filter_queryset(self.get_queryset())
+        product = get_object_or_404_cached(
+            queryset, self.kwargs[self.lookup_field],
+            scope=self.kwargs.get('subcategory_slug') or self.request.query_params.get('subcategory', ''),
+            namespaces=CATALOG_NAMESPACES,
+        )
+        self.check_object_permissions(self.request, product)
+        return product
+
+    @method_decorator(conditional(product_list_version))
+    def list(self, request, *args, **kwargs):
+        if self.kwargs.get('subcategory_slug'):
+            return self.list_subcategory(request, *args, **kwargs)
+        # Pages are stored by the site-wide cache; tag them so product writes purge them
+        response = super().list(request, *args, **kwargs)
+        items = response.data['results'] if isinstance(response.data, dict) else response.data
+        add_surrogate_keys(response, *(make_tag('product', item['id']) for item in items))
+        # Renaming a subcategory or category purges the pages embedding its name
+        tag_response(response, *embedded_catalog_tags(items))
+        subcategory = getattr(self, 'subcategory', None)
+        if subcategory is not None:
+            tag_response(response, make_tag('subcategory', subcategory.pk), make_tag('category', subcategory.category_id))
+            namespace_response(response, make_namespace('subcategory', subcategory.slug))
+        else:
+            tag_response(response, make_tag('products'))
+        return namespace_response(response, *CATALOG_NAMESPACES)
+
+    def list_subcategory(self, request, *args, **kwargs):
+        """
+        Public product pages of a subcategory. Each rendered page is also kept
+        as a payload, served stale while it is rebuilt in the background.
+        """
+        namespaces = subcategory_namespaces(request)
+        subcat_key = settings.CACHE_KEYS.get('products_by_subcategory', 'products_by_subcategory_{}')
+        cache_key = get_cache_key(
+            subcat_key + ':{}:{}', self.kwargs['subcategory_slug'], auth_variant(request), request_digest(request),
+            namespaces=namespaces,
+        )
+
+        def fetch_page():
+            # Unknown slugs raise Http404 here, before anything is stored
+            return super(ProductViewSet, self).list(request, *args, **kwargs).data
+
+        def page_tags(data):
+            subcategory = self.subcategory
+            items = data['results'] if isinstance(data, dict) else data
+            return (
+                [make_tag('product', item['id']) for item in items] + embedded_catalog_tags(items)
+                + [make_tag('subcategory', subcategory.pk), make_tag('category', subcategory.category_id)]
+            )
+
+        response = get_cached_response(request, cache_key, fetch_page, tags=page_tags)
+        return namespace_response(response, *namespaces)
+
+    @method_decorator(tagged_cache_page(60 * 15, namespaces=CATALOG_NAMESPACES))
+    @method_decorator(conditional(product_version))
     def retrieve(self, request, *args, **kwargs):
         try:
             instance = self.get_object()
             serializer = self.get_serializer(instance)
-            return Response(serializer.data)
+            return tag_response(Response(serializer.data), *product_tags(instance))
         except Http404:
             return Response({"detail": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -406,35 +445,33 @@ class ProductViewSet(viewsets.ModelViewSet):
         return context
 
     @action(detail=False, methods=['get'])
-    @method_decorator(cache_page(60 * 15))
+    @method_decorator(tagged_cache_page(60 * 15, namespaces=CATALOG_NAMESPACES))
     def all_categories(self, request):
         """Cached list of all categories"""
-        cache_key = settings.CACHE_KEYS.get('all_categories', 'all_categories')
+        cache_key = get_cache_key(settings.CACHE_KEYS.get('all_categories', 'all_categories'), namespaces=CATALOG_NAMESPACES)
         
         def fetch_categories():
-            categories = Category.objects.all().order_by('id')
+            categories = CategorySerializer.setup_eager_loading(Category.objects.all()).order_by('id')
             serializer = CategorySerializer(categories, many=True, context={'request': request})
             return serializer.data
         
-        data = get_cached_queryset(cache_key, fetch_categories)
-        return Response(data)
+        return get_cached_response(request, cache_key, fetch_categories, tags=[make_tag('categories')])
 
     @action(detail=False, methods=['get'])
-    @method_decorator(cache_page(60 * 15))
+    @method_decorator(tagged_cache_page(60 * 15, namespaces=CATALOG_NAMESPACES))
     def all_subcategories(self, request):
         """Cached list of all subcategories"""
-        cache_key = settings.CACHE_KEYS.get('all_subcategories', 'all_subcategories')
+        cache_key = get_cache_key(settings.CACHE_KEYS.get('all_subcategories', 'all_subcategories'), namespaces=CATALOG_NAMESPACES)
         
         def fetch_subcategories():
             subcategories = Subcategory.objects.all().order_by('id')
             serializer = SubcategorySerializer(subcategories, many=True, context={'request': request})
             return serializer.data
         
-        data = get_cached_queryset(cache_key, fetch_subcategories)
-        return Response(data)
+        return get_cached_response(request, cache_key, fetch_subcategories, tags=[make_tag('categories')])
 
     @action(detail=True, methods=['get'], url_path='related', permission_classes=[AllowAny])
-    @method_decorator(cache_page(60 * 15))
+    @method_decorator(tagged_cache_page(60 * 15, namespaces=CATALOG_NAMESPACES))
     def related(self, request, slug=None):
         """
         Returns cached related products from the same subcategory.
@@ -442,19 +479,18 @@ class ProductViewSet(viewsets.ModelViewSet):
         try:
             product = self.get_object()
             related_key = settings.CACHE_KEYS.get('related_products', 'related_products_{}')
-            cache_key = related_key.format(slug) if '{}' in related_key else f'related_products_{slug}'
+            cache_key = get_cache_key(related_key + ':{}', slug, auth_variant(request), namespaces=CATALOG_NAMESPACES)
             
             def fetch_related():
-                related_products = Product.objects.filter(
+                related_products = ProductSerializer.setup_eager_loading(Product.objects.filter(
                     subcategory=product.subcategory
-                ).exclude(
+                )).exclude(
                     id=product.id
                 ).order_by('-id')[:8]
                 serializer = self.get_serializer(related_products, many=True)
                 return serializer.data
             
-            data = get_cached_queryset(cache_key, fetch_related)
-            return Response(data)
+            return get_cached_response(request, cache_key, fetch_related, tags=product_tags(product))
         except Http404:
             return Response({"detail": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -464,19 +500,10 @@ class ProductViewSet(viewsets.ModelViewSet):
 # -------------------------
 
 class CategoryAdminDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Category.objects.all()
+    queryset = CategorySerializer.setup_eager_loading(Category.objects.all())
     serializer_class = CategorySerializer
     permission_classes = [IsAdminUser]
     lookup_field = 'pk'
-    
-    def perform_update(self, serializer):
-        obj = serializer.save()
-        invalidate_product_caches()
-        return obj
-    
-    def perform_destroy(self, instance):
-        super().perform_destroy(instance)
-        invalidate_product_caches()
 
 
 class SubcategoryAdminDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -488,19 +515,10 @@ class SubcategoryAdminDetailView(generics.RetrieveUpdateDestroyAPIView):
         category_slug = self.kwargs.get('category_slug')
         category = get_object_or_404(Category, slug=category_slug)
         return Subcategory.objects.filter(category=category).order_by('id')
-    
-    def perform_update(self, serializer):
-        obj = serializer.save()
-        invalidate_product_caches()
-        return obj
-    
-    def perform_destroy(self, instance):
-        super().perform_destroy(instance)
-        invalidate_product_caches()
 
 
 class ProductAdminDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Product.objects.all()
+    queryset = ProductSerializer.setup_eager_loading(Product.objects.all())
     serializer_class = ProductSerializer
     permission_classes = [IsAdminUser]
     parser_classes = [MultiPartParser, FormParser]
@@ -509,22 +527,24 @@ class ProductAdminDetailView(generics.RetrieveUpdateDestroyAPIView):
         ctx = super().get_serializer_context()
         ctx['request'] = self.request
         return ctx
-    
-    def perform_update(self, serializer):
-        product = serializer.save()
-        invalidate_product_caches(product=product, subcategory=product.subcategory)
-        return product
-    
-    def perform_destroy(self, instance):
-        subcategory = instance.subcategory
-        super().perform_destroy(instance)
-        invalidate_product_caches(subcategory=subcategory)
+
+
+# -------------------------
+# Cache Stats Endpoint
+# -------------------------
+@never_cache
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """Cache configuration and usage counters of every worker (staff only)"""
+    return Response(get_cache_stats())
 
 
 # -------------------------
 # Legacy function-based views
 # -------------------------
 
+@never_cache
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def me_view(request):
@@ -599,6 +619,7 @@ def logout_view(request):
     return Response({"message": "Logout successful"})
 
 
+@never_cache
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def current_user_view(request):
@@ -619,86 +640,6 @@ def social_login_success(request):
     return redirect('http://localhost:5173/')
 
 
-# -------------------------
-# Public product endpoints
-# -------------------------
-
-class ContractPagination(PageNumberPagination):
-    page_size = 12
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
-
-@method_decorator(cache_page(60 * 15), name='dispatch')
-@method_decorator(vary_on_headers('Authorization'), name='dispatch')
-class ProductsBySubcategoryView(generics.ListAPIView):
-    serializer_class = ProductSerializer
-    permission_classes = [permissions.AllowAny]
-    pagination_class = ContractPagination
-
-    def get_queryset(self):
-        subcategory_slug = self.kwargs.get('subcategory_slug')
-        subcat_key = settings.CACHE_KEYS.get('products_by_subcategory', 'products_by_subcategory_{}')
-        cache_key = subcat_key.format(subcategory_slug) if '{}' in subcat_key else f'products_by_subcategory_{subcategory_slug}'
-        
-        def fetch_products():
-            return list(Product.objects.filter(
-                subcategory__slug=subcategory_slug
-            ).order_by('-id'))
-        
-        return get_cached_queryset(cache_key, fetch_products, timeout=900)
-
-    def get_serializer_context(self):
-        ctx = super().get_serializer_context()
-        ctx['request'] = self.request
-        return ctx
-
-
-@method_decorator(cache_page(60 * 15), name='dispatch')
-class ProductDetailView(generics.RetrieveAPIView):
-    serializer_class = ProductSerializer
-    permission_classes = [permissions.AllowAny]
-    lookup_field = 'slug'
-    lookup_url_kwarg = 'product_slug'
-    queryset = Product.objects.all()
-
-    def get_serializer_context(self):
-        ctx = super().get_serializer_context()
-        ctx['request'] = self.request
-        return ctx
-
-
-@method_decorator(cache_page(60 * 15), name='dispatch')
-class ProductRelatedView(generics.ListAPIView):
-    """
-    Returns cached related products from the same subcategory.
-    """
-    serializer_class = ProductSerializer
-    permission_classes = [permissions.AllowAny]
-    pagination_class = None
-
-    def get_queryset(self):
-        product_slug = self.kwargs.get('product_slug')
-        product = get_object_or_404(Product, slug=product_slug)
-        
-        related_key = settings.CACHE_KEYS.get('related_products', 'related_products_{}')
-        cache_key = related_key.format(product_slug) if '{}' in related_key else f'related_products_{product_slug}'
-        
-        def fetch_related():
-            return list(Product.objects.filter(
-                subcategory=product.subcategory
-            ).exclude(
-                id=product.id
-            ).order_by('-id')[:8])
-        
-        return get_cached_queryset(cache_key, fetch_related, timeout=900)
-
-    def get_serializer_context(self):
-        ctx = super().get_serializer_context()
-        ctx['request'] = self.request
-        return ctx
-
-
 class BlogViewSet(viewsets.ReadOnlyModelViewSet):
     """
     Public read-only access to published blogs with caching.
@@ -709,19 +650,30 @@ class BlogViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
     lookup_field = 'slug'
     pagination_class = None  # No pagination for blogs
+    cache_query_params = ()
 
-    @method_decorator(cache_page(60 * 15))
+    @method_decorator(tagged_cache_page(60 * 15, namespaces=BLOG_NAMESPACES))
+    @method_decorator(conditional(blog_version))
     def list(self, request, *args, **kwargs):
         """Returns ALL published blogs"""
-        return super().list(request, *args, **kwargs)
+        response = super().list(request, *args, **kwargs)
+        return tag_response(response, make_tag('blogs'))
+
+    def get_object(self):
+        blog = get_object_or_404_cached(self.get_queryset(), self.kwargs[self.lookup_field], namespaces=BLOG_NAMESPACES)
+        self.check_object_permissions(self.request, blog)
+        return blog
 
-    @method_decorator(cache_page(60 * 15))
+    @method_decorator(tagged_cache_page(60 * 15, namespaces=BLOG_NAMESPACES))
+    @method_decorator(conditional(blog_version))
     def retrieve(self, request, *args, **kwargs):
         """Returns a single blog by slug"""
-        return super().retrieve(request, *args, **kwargs)
+        response = super().retrieve(request, *args, **kwargs)
+        return tag_response(response, make_tag('blog', response.data.get('id')))
     
     @action(detail=False, methods=['get'], url_path='footer')
-    @method_decorator(cache_page(60 * 15))
+    @method_decorator(tagged_cache_page(60 * 15, namespaces=BLOG_NAMESPACES))
+    @method_decorator(conditional(blog_version))
     def footer_blogs(self, request):
         """
         Returns cached latest blogs for footer display.
@@ -729,8 +681,9 @@ class BlogViewSet(viewsets.ReadOnlyModelViewSet):
         """
         blogs = self.get_queryset()[:10]  # Get 10 latest blogs instead of 3
         serializer = self.get_serializer(blogs, many=True)
-        return Response(serializer.data)
+        return tag_response(Response(serializer.data), make_tag('blogs'))
 
+@conditional(banner_version)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def hero_banners(request):
@@ -739,16 +692,9 @@ def hero_banners(request):
     Only returns banners where is_active=True, ordered by display_order and creation date.
     Cache timeout: 5 minutes (300 seconds)
     """
-    cache_key = 'active_hero_banners'
-    
-    # Try to get from cache
-    cached_data = cache.get(cache_key)
-    if cached_data is not None:
-        logger.debug(f"Cache hit for hero banners")
-        return Response(cached_data)
-    
-    # Fetch from database
-    try:
+    cache_key = get_cache_key('active_hero_banners', namespaces=BANNER_NAMESPACES)
+
+    def fetch_banners():
         banners = HeroBanner.objects.filter(
             is_active=True
         ).order_by('display_order', '-created_at')
@@ -758,12 +704,12 @@ def hero_banners(request):
             many=True,
             context={'request': request}
         )
-        
+        return serializer.data
+    
+    try:
         # Cache for 5 minutes
-        cache.set(cache_key, serializer.data, 60 * 5)
-        logger.debug(f"Cache miss - stored hero banners")
-        
-        return Response(serializer.data)
+        response = get_cached_response(request, cache_key, fetch_banners, timeout=60 * 5, tags=[make_tag('banner')])
+        return namespace_response(response, *BANNER_NAMESPACES)
         
     except Exception as e:
         logger.error(f"Error fetching hero banners: {str(e)}")